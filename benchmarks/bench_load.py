@@ -0,0 +1,477 @@
+"""Нагрузочный стенд интеграции Petkit W5 на симулированных кормушках.
+
+Запуск из корня репозитория:
+
+    python benchmarks/bench_load.py [--devices 1,10,100,500] [--cycles N] [--json]
+
+Модули интеграции загружаются по пути, без пакета custom_components и
+Home Assistant. Вместо bleak подставляется FakeBleakClient, который
+отвечает кадрами протокола с заданной задержкой и долей отказов и
+присылает поток уведомлений; вместо брокера - FakeBroker в том же
+процессе. Цикл опроса повторяет шаг координатора: семафор параллельности,
+таймаут на устройство, проверка свежести, подключение через планировщик
+слотов, чтение статуса и публикация изменений. Между циклами часть
+устройств получает команду кормления через MQTT.
+
+Отчет: перцентили длительности опроса устройства и цикла, задержка
+команды от MQTT до события кормления, блокировки event loop, память на
+устройство, скорость сообщений брокера и число GATT операций на одно
+подключение.
+
+С --trace PATH трафик прогона записывается в файл для
+benchmarks/bench_replay.py (при нескольких --devices к имени файла
+добавляется число устройств).
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import pathlib
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+COMPONENT_DIR = pathlib.Path(__file__).resolve().parent.parent / "custom_components" / "petkit_w5_ble"
+PACKAGE = "petkit_w5_bench"
+
+class FakeCharacteristic:
+    def __init__(self, uuid):
+        self.uuid = uuid
+
+class FakeService:
+    def __init__(self, uuid, characteristics):
+        self.uuid = uuid
+        self.characteristics = [FakeCharacteristic(char_uuid) for char_uuid in characteristics]
+
+class FakeServices:
+    def __init__(self, services):
+        self._services = {service.uuid: service for service in services}
+
+    def get_service(self, uuid):
+        return self._services.get(uuid)
+
+class SimulatedFeeder:
+    """Состояние и поведение одной симулированной кормушки."""
+
+    def __init__(self, address, rng, latency, jitter, drop_rate, notify_interval):
+        self.address = address
+        self.rng = rng
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.notify_interval = notify_interval
+        self.state = 0
+        self.battery = rng.randint(20, 100)
+        self.food_level = rng.randint(10, 100)
+
+    def delay(self):
+        return max(0.0, self.rng.gauss(self.latency, self.jitter))
+
+    def dropped(self):
+        return self.rng.random() < self.drop_rate
+
+    def status_frame(self, protocol):
+        # Корм понемногу расходуется, чтобы публикации содержали изменения
+        if self.rng.random() < 0.3:
+            self.food_level = max(0, self.food_level - 1)
+        return bytes(protocol.encode_status(self.state, self.battery, self.food_level))
+
+class FakeBleakClient:
+    """Замена bleak.BleakClient, работающая с SimulatedFeeder."""
+
+    feeders = {}
+    protocol = None
+    uuids = None
+
+    def __init__(self, address_or_ble_device, disconnected_callback=None, services=None, **kwargs):
+        self.address = str(address_or_ble_device)
+        self.feeder = self.feeders[self.address]
+        self.is_connected = False
+        self.services = None
+        self._disconnected_callback = disconnected_callback
+        self._notify_callbacks = {}
+        self._stream = None
+        self._gatt = FakeServices([FakeService(self.uuids["service"], self.uuids["characteristics"])])
+
+    async def connect(self, **kwargs):
+        await asyncio.sleep(self.feeder.delay())
+        if self.feeder.dropped():
+            raise TimeoutError(f"Симуляция: {self.address} не ответило на подключение")
+        self.is_connected = True
+        self.services = self._gatt
+        return True
+
+    async def disconnect(self):
+        was_connected = self.is_connected
+        self._stop()
+        if was_connected and self._disconnected_callback:
+            self._disconnected_callback(self)
+        return True
+
+    async def start_notify(self, char, callback, **kwargs):
+        uuid = getattr(char, "uuid", char)
+        self._notify_callbacks[uuid] = callback
+        if uuid == self.uuids["status"] and self.feeder.notify_interval and self._stream is None:
+            self._stream = asyncio.get_running_loop().create_task(self._notification_stream())
+
+    async def read_gatt_char(self, char, **kwargs):
+        await asyncio.sleep(self.feeder.delay())
+        if self.feeder.dropped():
+            raise TimeoutError(f"Симуляция: чтение {self.address} не выполнено")
+        return bytearray(self.feeder.status_frame(self.protocol))
+
+    async def write_gatt_char(self, char, data, response=None):
+        # Запись без ответа ATT не ждет подтверждения от устройства
+        await asyncio.sleep(self.feeder.delay() if response is not False else 0)
+        code = data[1]
+        loop = asyncio.get_running_loop()
+        ack = bytes(self.protocol.encode_ack(code))
+        loop.call_later(self.feeder.delay(), self._notify, self.uuids["ack"], ack)
+        if code == self.protocol.CMD_FEED:
+            # Выдача корма завершается позже подтверждения команды
+            done = bytes(self.protocol.encode_feed_done(data[2]))
+            loop.call_later(self.feeder.delay() * 4, self._notify, self.uuids["ack"], done)
+
+    def _notify(self, uuid, data):
+        callback = self._notify_callbacks.get(uuid)
+        if callback is not None and self.is_connected:
+            callback(uuid, bytearray(data))
+
+    async def _notification_stream(self):
+        """Периодические уведомления статуса, иногда разбитые на части."""
+        uuid = self.uuids["status"]
+        while self.is_connected:
+            await asyncio.sleep(self.feeder.notify_interval * self.feeder.rng.uniform(0.5, 1.5))
+            frame = self.feeder.status_frame(self.protocol)
+            if self.feeder.rng.random() < 0.3:
+                split = self.feeder.rng.randint(1, len(frame) - 1)
+                self._notify(uuid, frame[:split])
+                self._notify(uuid, frame[split:])
+            else:
+                self._notify(uuid, frame)
+
+    def _stop(self):
+        self.is_connected = False
+        if self._stream is not None:
+            self._stream.cancel()
+            self._stream = None
+
+class FakeBroker:
+    """MQTT брокер в процессе с интерфейсом PetkitMqttClient."""
+
+    def __init__(self, ack_latency=0.0):
+        self.ack_latency = ack_latency
+        self.is_connected = True
+        self.messages = 0
+        self.retained = {}
+        self._subscriptions = {}
+        self._connect_listeners = []
+        self._commands = {}
+        self.command_latencies = []
+        self.trace = None
+
+    async def async_publish(self, topic, payload, qos=0, retain=False, timeout=10):
+        if not self.is_connected:
+            return False
+        if self.trace is not None:
+            self.trace.publish(topic, payload)
+        await asyncio.sleep(self.ack_latency)
+        self.messages += 1
+        if retain:
+            self.retained[topic] = payload
+        if topic.endswith("/event"):
+            started = self._commands.get(topic[:-len("/event")])
+            if started:
+                self.command_latencies.append(time.perf_counter() - started.pop(0))
+        return True
+
+    def async_subscribe(self, topic, callback, qos=0):
+        self._subscriptions.setdefault(topic, []).append(callback)
+        return lambda: self._subscriptions[topic].remove(callback)
+
+    def add_connect_listener(self, callback):
+        self._connect_listeners.append(callback)
+        return lambda: self._connect_listeners.remove(callback)
+
+    def inject_command(self, topic, command):
+        """Команда от внешнего клиента в <topic>/cmd."""
+        self._commands.setdefault(topic, []).append(time.perf_counter())
+        for callback in list(self._subscriptions.get(f"{topic}/cmd", ())):
+            callback(f"{topic}/cmd", json.dumps(command).encode())
+
+    @property
+    def commands_pending(self):
+        return sum(len(started) for started in self._commands.values())
+
+class LoopMonitor:
+    """Измерение блокировок event loop по опозданию таймера."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - started - self.interval))
+
+def load_integration():
+    """Загрузка модулей интеграции с FakeBleakClient вместо bleak."""
+    bleak = types.ModuleType("bleak")
+    bleak.BleakClient = FakeBleakClient
+    sys.modules["bleak"] = bleak
+
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [str(COMPONENT_DIR)]
+    sys.modules[PACKAGE] = package
+    modules = {
+        name: importlib.import_module(f"{PACKAGE}.{name}")
+        for name in ("protocol", "petkit_device", "scheduler", "outbox", "const", "trace")
+    }
+
+    device_class = modules["petkit_device"].PetkitW5Device
+    FakeBleakClient.protocol = modules["protocol"]
+    FakeBleakClient.uuids = {
+        "service": device_class.DEVICE_SERVICE_UUID,
+        "status": device_class.DEVICE_CHAR_UUID,
+        "ack": device_class.BLE_CHAR_UUID,
+        "characteristics": [
+            device_class.DEVICE_CHAR_UUID, device_class.FEED_CHAR_UUID,
+            device_class.BLE_CHAR_UUID, device_class.SETTING_CHAR_UUID,
+        ],
+    }
+    return modules
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class LoadTest:
+    """Один прогон стенда на count устройствах."""
+
+    def __init__(self, modules, count, args, trace_path=None):
+        self.modules = modules
+        self.count = count
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.broker = FakeBroker(args.broker_latency)
+        # Журнал событий outbox живет только на время прогона
+        self._outbox_dir = tempfile.TemporaryDirectory()
+        self.outbox = modules["outbox"].MqttOutbox(
+            self.broker, str(pathlib.Path(self._outbox_dir.name) / "outbox.jsonl")
+        )
+        self.scheduler = modules["scheduler"].ConnectionSlotScheduler(default_slots=args.slots)
+        self.semaphore = asyncio.Semaphore(args.concurrency)
+        self.devices = []
+        self.poll_latencies = []
+        self.cycle_times = []
+        self.failures = 0
+        self.recorder = None
+        if trace_path:
+            self.recorder = modules["trace"].TraceRecorder(trace_path)
+            self.broker.trace = self.recorder
+
+    def build(self):
+        device_class = self.modules["petkit_device"].PetkitW5Device
+        adapters = [f"adapter{index}" for index in range(self.args.adapters)]
+        for index in range(self.count):
+            address = f"AA:BB:CC:{index >> 16 & 0xFF:02X}:{index >> 8 & 0xFF:02X}:{index & 0xFF:02X}"
+            FakeBleakClient.feeders[address] = SimulatedFeeder(
+                address, random.Random(self.rng.random()), self.args.latency,
+                self.args.jitter, self.args.drop_rate, self.args.notify_interval,
+            )
+            visible = self.rng.sample(adapters, min(2, len(adapters)))
+            candidates = [(source, self.rng.randint(-90, -50), address) for source in visible]
+            device = device_class(
+                address,
+                idle_timeout=self.args.idle_timeout,
+                slot_scheduler=self.scheduler,
+                candidates=lambda candidates=candidates: candidates,
+            )
+            device.set_status_callback(self._handle_status)
+            device.setup_mqtt(self.broker, f"petkit/w5/{address.replace(':', '')}", outbox=self.outbox)
+            if self.recorder is not None:
+                device.trace = self.recorder
+                self.recorder.add_device(address, device.mqtt_topic)
+            self.devices.append(device)
+
+    def _handle_status(self, mac, status):
+        # Как PetkitW5Coordinator._handle_device_status: публикация без ожидания
+        device = self._by_mac[mac]
+        asyncio.get_running_loop().create_task(device.publish_mqtt(status))
+
+    async def _poll_device(self, device):
+        """Шаг DevicePoller._async_read."""
+        if device.has_fresh_status():
+            return device.last_data
+        status = await device.planner.async_read_status()
+        await device.publish_mqtt(status)
+        return status
+
+    async def _update_device(self, device):
+        """Шаг PetkitW5Coordinator._async_update_device без breaker."""
+        loop = asyncio.get_running_loop()
+        async with self.semaphore:
+            started = loop.time()
+            try:
+                status = await asyncio.wait_for(self._poll_device(device), self.args.device_timeout)
+            except asyncio.TimeoutError:
+                status = None
+            self.poll_latencies.append(loop.time() - started)
+        if status is None or not status.is_online:
+            self.failures += 1
+
+    async def _cycle(self):
+        started = time.perf_counter()
+        await asyncio.gather(*(self._update_device(device) for device in self.devices))
+        self.cycle_times.append(time.perf_counter() - started)
+
+    def _inject_commands(self):
+        count = int(self.count * self.args.feed_ratio) or (1 if self.args.feed_ratio else 0)
+        for device in self.rng.sample(self.devices, min(count, self.count)):
+            self.broker.inject_command(device.mqtt_topic, {"feed": 10})
+
+    async def run(self):
+        self._by_mac = {}
+        await self.outbox.async_start()
+
+        # Память: устройства после создания и первого цикла
+        tracemalloc.start()
+        baseline = tracemalloc.take_snapshot()
+        self.build()
+        self._by_mac = {device.mac_address: device for device in self.devices}
+        await self._cycle()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        memory = sum(stat.size_diff for stat in snapshot.compare_to(baseline, "filename"))
+
+        self.poll_latencies.clear()
+        self.cycle_times.clear()
+        self.failures = 0
+        messages_before = self.broker.messages
+        monitor = LoopMonitor()
+        monitor.start()
+        started = time.perf_counter()
+        for _ in range(self.args.cycles):
+            self._inject_commands()
+            await self._cycle()
+        elapsed = time.perf_counter() - started
+        # Ожидание команд, еще стоящих в очередях устройств
+        deadline = time.perf_counter() + self.modules["const"].DEFAULT_ACK_TIMEOUT + 1
+        while self.broker.commands_pending and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        await monitor.stop()
+
+        for device in self.devices:
+            await device.async_close()
+        await self.outbox.async_stop()
+        self._outbox_dir.cleanup()
+        FakeBleakClient.feeders.clear()
+        if self.recorder is not None:
+            await self.recorder.async_flush()
+
+        commands = self.broker.command_latencies
+        counters = [device.metrics.counters for device in self.devices]
+        connections = sum(counter["connects"] + counter["reconnects"] for counter in counters)
+        operations = sum(counter["window_operations"] for counter in counters)
+        return {
+            "devices": self.count,
+            "cycles": self.args.cycles,
+            "poll_p50_ms": percentile(self.poll_latencies, 0.5) * 1000,
+            "poll_p95_ms": percentile(self.poll_latencies, 0.95) * 1000,
+            "poll_p99_ms": percentile(self.poll_latencies, 0.99) * 1000,
+            "cycle_p50_s": percentile(self.cycle_times, 0.5),
+            "cycle_max_s": max(self.cycle_times, default=0.0),
+            "command_p95_ms": percentile(commands, 0.95) * 1000,
+            "commands_done": len(commands),
+            # Не подтверждены: ошибка подключения или объединение с повтором
+            "commands_unconfirmed": self.broker.commands_pending,
+            "loop_lag_max_ms": max(monitor.lags, default=0.0) * 1000,
+            "loop_lag_p99_ms": percentile(monitor.lags, 0.99) * 1000,
+            "memory_per_device_kb": memory / self.count / 1024,
+            "messages_per_s": (self.broker.messages - messages_before) / elapsed,
+            "poll_failures": self.failures,
+            "connections": connections,
+            "ops_per_connection": operations / connections if connections else 0.0,
+            "scheduler": self.scheduler.stats(),
+        }
+
+COLUMNS = (
+    ("devices", "устр.", "{:>6}"),
+    ("poll_p50_ms", "опрос p50", "{:>10.1f}"),
+    ("poll_p95_ms", "p95", "{:>8.1f}"),
+    ("poll_p99_ms", "p99", "{:>8.1f}"),
+    ("cycle_p50_s", "цикл p50", "{:>9.2f}"),
+    ("command_p95_ms", "команда p95", "{:>12.1f}"),
+    ("loop_lag_max_ms", "блок. loop", "{:>11.1f}"),
+    ("memory_per_device_kb", "КБ/устр.", "{:>9.1f}"),
+    ("messages_per_s", "сообщ./с", "{:>9.0f}"),
+    ("poll_failures", "ошибки", "{:>7}"),
+    ("ops_per_connection", "опер./подкл.", "{:>13.2f}"),
+)
+
+def print_table(results):
+    print(" ".join(f"{title:>{len(fmt.format(0))}}" for _, title, fmt in COLUMNS))
+    for result in results:
+        print(" ".join(fmt.format(result[key]) for key, _, fmt in COLUMNS))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", default="1,10,100,500", help="число устройств через запятую")
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.005, help="средняя задержка GATT операции, с")
+    parser.add_argument("--jitter", type=float, default=0.002)
+    parser.add_argument("--drop-rate", type=float, default=0.02, help="доля неудачных подключений и чтений")
+    parser.add_argument("--notify-interval", type=float, default=0.0, help="интервал уведомлений статуса, с (0 - нет)")
+    parser.add_argument("--feed-ratio", type=float, default=0.05, help="доля устройств с командой за цикл")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--device-timeout", type=float, default=20)
+    parser.add_argument("--idle-timeout", type=float, default=30)
+    parser.add_argument("--adapters", type=int, default=2)
+    parser.add_argument("--slots", type=int, default=3)
+    parser.add_argument("--broker-latency", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--trace", help="файл для записи трафика прогона")
+    parser.add_argument("--json", action="store_true", help="вывод результатов в JSON")
+    parser.add_argument("--verbose", action="store_true", help="журнал интеграции в stderr")
+    args = parser.parse_args()
+
+    # Симулированные отказы иначе засоряют вывод ошибками подключения
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.CRITICAL)
+
+    modules = load_integration()
+    counts = [int(value) for value in args.devices.split(",")]
+    results = []
+    for count in counts:
+        trace_path = args.trace
+        if trace_path and len(counts) > 1:
+            path = pathlib.Path(trace_path)
+            trace_path = str(path.with_name(f"{path.stem}_{count}{path.suffix}"))
+        results.append(asyncio.run(LoadTest(modules, count, args, trace_path).run()))
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        print_table(results)
+
+if __name__ == "__main__":
+    main()
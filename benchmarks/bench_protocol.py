@@ -0,0 +1,73 @@
+"""Микробенчмарк кодека протокола Petkit W5.
+
+Запуск из корня репозитория:
+
+    python benchmarks/bench_protocol.py [--frames N]
+
+protocol.py загружается напрямую по пути, поэтому Home Assistant,
+bleak и paho для бенчмарка не нужны.
+"""
+import argparse
+import importlib.util
+import pathlib
+import time
+
+COMPONENT_DIR = pathlib.Path(__file__).resolve().parent.parent / "custom_components" / "petkit_w5_ble"
+
+def load_protocol():
+    """Загрузка protocol.py без импорта пакета интеграции."""
+    spec = importlib.util.spec_from_file_location("petkit_w5_protocol", COMPONENT_DIR / "protocol.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def report(name, count, elapsed):
+    print(f"{name:<32} {count / elapsed:>14,.0f} кадров/с  ({elapsed * 1e9 / count:,.0f} нс/кадр)")
+
+def bench_decode(protocol, count):
+    frame = bytes(protocol.encode_status(0, 95, 80))
+    decode = protocol.decode_frame
+    start = time.perf_counter()
+    for _ in range(count):
+        decode(frame)
+    report("decode_frame", count, time.perf_counter() - start)
+
+def bench_encode(protocol, count):
+    encode = protocol.encode_feed
+    start = time.perf_counter()
+    for i in range(count):
+        encode(i & 0xFF)
+    report("encode_feed", count, time.perf_counter() - start)
+
+def bench_assembler(protocol, count, chunk_size):
+    # Поток из чередующихся кадров, нарезанный на уведомления chunk_size байт
+    frames = [
+        bytes(protocol.encode_status(0, 95, 80)),
+        bytes(protocol.encode_feed(10)),
+        bytes(protocol.encode_time_sync(1700000000, 180)),
+    ]
+    stream = b"".join(frames[i % len(frames)] for i in range(count))
+    chunks = [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+
+    assembler = protocol.FrameAssembler()
+    decoded = 0
+    start = time.perf_counter()
+    for chunk in chunks:
+        decoded += len(assembler.feed(chunk))
+    elapsed = time.perf_counter() - start
+    assert decoded == count, f"Разобрано {decoded} из {count}"
+    report(f"FrameAssembler (уведомления {chunk_size} Б)", count, elapsed)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=200_000)
+    args = parser.parse_args()
+
+    protocol = load_protocol()
+    bench_encode(protocol, args.frames)
+    bench_decode(protocol, args.frames)
+    for chunk_size in (protocol.FRAME_SIZE, 20, 7, 4 * protocol.FRAME_SIZE):
+        bench_assembler(protocol, args.frames, chunk_size)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Воспроизведение записанного трафика Petkit W5 через код интеграции.
+
+Запуск из корня репозитория:
+
+    python benchmarks/bench_replay.py TRACE [--speed 0] [--json]
+
+Запись создается интеграцией (опция trace_recording), мостом (ключ
+trace_path) или стендом bench_load.py --trace. Записанные уведомления,
+чтения и реклама подаются в PetkitW5Device в исходном порядке, без
+адаптера и брокера, поэтому прогон детерминирован и пригоден для
+сравнения производительности декодирования и публикации между версиями.
+
+Отчет: число событий по типам, время прогона, метрики этапов устройств
+и расхождение опубликованного в MQTT с записанным.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+
+from bench_load import PACKAGE, load_integration
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("trace", help="файл записи трафика")
+    parser.add_argument("--speed", type=float, default=0, help="множитель скорости (1 - реальное время, 0 - без пауз)")
+    parser.add_argument("--json", action="store_true", help="полный отчет в JSON")
+    parser.add_argument("--verbose", action="store_true", help="журнал интеграции в stderr")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.CRITICAL)
+
+    load_integration()
+    trace = importlib.import_module(f"{PACKAGE}.trace")
+    replay = trace.TraceReplay.from_file(args.trace, args.speed)
+    report = asyncio.run(replay.async_run())
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    print(f"Записей: {report['records']} за {report['trace_duration_s']} с записи")
+    print(f"Воспроизведение: {report['replay_duration_s']} с, {report['records_per_s']} записей/с")
+    print("События: " + ", ".join(f"{kind} {count}" for kind, count in sorted(report["events"].items())))
+    publishes = report["publishes"]
+    print(
+        f"MQTT: записано {publishes['recorded']}, воспроизведено {publishes['replayed']}, "
+        f"нет в воспроизведении {publishes['missing']}, лишних {publishes['unexpected']}"
+    )
+    errors = sum(device["frames"]["checksum_errors"] for device in report["devices"].values())
+    print(f"Устройств: {len(report['devices'])}, ошибок контрольной суммы: {errors}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Автономный мост BLE -> MQTT для кормушек Petkit W5 без Home Assistant.
+
+Запуск из корня репозитория (нужны bleak и paho-mqtt):
+
+    python bridge/petkit_w5_bridge.py --config bridge/config.example.json
+
+Модули интеграции загружаются по пути, без пакета custom_components и
+Home Assistant. Несколько мостов с одним брокером и одним списком
+устройств делят устройства между собой: каждое обслуживает узел с
+лучшим RSSI, а при пропаже узла его устройства забирают остальные.
+Статусы и команды - в тех же топиках, что и у интеграции.
+"""
+import argparse
+import asyncio
+import importlib
+import logging
+import pathlib
+import signal
+import sys
+import types
+
+COMPONENT_DIR = pathlib.Path(__file__).resolve().parent.parent / "custom_components" / "petkit_w5_ble"
+PACKAGE = "petkit_w5_bridge"
+
+def load_bridge_module():
+    """Загрузка модуля моста из каталога интеграции."""
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [str(COMPONENT_DIR)]
+    sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.bridge")
+
+async def run(bridge):
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, bridge.async_stop)
+    await bridge.async_run()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", required=True, help="JSON файл настроек")
+    parser.add_argument("--node-id", help="идентификатор узла (по умолчанию имя хоста)")
+    parser.add_argument("--verbose", action="store_true", help="подробный журнал")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+    module = load_bridge_module()
+    config = module.load_config(args.config)
+    if args.node_id:
+        config["node_id"] = args.node_id
+    asyncio.run(run(module.PetkitW5Bridge(config)))
+
+if __name__ == "__main__":
+    main()
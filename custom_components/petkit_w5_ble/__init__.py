@@ -1,15 +1,70 @@
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers.typing import ConfigType
+import homeassistant.helpers.config_validation as cv
+import voluptuous as vol
 import logging
 
-from .const import DOMAIN, PLATFORMS
+from .const import (
+    DOMAIN, PLATFORMS, CONF_DEVICES, CONF_MAC, SERVICE_FEED, ATTR_AMOUNT, DEFAULT_FEED_AMOUNT,
+    SERVICE_SET_SCHEDULE, ATTR_MEALS, ATTR_TIME, ATTR_DAYS, ATTR_LIGHT, ATTR_SOUND, ATTR_CHILD_LOCK
+)
 from .coordinator import PetkitW5Coordinator
 
 _LOGGER = logging.getLogger(__name__)
 
+FEED_SCHEMA = vol.Schema({
+    vol.Required(CONF_MAC): cv.string,
+    vol.Optional(ATTR_AMOUNT, default=DEFAULT_FEED_AMOUNT): vol.All(vol.Coerce(int), vol.Range(min=1, max=255)),
+})
+
+MEAL_SCHEMA = vol.Schema({
+    vol.Required(ATTR_TIME): cv.string,
+    vol.Optional(ATTR_AMOUNT, default=DEFAULT_FEED_AMOUNT): vol.All(vol.Coerce(int), vol.Range(min=1, max=255)),
+    vol.Optional(ATTR_DAYS): [vol.All(vol.Coerce(int), vol.Range(min=0, max=6))],
+})
+
+SET_SCHEDULE_SCHEMA = vol.Schema({
+    vol.Required(CONF_MAC): cv.string,
+    vol.Required(ATTR_MEALS): [MEAL_SCHEMA],
+    vol.Optional(ATTR_LIGHT): cv.boolean,
+    vol.Optional(ATTR_SOUND): cv.boolean,
+    vol.Optional(ATTR_CHILD_LOCK): cv.boolean,
+})
+
 async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     """Настройка интеграции Petkit W5 BLE."""
+    
+    async def async_handle_feed(call: ServiceCall) -> None:
+        """Сервис кормления конкретного устройства."""
+        mac = call.data[CONF_MAC].upper()
+        for coordinator in hass.data.get(DOMAIN, {}).values():
+            if mac in coordinator.petkit_devices:
+                if not await coordinator.feed_device(mac, call.data[ATTR_AMOUNT]):
+                    raise HomeAssistantError(f"Устройство {mac} не подтвердило кормление")
+                return
+        raise HomeAssistantError(f"Устройство {mac} не найдено")
+    
+    async def async_handle_set_schedule(call: ServiceCall) -> None:
+        """Сервис записи расписания кормлений в устройство."""
+        mac = call.data[CONF_MAC].upper()
+        settings = {
+            key: call.data[key] for key in (ATTR_LIGHT, ATTR_SOUND, ATTR_CHILD_LOCK) if key in call.data
+        }
+        for coordinator in hass.data.get(DOMAIN, {}).values():
+            if mac in coordinator.petkit_devices:
+                try:
+                    await coordinator.async_set_schedule(mac, call.data[ATTR_MEALS], settings)
+                except Exception as e:
+                    raise HomeAssistantError(f"Не удалось записать расписание в {mac}: {e}") from e
+                return
+        raise HomeAssistantError(f"Устройство {mac} не найдено")
+    
+    hass.services.async_register(DOMAIN, SERVICE_FEED, async_handle_feed, schema=FEED_SCHEMA)
+    hass.services.async_register(
+        DOMAIN, SERVICE_SET_SCHEDULE, async_handle_set_schedule, schema=SET_SCHEDULE_SCHEMA
+    )
     return True
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
@@ -22,12 +77,21 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][entry.entry_id] = coordinator
     
-    # Запуск координатора
-    await coordinator.async_config_entry_first_refresh()
+    # Пассивный прием рекламы не требует подключений
+    coordinator.async_start_advertisement_listener()
     
-    # Настройка платформ
+    # Настройка платформ: сущности появляются сразу с восстановленным
+    # или неизвестным состоянием
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     
+    # MQTT и BLE поднимаются в фоне, устройства заполняются по мере ответа
+    entry.async_create_background_task(
+        hass, coordinator.async_start(), f"{DOMAIN}_start_{entry.entry_id}"
+    )
+    
+    # Применение изменений настроек и списка устройств
+    entry.async_on_unload(entry.add_update_listener(async_update_entry))
+    
     return True
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
@@ -45,5 +109,17 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
 async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Перезагрузка интеграции."""
-    await async_unload_entry(hass, entry)
-    await async_setup_entry(hass, entry)
+    await hass.config_entries.async_reload(entry.entry_id)
+
+async def async_update_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Применение изменений конфигурационной записи.
+
+    Если изменился только список устройств, координатор обновляет его
+    на месте; изменение остальных настроек требует перезагрузки.
+    """
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    if coordinator.settings_snapshot(entry) != coordinator.entry_settings:
+        await async_reload_entry(hass, entry)
+        return
+    
+    await coordinator.async_update_devices(entry.data.get(CONF_DEVICES, []))
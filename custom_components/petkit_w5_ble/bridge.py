@@ -0,0 +1,379 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from bleak import BleakScanner
+from .const import (
+    DEFAULT_BRIDGE_TOPIC, DEFAULT_BRIDGE_HEARTBEAT, DEFAULT_BRIDGE_OUTBOX_PATH, DEFAULT_LEASE_TTL, DEFAULT_LEASE_HYSTERESIS,
+    DEFAULT_RSSI_MAX_AGE, DEFAULT_IDLE_TIMEOUT, DEFAULT_MQTT_HEARTBEAT, DEFAULT_ADAPTER_SLOTS,
+    DEFAULT_MAX_CONCURRENCY, DEFAULT_DEVICE_TIMEOUT, DEFAULT_MIN_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_DISCOVERY_PREFIX
+)
+from .discovery import DiscoveryPublisher
+from .health import DeviceHealth
+from .leases import LeaseTable
+from .models import StatusField
+from .mqtt_client import PetkitMqttClient
+from .outbox import MqttOutbox
+from .petkit_device import PetkitW5Device
+from .polling import AdaptivePollSchedule, DevicePoller
+from .schedule import async_sync_from_config
+from .scheduler import ConnectionSlotScheduler
+from .trace import TraceRecorder
+
+_LOGGER = logging.getLogger(__name__)
+
+def load_config(path):
+    """Чтение настроек моста из JSON файла.
+
+    Обязательны mqtt.broker и список devices ({"mac": ..., "mqtt_topic": ...}).
+    """
+    with open(path, encoding="utf-8") as file:
+        config = json.load(file)
+    if not config.get("mqtt", {}).get("broker"):
+        raise ValueError("Не задан mqtt.broker")
+    if not config.get("devices"):
+        raise ValueError("Не задан список devices")
+    return config
+
+class PetkitW5Bridge:
+    """Автономный мост BLE -> MQTT без Home Assistant.
+
+    Использует те же PetkitW5Device, DevicePoller и MQTT клиент, что и
+    координатор. Несколько мостов (например, в разных комнатах) делят
+    устройства между собой через retained-сообщения:
+
+    - <bridge_topic>/nodes/<node> - RSSI устройств, которые видит узел;
+      при пропаже узла брокер очищает его через last will;
+    - <bridge_topic>/lease/<MAC> - узел, который обслуживает устройство.
+
+    Владельца каждого устройства определяет LeaseTable. Устройство
+    обслуживает (подключается, опрашивает, принимает команды из
+    <topic>/cmd) только его владелец. Статусы публикуются в те же
+    топики, что и в интеграции, поэтому Home Assistant может получать
+    данные из MQTT.
+
+    Расписание из <topic>/cmd мост записывает только в устройство: файл
+    настроек не изменяется. Если для устройства в файле задано schedule
+    или settings, узел, который возьмет устройство (после перезапуска или
+    переезда), запишет значения из файла поверх полученных по MQTT.
+    """
+
+    def __init__(self, config):
+        self.node_id = config.get("node_id") or socket.gethostname()
+        self.base_topic = config.get("bridge_topic", DEFAULT_BRIDGE_TOPIC)
+        self.heartbeat = config.get("heartbeat", DEFAULT_BRIDGE_HEARTBEAT)
+        self.rssi_max_age = config.get("rssi_max_age", DEFAULT_RSSI_MAX_AGE)
+        self.idle_timeout = config.get("idle_timeout", DEFAULT_IDLE_TIMEOUT)
+        self.mqtt_heartbeat = config.get("mqtt_heartbeat", DEFAULT_MQTT_HEARTBEAT)
+        self.min_poll_interval = config.get("min_poll_interval", DEFAULT_MIN_POLL_INTERVAL)
+        self.max_poll_interval = config.get("max_poll_interval", DEFAULT_MAX_POLL_INTERVAL)
+        self.adapter = config.get("adapter")
+        self.device_configs = {
+            device_config["mac"].upper(): device_config for device_config in config["devices"]
+        }
+
+        self.leases = LeaseTable(
+            self.node_id,
+            ttl=config.get("lease_ttl", DEFAULT_LEASE_TTL),
+            hysteresis=config.get("lease_hysteresis", DEFAULT_LEASE_HYSTERESIS),
+        )
+        self.poller = DevicePoller(
+            config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY),
+            config.get("device_timeout", DEFAULT_DEVICE_TIMEOUT),
+        )
+        self.slot_scheduler = ConnectionSlotScheduler(
+            default_slots=config.get("adapter_slots", DEFAULT_ADAPTER_SLOTS)
+        )
+
+        mqtt_config = dict(config["mqtt"])
+        mqtt_config.setdefault("port", 1883)
+        # Пустое retained-сообщение удаляет узел у остальных мостов
+        mqtt_config["will"] = (self._node_topic(self.node_id), "")
+        self.mqtt = PetkitMqttClient(mqtt_config)
+        # События не отбрасываются, поэтому журнал на диске нужен всегда
+        self.outbox = MqttOutbox(
+            self.mqtt, os.path.abspath(config.get("outbox_path") or DEFAULT_BRIDGE_OUTBOX_PATH)
+        )
+        # Конфигурации discovery публикует узел, который обслуживает устройство
+        self.discovery = DiscoveryPublisher(
+            self.mqtt, config.get("discovery_prefix", DEFAULT_DISCOVERY_PREFIX), config.get("discovery_cache")
+        ) if config.get("discovery", True) else None
+        # Запись трафика узла для воспроизведения (benchmarks/bench_replay.py)
+        self.trace = TraceRecorder(config["trace_path"]) if config.get("trace_path") else None
+        self.mqtt.trace = self.trace
+
+        # mac -> (время, rssi, BLEDevice) последней рекламы
+        self._seen = {}
+        self.petkit_devices = {}
+        self.device_health = {}
+        self.poll_schedules = {}
+        self.data = {}
+        self._scanner = None
+        self._unsubscribe = []
+        self._tasks = []
+        self._stopped = asyncio.Event()
+
+    def _node_topic(self, node):
+        return f"{self.base_topic}/nodes/{node}"
+
+    def _lease_topic(self, mac):
+        return f"{self.base_topic}/lease/{mac.replace(':', '')}"
+
+    def _mac_from_topic(self, topic):
+        key = topic.rsplit("/", 1)[-1].upper()
+        for mac in self.device_configs:
+            if mac.replace(":", "") == key:
+                return mac
+        return None
+
+    @staticmethod
+    def _mqtt_topic(device_config):
+        mac = device_config["mac"]
+        return device_config.get("mqtt_topic", f"petkit/w5/{mac.replace(':', '')}")
+
+    async def async_run(self):
+        """Работа моста до вызова async_stop."""
+        await self.async_start()
+        try:
+            await self._stopped.wait()
+        finally:
+            await self.async_shutdown()
+
+    async def async_start(self):
+        """Подключение к брокеру, запуск сканирования и цикла узла."""
+        self._unsubscribe = [
+            self.mqtt.async_subscribe(f"{self.base_topic}/nodes/+", self._on_node_message, qos=1),
+            self.mqtt.async_subscribe(f"{self.base_topic}/lease/+", self._on_lease_message, qos=1),
+        ]
+        await self.outbox.async_start()
+        if self.discovery:
+            await self.discovery.async_start()
+        await self.mqtt.async_start()
+
+        scanner_kwargs = {"adapter": self.adapter} if self.adapter else {}
+        self._scanner = BleakScanner(detection_callback=self._on_advertisement, **scanner_kwargs)
+        await self._scanner.start()
+
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._async_node_loop()), loop.create_task(self._async_poll_loop())]
+        _LOGGER.info(f"Мост {self.node_id} запущен, устройств в конфигурации: {len(self.device_configs)}")
+
+    def async_stop(self):
+        """Запрос остановки (можно вызывать из обработчика сигнала)."""
+        self._stopped.set()
+
+    async def async_shutdown(self):
+        """Снятие аренд, отключение устройств и остановка MQTT."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._scanner is not None:
+            await self._scanner.stop()
+            self._scanner = None
+
+        for mac in list(self.petkit_devices):
+            await self._async_release(mac)
+            # Аренда снимается сразу, чтобы другой узел не ждал ttl
+            await self.mqtt.async_publish(self._lease_topic(mac), "", qos=1, retain=True)
+        await self.mqtt.async_publish(self._node_topic(self.node_id), "", qos=1, retain=True)
+
+        for unsubscribe in self._unsubscribe:
+            unsubscribe()
+        self._unsubscribe = []
+        if self.discovery:
+            await self.discovery.async_stop()
+        await self.outbox.async_stop()
+        await self.mqtt.async_stop()
+        if self.trace:
+            await self.trace.async_flush()
+        _LOGGER.info(f"Мост {self.node_id} остановлен")
+
+    # Сообщения других узлов
+
+    def _on_node_message(self, topic, payload):
+        node = topic.rsplit("/", 1)[-1]
+        if not payload:
+            self.leases.remove_node(node)
+            return
+        try:
+            rssi = json.loads(payload).get("rssi", {})
+        except (ValueError, AttributeError):
+            _LOGGER.warning(f"Некорректное сообщение узла {node}")
+            return
+        self.leases.update_node(node, {mac.upper(): value for mac, value in rssi.items()})
+
+    def _on_lease_message(self, topic, payload):
+        mac = self._mac_from_topic(topic)
+        if mac is None:
+            return
+        if not payload:
+            self.leases.clear_lease(mac)
+            return
+        try:
+            node = json.loads(payload)["node"]
+        except (ValueError, KeyError, TypeError):
+            _LOGGER.warning(f"Некорректная аренда {topic}")
+            return
+        self.leases.update_lease(mac, node)
+
+    # Реклама BLE
+
+    def _on_advertisement(self, ble_device, advertisement_data):
+        mac = ble_device.address.upper()
+        if mac not in self.device_configs:
+            return
+        self._seen[mac] = (time.monotonic(), advertisement_data.rssi, ble_device)
+
+        device = self.petkit_devices.get(mac)
+        if device is None:
+            return
+        previous = device.last_data
+        status = device.handle_advertisement(
+            advertisement_data.service_data, advertisement_data.manufacturer_data, advertisement_data.rssi
+        )
+        if status is None:
+            return
+        if self.device_health[mac].record_success():
+            _LOGGER.info(f"Устройство {mac} снова доступно")
+
+        # Реклама повторяется часто - публикация только при изменении данных
+        current = self.data.get(mac)
+        if current is not None and current.is_online and not (status.changes(previous) & StatusField.READING):
+            return
+        self._handle_device_status(mac, status)
+
+    def _visible_rssi(self, now):
+        """RSSI устройств, которые узел видел за последние rssi_max_age секунд."""
+        return {
+            mac: rssi for mac, (seen, rssi, _) in self._seen.items()
+            if now - seen < self.rssi_max_age and rssi is not None
+        }
+
+    def _connection_candidates(self, mac):
+        """Адаптер узла как единственный кандидат: (source, rssi, BLEDevice)."""
+        seen = self._seen.get(mac)
+        if seen is None:
+            return []
+        return [(self.adapter or "local", seen[1], seen[2])]
+
+    # Распределение устройств
+
+    async def _async_node_loop(self):
+        """Публикация RSSI узла, продление аренд и перераспределение.
+
+        Первое распределение - после одного интервала, чтобы успеть
+        получить retained-сообщения других узлов и собрать RSSI.
+        """
+        first = True
+        while True:
+            now = time.monotonic()
+            rssi = self._visible_rssi(now)
+            self.leases.update_node(self.node_id, rssi, now)
+            await self.mqtt.async_publish(
+                self._node_topic(self.node_id),
+                json.dumps({"node": self.node_id, "rssi": rssi, "timestamp": time.time()}),
+                qos=1,
+                retain=True,
+            )
+            if not first:
+                await self._async_rebalance(now)
+            first = False
+            await asyncio.sleep(self.heartbeat)
+
+    async def _async_rebalance(self, now):
+        """Захват и освобождение устройств по таблице аренд."""
+        acquire, release = self.leases.plan(self.device_configs, self.petkit_devices, now)
+        for mac in release:
+            _LOGGER.info(f"Устройство {mac} передается узлу {self.leases.owner(mac, now)}")
+            await self._async_release(mac)
+        for mac in acquire:
+            self._acquire(mac)
+
+        # Аренда продлевается каждый интервал, пока узел обслуживает устройство
+        for mac in self.petkit_devices:
+            self.leases.update_lease(mac, self.node_id, now)
+            await self.mqtt.async_publish(
+                self._lease_topic(mac),
+                json.dumps({"node": self.node_id, "timestamp": time.time()}),
+                qos=1,
+                retain=True,
+            )
+
+    def _acquire(self, mac):
+        """Начало обслуживания устройства."""
+        holder = self.leases.holder(mac)
+        _LOGGER.info(f"Узел {self.node_id} берет устройство {mac}" + (f" у {holder}" if holder else ""))
+        device_config = self.device_configs[mac]
+        device = PetkitW5Device(
+            mac,
+            idle_timeout=self.idle_timeout,
+            slot_scheduler=self.slot_scheduler,
+            candidates=lambda: self._connection_candidates(mac),
+        )
+        device.set_status_callback(self._handle_device_status)
+        device.setup_mqtt(self.mqtt, self._mqtt_topic(device_config), self.mqtt_heartbeat, self.outbox)
+        if self.trace:
+            device.trace = self.trace
+            self.trace.add_device(mac, self._mqtt_topic(device_config))
+        if self.discovery:
+            # При переезде устройства конфигурации не очищаются: новый
+            # владелец публикует те же самые
+            self.discovery.add_device(device_config, self._mqtt_topic(device_config))
+        self.petkit_devices[mac] = device
+        self.device_health[mac] = DeviceHealth()
+        self.poll_schedules[mac] = AdaptivePollSchedule(self.min_poll_interval, self.max_poll_interval)
+        asyncio.get_running_loop().create_task(self._async_sync_schedule(device, device_config))
+
+    @staticmethod
+    async def _async_sync_schedule(device, device_config):
+        """Запись расписания из конфигурации (без изменений - одно чтение CRC)."""
+        try:
+            await async_sync_from_config(device, device_config)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _LOGGER.warning(f"Не удалось записать расписание в {device.mac_address}: {e}")
+
+    async def _async_release(self, mac):
+        """Прекращение обслуживания устройства."""
+        device = self.petkit_devices.pop(mac, None)
+        self.device_health.pop(mac, None)
+        self.poll_schedules.pop(mac, None)
+        self.data.pop(mac, None)
+        if device is not None:
+            await device.async_close()
+
+    # Опрос
+
+    def _handle_device_status(self, mac, status, publish=True):
+        """Новый статус из уведомлений, рекламы или опроса."""
+        previous = self.data.get(mac)
+        self.data[mac] = status
+        schedule = self.poll_schedules.get(mac)
+        if schedule is not None:
+            schedule.record(status, previous)
+
+        device = self.petkit_devices.get(mac)
+        if publish and device and device.publisher:
+            asyncio.get_running_loop().create_task(device.publish_mqtt(status))
+
+    async def _async_poll_loop(self):
+        """Опрос обслуживаемых устройств по их собственным интервалам."""
+        while True:
+            now = time.monotonic()
+            due = [mac for mac, schedule in self.poll_schedules.items() if schedule.due(now)]
+            await asyncio.gather(*(self._async_poll_device(mac) for mac in due))
+            await asyncio.sleep(1)
+
+    async def _async_poll_device(self, mac):
+        device = self.petkit_devices.get(mac)
+        if device is None:
+            return
+        status = await self.poller.async_poll(device, self.device_health[mac])
+        if self.petkit_devices.get(mac) is device:
+            # Успешный опрос уже опубликован в MQTT
+            self._handle_device_status(mac, status, publish=False)
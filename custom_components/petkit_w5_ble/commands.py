@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from .const import DEFAULT_FEED_COALESCE_WINDOW
+
+_LOGGER = logging.getLogger(__name__)
+
+class PetkitW5CommandQueue:
+    """Команды одного устройства.
+
+    Команды из MQTT, сервисов и переключателя ставятся в план
+    ConnectionPlanner устройства и выполняются по очереди в ближайшем
+    окне подключения, поэтому не пересекаются на GATT. Одинаковые
+    запросы кормления, пришедшие в пределах coalesce_window, пока
+    предыдущий еще выполняется, объединяются в одну команду. Каждая команда завершается
+    подтверждением, разобранным из ответа устройства; кормление -
+    уведомлением о завершении выдачи корма, после которого в том же окне
+    читается новый статус.
+
+    О каждой выполненной выдаче корма, откуда бы ни пришла команда,
+    сообщается через set_feed_callback - один раз на объединенную команду.
+    """
+
+    def __init__(self, device, coalesce_window=DEFAULT_FEED_COALESCE_WINDOW):
+        self.device = device
+        self.coalesce_window = coalesce_window
+        self._recent_feeds = {}
+        self._feed_callback = None
+
+    def set_feed_callback(self, callback):
+        """Callback(mac, FeedDoneFrame) после подтвержденной выдачи корма."""
+        self._feed_callback = callback
+
+    async def async_feed(self, amount):
+        """Кормление. Дубликаты в пределах окна получают общий результат."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        # Завершенное кормление не объединяется: повтор после выдачи корма -
+        # это новое кормление, а не дубликат
+        self._recent_feeds = {
+            key: entry for key, entry in self._recent_feeds.items()
+            if now - entry[0] < self.coalesce_window and not entry[1].done()
+        }
+
+        recent = self._recent_feeds.get(amount)
+        if recent:
+            _LOGGER.debug(f"Повторная команда кормления {self.device.mac_address} объединена с предыдущей")
+            return await asyncio.shield(recent[1])
+
+        future = self.device.planner.submit("feed", lambda: self.device.feed_now(amount), refresh=True)
+        future.add_done_callback(self._feed_done)
+        self._recent_feeds[amount] = (now, future)
+        return await asyncio.shield(future)
+
+    async def async_sync_time(self):
+        """Синхронизация часов устройства."""
+        return await asyncio.shield(self.device.planner.submit("sync_time", write=self.device.time_sync_write))
+
+    async def async_write_settings(self, light, sound, child_lock):
+        """Запись настроек устройства."""
+        return await asyncio.shield(self.device.planner.submit(
+            "settings", write=lambda: self.device.settings_write(light, sound, child_lock)
+        ))
+
+    async def async_sync_schedule(self, meals, settings=None):
+        """Синхронизация расписания кормлений и настроек."""
+        return await asyncio.shield(self.device.planner.submit(
+            "schedule", lambda: self.device.sync_schedule(meals, settings)
+        ))
+
+    def _feed_done(self, future):
+        if self._feed_callback is None or self._failed(future):
+            return
+        try:
+            self._feed_callback(self.device.mac_address, future.result())
+        except Exception as e:
+            _LOGGER.error(f"Ошибка обработки кормления {self.device.mac_address}: {e}")
+
+    @staticmethod
+    def _failed(future):
+        return future.done() and (future.cancelled() or future.exception() is not None)
@@ -7,9 +7,32 @@ from .const import (
     DOMAIN, CONF_DEVICES, CONF_MAC, CONF_NAME, CONF_MQTT_TOPIC,
     CONF_WIFI_SSID, CONF_WIFI_PASSWORD, CONF_MQTT_BROKER,
     CONF_MQTT_PORT, CONF_MQTT_USER, CONF_MQTT_PASSWORD,
-    DEFAULT_NAME, DEFAULT_MQTT_TOPIC
+    CONF_MAX_CONCURRENCY, CONF_DEVICE_TIMEOUT, CONF_IDLE_TIMEOUT, CONF_MQTT_HEARTBEAT, CONF_ADAPTER_SLOTS,
+    CONF_DIAGNOSTIC_SENSORS, CONF_MIN_POLL_INTERVAL, CONF_MAX_POLL_INTERVAL, CONF_MQTT_DISCOVERY,
+    CONF_TRACE_RECORDING,
+    DEFAULT_NAME, DEFAULT_MQTT_TOPIC,
+    DEFAULT_MAX_CONCURRENCY, DEFAULT_DEVICE_TIMEOUT, DEFAULT_IDLE_TIMEOUT,
+    DEFAULT_MQTT_HEARTBEAT, DEFAULT_ADAPTER_SLOTS, DEFAULT_DIAGNOSTIC_SENSORS, DEFAULT_MQTT_DISCOVERY,
+    DEFAULT_MIN_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL, DEFAULT_TRACE_RECORDING
 )
 
+def _device_topic(user_input, mac):
+    """Топик устройства: введенный или свой для каждого MAC.
+
+    Общий топик по умолчанию недопустим: команда из <topic>/cmd
+    ушла бы сразу всем кормушкам.
+    """
+    topic = user_input.get(CONF_MQTT_TOPIC, "").strip().rstrip("/")
+    return topic or f"{DEFAULT_MQTT_TOPIC}/{mac.upper().replace(':', '')}"
+
+def _device_schema():
+    return vol.Schema({
+        vol.Required(CONF_NAME, default=DEFAULT_NAME): str,
+        vol.Required(CONF_MAC): str,
+        # Пустое значение - petkit/w5/<MAC без двоеточий>
+        vol.Optional(CONF_MQTT_TOPIC, default=""): str,
+    })
+
 class PetkitW5ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Конфигурационный flow для Petkit W5."""
 
@@ -60,24 +83,23 @@ class PetkitW5ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         if user_input is not None:
             # Валидация MAC адреса
             mac = user_input[CONF_MAC]
+            topic = _device_topic(user_input, mac)
             if not self._is_valid_mac(mac):
                 errors[CONF_MAC] = "invalid_mac"
+            elif topic in (device[CONF_MQTT_TOPIC] for device in self.devices):
+                errors[CONF_MQTT_TOPIC] = "duplicate_topic"
             
             if not errors:
                 self.devices.append({
                     CONF_MAC: mac.upper(),
                     CONF_NAME: user_input[CONF_NAME],
-                    CONF_MQTT_TOPIC: user_input[CONF_MQTT_TOPIC]
+                    CONF_MQTT_TOPIC: topic
                 })
                 
                 # Спросить, нужно ли добавить еще устройства
                 return await self.async_step_add_another()
         
-        data_schema = vol.Schema({
-            vol.Required(CONF_NAME, default=DEFAULT_NAME): str,
-            vol.Required(CONF_MAC): str,
-            vol.Required(CONF_MQTT_TOPIC, default=DEFAULT_MQTT_TOPIC): str,
-        })
+        data_schema = _device_schema()
         
         return self.async_show_form(
             step_id="device",
@@ -127,7 +149,7 @@ class PetkitW5OptionsFlowHandler(config_entries.OptionsFlow):
         """Управление устройствами."""
         return self.async_show_menu(
             step_id="init",
-            menu_options=["add_device", "manage_devices"]
+            menu_options=["add_device", "manage_devices", "settings"]
         )
 
     async def async_step_add_device(self, user_input=None):
@@ -136,16 +158,19 @@ class PetkitW5OptionsFlowHandler(config_entries.OptionsFlow):
         
         if user_input is not None:
             mac = user_input[CONF_MAC]
+            topic = _device_topic(user_input, mac)
+            devices = self.config_entry.data.get(CONF_DEVICES, []).copy()
             if not self._is_valid_mac(mac):
                 errors[CONF_MAC] = "invalid_mac"
+            elif topic in (_device_topic(device, device[CONF_MAC]) for device in devices):
+                errors[CONF_MQTT_TOPIC] = "duplicate_topic"
             
             if not errors:
                 # Добавляем устройство к существующим
-                devices = self.config_entry.data.get(CONF_DEVICES, []).copy()
                 devices.append({
                     CONF_MAC: mac.upper(),
                     CONF_NAME: user_input[CONF_NAME],
-                    CONF_MQTT_TOPIC: user_input[CONF_MQTT_TOPIC]
+                    CONF_MQTT_TOPIC: topic
                 })
                 
                 # Обновляем конфигурацию
@@ -156,13 +181,9 @@ class PetkitW5OptionsFlowHandler(config_entries.OptionsFlow):
                     self.config_entry, data=new_data
                 )
                 
-                return self.async_create_entry(title="", data={})
+                return self.async_create_entry(title="", data=dict(self.config_entry.options))
         
-        data_schema = vol.Schema({
-            vol.Required(CONF_NAME, default=DEFAULT_NAME): str,
-            vol.Required(CONF_MAC): str,
-            vol.Required(CONF_MQTT_TOPIC, default=DEFAULT_MQTT_TOPIC): str,
-        })
+        data_schema = _device_schema()
         
         return self.async_show_form(
             step_id="add_device",
@@ -173,7 +194,62 @@ class PetkitW5OptionsFlowHandler(config_entries.OptionsFlow):
     async def async_step_manage_devices(self, user_input=None):
         """Управление существующими устройствами."""
         # Здесь можно реализовать удаление/редактирование устройств
-        return self.async_create_entry(title="", data={})
+        return self.async_create_entry(title="", data=dict(self.config_entry.options))
+
+    async def async_step_settings(self, user_input=None):
+        """Настройки опроса устройств."""
+        options = self.config_entry.options
+        
+        if user_input is not None:
+            return self.async_create_entry(title="", data={**options, **user_input})
+        
+        data_schema = vol.Schema({
+            vol.Required(
+                CONF_MAX_CONCURRENCY,
+                default=options.get(CONF_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY),
+            ): vol.All(int, vol.Range(min=1, max=32)),
+            vol.Required(
+                CONF_DEVICE_TIMEOUT,
+                default=options.get(CONF_DEVICE_TIMEOUT, DEFAULT_DEVICE_TIMEOUT),
+            ): vol.All(int, vol.Range(min=5, max=120)),
+            vol.Required(
+                CONF_IDLE_TIMEOUT,
+                default=options.get(CONF_IDLE_TIMEOUT, DEFAULT_IDLE_TIMEOUT),
+            ): vol.All(int, vol.Range(min=0, max=3600)),
+            vol.Required(
+                CONF_MQTT_HEARTBEAT,
+                default=options.get(CONF_MQTT_HEARTBEAT, DEFAULT_MQTT_HEARTBEAT),
+            ): vol.All(int, vol.Range(min=60, max=86400)),
+            vol.Required(
+                CONF_ADAPTER_SLOTS,
+                default=options.get(CONF_ADAPTER_SLOTS, DEFAULT_ADAPTER_SLOTS),
+            ): vol.All(int, vol.Range(min=1, max=10)),
+            vol.Required(
+                CONF_MIN_POLL_INTERVAL,
+                default=options.get(CONF_MIN_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL),
+            ): vol.All(int, vol.Range(min=5, max=600)),
+            vol.Required(
+                CONF_MAX_POLL_INTERVAL,
+                default=options.get(CONF_MAX_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL),
+            ): vol.All(int, vol.Range(min=30, max=86400)),
+            vol.Required(
+                CONF_DIAGNOSTIC_SENSORS,
+                default=options.get(CONF_DIAGNOSTIC_SENSORS, DEFAULT_DIAGNOSTIC_SENSORS),
+            ): bool,
+            vol.Required(
+                CONF_MQTT_DISCOVERY,
+                default=options.get(CONF_MQTT_DISCOVERY, DEFAULT_MQTT_DISCOVERY),
+            ): bool,
+            vol.Required(
+                CONF_TRACE_RECORDING,
+                default=options.get(CONF_TRACE_RECORDING, DEFAULT_TRACE_RECORDING),
+            ): bool,
+        })
+        
+        return self.async_show_form(
+            step_id="settings",
+            data_schema=data_schema,
+        )
 
     def _is_valid_mac(self, mac):
         """Проверка валидности MAC адреса."""
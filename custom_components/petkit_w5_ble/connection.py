@@ -0,0 +1,220 @@
+import asyncio
+import contextlib
+import logging
+from bleak import BleakClient
+from .const import DEFAULT_IDLE_TIMEOUT
+from .metrics import DeviceMetrics, STAGE_CONNECT, STAGE_SERVICES
+from .scheduler import PRIORITY_POLL
+
+_LOGGER = logging.getLogger(__name__)
+
+class PetkitW5Connection:
+    """Постоянное BLE подключение к одному устройству.
+
+    Один BleakClient живет все время работы устройства и переиспользуется
+    при переподключениях. Найденные характеристики сервиса кэшируются,
+    поэтому после переподключения не нужен повторный поиск сервисов.
+    Разрыв связи определяется по disconnected_callback, а неиспользуемое
+    подключение закрывается по таймауту простоя.
+
+    Если задан slot_scheduler, перед подключением занимается слот на
+    адаптере из candidates() (список (source, rssi, ble_device)), и
+    подключение идет через BLEDevice этого адаптера.
+    """
+
+    def __init__(
+        self,
+        address,
+        service_uuid,
+        idle_timeout=DEFAULT_IDLE_TIMEOUT,
+        on_disconnect=None,
+        slot_scheduler=None,
+        candidates=None,
+        metrics=None,
+        client_factory=None,
+    ):
+        self.address = address
+        self.service_uuid = service_uuid
+        self.idle_timeout = idle_timeout
+        self.client = None
+        self.is_connected = False
+        self.source = None
+        self.slot_scheduler = slot_scheduler
+        self._candidates = candidates
+        self.metrics = metrics or DeviceMetrics()
+        # Замена BleakClient (воспроизведение записанного трафика)
+        self.client_factory = client_factory or BleakClient
+        self._was_connected = False
+        self._ble_device = None
+        self._client_source = None
+        self._on_disconnect = on_disconnect
+        self._lock = asyncio.Lock()
+        self._idle_handle = None
+        self._evicting = False
+        self._active = 0
+        self._services = None
+        self._characteristics = {}
+
+    async def connect(self, priority=PRIORITY_POLL):
+        """Подключение (или проверка уже открытого подключения)."""
+        async with self._lock:
+            if self.is_connected:
+                self.touch()
+                return True
+
+            await self._acquire_slot(priority)
+            if self.client is None:
+                self.client = self.client_factory(
+                    self._ble_device or self.address,
+                    disconnected_callback=self._handle_disconnect,
+                    services=[self.service_uuid],
+                )
+
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            try:
+                # Если сервисы уже были найдены, BlueZ может взять их из кэша
+                with self.metrics.timer(STAGE_CONNECT):
+                    await self.client.connect(dangerous_use_bleak_cache=bool(self._characteristics))
+                self.is_connected = self.client.is_connected
+            finally:
+                if not self.is_connected:
+                    self.metrics.count("connect_failures")
+                    self._release_slot()
+            if not self.is_connected:
+                return False
+
+            self.metrics.count("reconnects" if self._was_connected else "connects")
+            self._was_connected = True
+            with self.metrics.timer(STAGE_SERVICES):
+                self._resolve_characteristics()
+            self.touch()
+            _LOGGER.debug(f"Подключение к {self.address} за {(loop.time() - started) * 1000:.0f} мс")
+            return True
+
+    async def disconnect(self):
+        """Отключение от устройства."""
+        self._cancel_idle()
+        async with self._lock:
+            if self.client is not None and self.is_connected:
+                await self.client.disconnect()
+            self.is_connected = False
+            self._release_slot()
+
+    def characteristic(self, uuid):
+        """Характеристика из кэша (или UUID, если ее нет в кэше)."""
+        return self._characteristics.get(uuid, uuid)
+
+    @contextlib.contextmanager
+    def active(self):
+        """Операция на открытом подключении (чтение, команда с ожиданием ответа).
+
+        Пока операция идет, подключение не считается простаивающим.
+        """
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self.touch()
+
+    def try_evict(self):
+        """Отключение по просьбе планировщика, если подключение простаивает.
+
+        Пока начатое отключение не завершилось, повторные просьбы
+        отклоняются - иначе одно освобождение засчитывалось бы нескольким
+        ожидающим запросам.
+        """
+        if not self.is_connected or self._lock.locked() or self._active or self._evicting:
+            return False
+        self._cancel_idle()
+        self._evicting = True
+        asyncio.get_running_loop().create_task(self._async_evict())
+        return True
+
+    def release_if_contended(self):
+        """Отключение после окна операций, если слот адаптера ждут другие устройства."""
+        if self.slot_scheduler is not None and self.slot_scheduler.contended(self.address):
+            return self.try_evict()
+        return False
+
+    async def _async_evict(self):
+        try:
+            # Пока отключение ждало запуска, могло открыться окно операций -
+            # тогда слот освободится после него
+            if self._active:
+                return
+            await self.disconnect()
+            self._active = 0
+        finally:
+            self._evicting = False
+
+    async def _acquire_slot(self, priority):
+        """Занятие слота адаптера и выбор BLEDevice для подключения."""
+        if self.slot_scheduler is None:
+            return
+
+        candidates = self._candidates() if self._candidates else []
+        self.source = await self.slot_scheduler.acquire(
+            self.address,
+            [(source, rssi) for source, rssi, _ in candidates],
+            priority,
+            self.try_evict,
+        )
+        ble_device = next((device for source, _, device in candidates if source == self.source), None)
+        if ble_device is not None and self.source != self._client_source:
+            # Другой адаптер - новый клиент; кэш характеристик обновится
+            # после подключения, если изменится набор сервисов
+            self._ble_device = ble_device
+            self._client_source = self.source
+            self.client = None
+
+    def _release_slot(self):
+        if self.slot_scheduler is not None:
+            self.slot_scheduler.release(self.address)
+
+    def touch(self):
+        """Отметка активности - перезапуск таймера простоя."""
+        if not self.idle_timeout:
+            return
+        self._cancel_idle()
+        loop = asyncio.get_running_loop()
+        self._idle_handle = loop.call_later(self.idle_timeout, self._idle_expired)
+
+    def _resolve_characteristics(self):
+        """Заполнение кэша характеристик, если набор сервисов изменился."""
+        services = self.client.services
+        if services is self._services and self._characteristics:
+            return
+
+        service = services.get_service(self.service_uuid) if services is not None else None
+        if service is None:
+            _LOGGER.warning(f"Сервис {self.service_uuid} не найден у {self.address}")
+            self._characteristics = {}
+            return
+
+        self._characteristics = {char.uuid: char for char in service.characteristics}
+        self._services = services
+
+    def _cancel_idle(self):
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+
+    def _idle_expired(self):
+        self._idle_handle = None
+        if self._active:
+            self.touch()
+        elif self.is_connected:
+            _LOGGER.debug(f"Отключение {self.address} по таймауту простоя")
+            asyncio.get_running_loop().create_task(self.disconnect())
+
+    def _handle_disconnect(self, client):
+        """Callback bleak о разрыве подключения."""
+        self.is_connected = False
+        self.metrics.count("disconnects")
+        self._cancel_idle()
+        self._release_slot()
+        _LOGGER.info(f"Подключение к {self.address} разорвано")
+        if self._on_disconnect:
+            self._on_disconnect()
@@ -6,6 +6,112 @@ CONF_DEVICES = "devices"
 CONF_MAC = "mac"
 CONF_NAME = "name"
 CONF_MQTT_TOPIC = "mqtt_topic"
+# Расписание кормлений и настройки, которые записываются в устройство
+CONF_SCHEDULE = "schedule"
+CONF_SETTINGS = "settings"
+
+CONF_WIFI_SSID = "wifi_ssid"
+CONF_WIFI_PASSWORD = "wifi_password"
+CONF_MQTT_BROKER = "mqtt_broker"
+CONF_MQTT_PORT = "mqtt_port"
+CONF_MQTT_USER = "mqtt_user"
+CONF_MQTT_PASSWORD = "mqtt_password"
 
 DEFAULT_NAME = "Petkit W5"
 DEFAULT_MQTT_TOPIC = "petkit/w5"
+DEFAULT_FEED_AMOUNT = 10
+
+SIGNAL_DEVICES_ADDED = f"{DOMAIN}_devices_added"
+
+SERVICE_FEED = "feed"
+SERVICE_SET_SCHEDULE = "set_schedule"
+ATTR_AMOUNT = "amount"
+ATTR_MEALS = "meals"
+ATTR_TIME = "time"
+ATTR_DAYS = "days"
+ATTR_LIGHT = "light"
+ATTR_SOUND = "sound"
+ATTR_CHILD_LOCK = "child_lock"
+
+# Параллельный опрос устройств
+CONF_MAX_CONCURRENCY = "max_concurrency"
+CONF_DEVICE_TIMEOUT = "device_timeout"
+CONF_IDLE_TIMEOUT = "idle_timeout"
+CONF_MQTT_HEARTBEAT = "mqtt_heartbeat"
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_DEVICE_TIMEOUT = 20
+DEFAULT_IDLE_TIMEOUT = 300
+DEFAULT_MQTT_HEARTBEAT = 900
+DEFAULT_UPDATE_INTERVAL = 60
+
+# Защита от недоступных устройств (circuit breaker)
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_BACKOFF_BASE = 30
+DEFAULT_BACKOFF_MAX = 1800
+DEFAULT_PROBE_TIMEOUT = 5
+
+# Очередь команд
+DEFAULT_ACK_TIMEOUT = 5
+# Сколько ждать уведомления о завершении выдачи корма
+DEFAULT_DISPENSE_TIMEOUT = 30
+DEFAULT_FEED_COALESCE_WINDOW = 5
+
+# Слоты подключений BLE адаптеров
+CONF_ADAPTER_SLOTS = "adapter_slots"
+DEFAULT_ADAPTER_SLOTS = 3
+
+# История показаний
+DEFAULT_HISTORY_SIZE = 4096
+DEFAULT_FEED_HISTORY_SIZE = 512
+DEFAULT_HISTORY_FLUSH_INTERVAL = 300
+# Не чаще одной записи неизменных показаний за этот интервал
+DEFAULT_HISTORY_SAMPLE_INTERVAL = 900
+# Окно для расчета расхода корма
+DEFAULT_CONSUMPTION_WINDOW = 86400
+
+# Очередь MQTT сообщений при недоступности брокера
+DEFAULT_OUTBOX_MAX_EVENTS = 1000
+DEFAULT_OUTBOX_BATCH_SIZE = 20
+# Сообщений в секунду при отправке очереди
+DEFAULT_OUTBOX_RATE = 50
+
+# Диагностические сенсоры (таймеры этапов и счетчики)
+CONF_DIAGNOSTIC_SENSORS = "diagnostic_sensors"
+DEFAULT_DIAGNOSTIC_SENSORS = False
+
+# Адаптивный интервал опроса устройств
+CONF_MIN_POLL_INTERVAL = "min_poll_interval"
+CONF_MAX_POLL_INTERVAL = "max_poll_interval"
+DEFAULT_MIN_POLL_INTERVAL = 15
+DEFAULT_MAX_POLL_INTERVAL = 900
+# Сколько секунд опрос остается частым после кормления
+DEFAULT_POLL_BOOST_DURATION = 120
+# Заряд батареи (%), ниже которого опрос становится реже
+DEFAULT_LOW_BATTERY = 20
+
+# Автономный мост BLE -> MQTT
+DEFAULT_BRIDGE_TOPIC = "petkit/w5/bridge"
+DEFAULT_BRIDGE_HEARTBEAT = 15
+# Журнал неотправленных MQTT событий, если outbox_path не задан (от текущего каталога)
+DEFAULT_BRIDGE_OUTBOX_PATH = "petkit_w5_outbox.jsonl"
+# Узел или аренда без обновления дольше этого времени считаются потерянными
+DEFAULT_LEASE_TTL = 45
+# На сколько дБ другой узел должен видеть устройство лучше, чтобы забрать его
+DEFAULT_LEASE_HYSTERESIS = 8
+# RSSI старше этого времени не учитывается
+DEFAULT_RSSI_MAX_AGE = 60
+
+# MQTT discovery для других экземпляров Home Assistant и MQTT клиентов
+CONF_MQTT_DISCOVERY = "mqtt_discovery"
+DEFAULT_MQTT_DISCOVERY = False
+DEFAULT_DISCOVERY_PREFIX = "homeassistant"
+
+# Запись BLE/MQTT трафика для воспроизведения
+CONF_TRACE_RECORDING = "trace_recording"
+DEFAULT_TRACE_RECORDING = False
+TRACE_DIR = "petkit_w5_ble_traces"
+# Запись останавливается после этого размера файла
+DEFAULT_TRACE_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TRACE_FLUSH_BYTES = 256 * 1024
+DEFAULT_TRACE_FLUSH_INTERVAL = 30
@@ -1,8 +1,37 @@
+from homeassistant.components import bluetooth
+from homeassistant.core import callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import STORAGE_DIR
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 from datetime import timedelta
 import asyncio
 import logging
+import math
+import time
+from .const import (
+    CONF_MAX_CONCURRENCY, CONF_DEVICE_TIMEOUT, CONF_IDLE_TIMEOUT, CONF_MQTT_HEARTBEAT,
+    CONF_ADAPTER_SLOTS, DEFAULT_ADAPTER_SLOTS, DEFAULT_MAX_CONCURRENCY, DEFAULT_DEVICE_TIMEOUT, DEFAULT_IDLE_TIMEOUT,
+    DEFAULT_MQTT_HEARTBEAT,
+    CONF_DEVICES, DOMAIN, SIGNAL_DEVICES_ADDED, DEFAULT_FEED_AMOUNT,
+    DEFAULT_HISTORY_FLUSH_INTERVAL, DEFAULT_HISTORY_SAMPLE_INTERVAL,
+    CONF_MIN_POLL_INTERVAL, CONF_MAX_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL,
+    CONF_MQTT_DISCOVERY, DEFAULT_MQTT_DISCOVERY, CONF_SCHEDULE, CONF_SETTINGS,
+    CONF_TRACE_RECORDING, DEFAULT_TRACE_RECORDING, TRACE_DIR
+)
+from .discovery import DiscoveryPublisher
+from .health import DeviceHealth
+from .history import TelemetryHistory
+from .metrics import LoopLagMonitor
+from .models import DeviceStatus, PetkitW5Status, StatusField
+from .mqtt_client import PetkitMqttClient
+from .outbox import MqttOutbox
 from .petkit_device import PetkitW5Device
+from .polling import AdaptivePollSchedule, DevicePoller
+from .schedule import async_sync_from_config, meal_config, parse_meals
+from .scheduler import ConnectionSlotScheduler
+from .trace import TraceRecorder
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -15,10 +44,29 @@ class PetkitW5Coordinator(DataUpdateCoordinator):
             hass,
             _LOGGER,
             name="Petkit W5",
-            update_interval=timedelta(seconds=60),
+            # Координатор проверяет устройства с минимальным интервалом,
+            # а опрашивает только те, чей собственный интервал истек
+            update_interval=timedelta(
+                seconds=entry.options.get(CONF_MIN_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL)
+            ),
         )
         self.entry = entry
-        self.devices = entry.data.get("devices", [])
+        self.devices = list(entry.data.get(CONF_DEVICES, []))
+        # Данные заполняются по мере ответа устройств
+        self.data = {}
+        # Последние данные, о которых были уведомлены сущности
+        self._notified_data = {}
+        self._notified_success = True
+        self._notified_health = {}
+        
+        # Ограничение параллельного опроса и таймаут на одно устройство
+        self.max_concurrency = entry.options.get(CONF_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY)
+        self.device_timeout = entry.options.get(CONF_DEVICE_TIMEOUT, DEFAULT_DEVICE_TIMEOUT)
+        self.poller = DevicePoller(self.max_concurrency, self.device_timeout)
+        self.idle_timeout = entry.options.get(CONF_IDLE_TIMEOUT, DEFAULT_IDLE_TIMEOUT)
+        self.mqtt_heartbeat = entry.options.get(CONF_MQTT_HEARTBEAT, DEFAULT_MQTT_HEARTBEAT)
+        self.min_poll_interval = entry.options.get(CONF_MIN_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL)
+        self.max_poll_interval = entry.options.get(CONF_MAX_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL)
         
         # Настройки подключения
         self.mqtt_config = {
@@ -28,49 +76,384 @@ class PetkitW5Coordinator(DataUpdateCoordinator):
             "password": entry.data.get("mqtt_password", "")
         }
         
+        # Слоты подключений адаптеров общие для всех устройств записи
+        self.slot_scheduler = ConnectionSlotScheduler(
+            default_slots=entry.options.get(CONF_ADAPTER_SLOTS, DEFAULT_ADAPTER_SLOTS)
+        )
+        
+        # Одно MQTT подключение на всю конфигурационную запись
+        self.mqtt = PetkitMqttClient(self.mqtt_config) if self.mqtt_config["broker"] else None
+        # Сообщения, не отправленные из-за недоступности брокера
+        self.outbox = MqttOutbox(
+            self.mqtt, hass.config.path(STORAGE_DIR, f"{DOMAIN}_outbox_{entry.entry_id}.jsonl")
+        ) if self.mqtt else None
+        # Retained конфигурации MQTT discovery для других потребителей
+        self.discovery = DiscoveryPublisher(
+            self.mqtt, cache_path=hass.config.path(STORAGE_DIR, f"{DOMAIN}_discovery_{entry.entry_id}.json")
+        ) if self.mqtt and entry.options.get(CONF_MQTT_DISCOVERY, DEFAULT_MQTT_DISCOVERY) else None
+        # Запись BLE/MQTT трафика для воспроизведения (benchmarks/bench_replay.py)
+        self.trace = TraceRecorder(
+            hass.config.path(TRACE_DIR, f"{entry.entry_id}_{int(time.time())}.pw5t")
+        ) if entry.options.get(CONF_TRACE_RECORDING, DEFAULT_TRACE_RECORDING) else None
+        if self.mqtt:
+            self.mqtt.trace = self.trace
+        
         self.petkit_devices = {}
+        self.device_health = {}
+        self.poll_schedules = {}
+        self.history = {}
+        # Устройства, расписание которых не удалось записать (повтор при появлении в сети)
+        self.schedule_pending = set()
+        self._unsub_advertisements = None
+        self._unsub_history_flush = None
+        self.loop_monitor = LoopLagMonitor()
+        # Настройки, при изменении которых нужна полная перезагрузка
+        self.entry_settings = self.settings_snapshot(entry)
         self._setup_devices()
 
+    @staticmethod
+    def settings_snapshot(entry):
+        """Настройки записи без списка устройств."""
+        data = {key: value for key, value in entry.data.items() if key != CONF_DEVICES}
+        return data, dict(entry.options)
+
     def _setup_devices(self):
         """Создание объектов устройств."""
         for device_config in self.devices:
-            mac = device_config["mac"]
-            mqtt_topic = device_config.get("mqtt_topic", f"petkit/w5/{mac.replace(':', '')}")
-            
-            device = PetkitW5Device(mac, self.mqtt_config)
-            device.setup_mqtt(mqtt_topic)
-            self.petkit_devices[mac] = device
+            self._setup_device(device_config)
 
-    async def _async_update_data(self):
-        """Обновление данных от устройств."""
-        data = {}
+    @staticmethod
+    def _mqtt_topic(device_config):
+        mac = device_config["mac"]
+        return device_config.get("mqtt_topic", f"petkit/w5/{mac.replace(':', '')}")
+
+    def _setup_device(self, device_config):
+        """Создание объекта одного устройства."""
+        mac = device_config["mac"]
         
-        for device_config in self.devices:
-            mac = device_config["mac"]
+        device = PetkitW5Device(
+            mac,
+            idle_timeout=self.idle_timeout,
+            slot_scheduler=self.slot_scheduler,
+            candidates=lambda: self._connection_candidates(mac),
+        )
+        device.set_status_callback(self._handle_device_status)
+        device.commands.set_feed_callback(self._handle_feed)
+        device.set_schedule_handler(self.async_set_schedule)
+        if self.mqtt:
+            device.setup_mqtt(self.mqtt, self._mqtt_topic(device_config), self.mqtt_heartbeat, self.outbox)
+        if self.trace:
+            device.trace = self.trace
+            self.trace.add_device(mac, self._mqtt_topic(device_config))
+        if self.discovery:
+            self.discovery.add_device(device_config, self._mqtt_topic(device_config))
+        self.petkit_devices[mac] = device
+        self.device_health[mac] = DeviceHealth()
+        self.poll_schedules[mac] = AdaptivePollSchedule(self.min_poll_interval, self.max_poll_interval)
+        self.history[mac] = TelemetryHistory()
+
+    async def async_update_devices(self, devices):
+        """Применение нового списка устройств без перезапуска остальных.
+
+        Новые устройства получают сессии и сущности, удаленные корректно
+        отключаются, а неизменные сохраняют подключения и данные.
+        """
+        old = {device_config["mac"]: device_config for device_config in self.devices}
+        new = {device_config["mac"]: device_config for device_config in devices}
+        added = [new[mac] for mac in new.keys() - old.keys()]
+        removed = old.keys() - new.keys()
+        
+        # Порядок важен: цикл опроса может начаться на любом await. Новые
+        # устройства получают состояние до попадания в self.devices, а
+        # удаляемые отключаются уже после того, как из него исключены.
+        for device_config in added:
+            self._setup_device(device_config)
+        self.devices = list(devices)
+        
+        for mac in new.keys() & old.keys():
+            if self._schedule_config(new[mac]) != self._schedule_config(old[mac]):
+                self.entry.async_create_background_task(
+                    self.hass, self._async_sync_schedule(mac), f"{DOMAIN}_schedule_{mac}"
+                )
+            topic = self._mqtt_topic(new[mac])
             device = self.petkit_devices[mac]
+            if self.mqtt and topic != device.mqtt_topic:
+                device.setup_mqtt(self.mqtt, topic, self.mqtt_heartbeat, self.outbox)
+            if self.discovery:
+                # Имя или топик могли измениться; неизменные конфигурации не публикуются
+                self.discovery.add_device(new[mac], topic)
+        
+        for mac in removed:
+            await self._async_remove_device(mac)
+        
+        if added:
+            async_dispatcher_send(self.hass, f"{SIGNAL_DEVICES_ADDED}_{self.entry.entry_id}", added)
+            self.entry.async_create_background_task(
+                self.hass,
+                self._async_initial_updates([device_config["mac"] for device_config in added]),
+                f"{DOMAIN}_add_devices_{self.entry.entry_id}",
+            )
+        
+        _LOGGER.info(f"Список устройств обновлен: добавлено {len(added)}, удалено {len(removed)}")
+
+    async def _async_remove_device(self, mac):
+        """Отключение удаленного устройства и удаление его сущностей."""
+        device = self.petkit_devices.pop(mac)
+        self.device_health.pop(mac, None)
+        self.poll_schedules.pop(mac, None)
+        self.schedule_pending.discard(mac)
+        if self.discovery:
+            self.discovery.remove_device(mac)
+        await device.async_close()
+        history = self.history.pop(mac, None)
+        if history is not None:
+            await self._async_flush_device_history(mac, history)
+        
+        if mac in self.data:
+            self.data = {key: value for key, value in self.data.items() if key != mac}
+        
+        registry = er.async_get(self.hass)
+        for entity in er.async_entries_for_config_entry(registry, self.entry.entry_id):
+            if entity.unique_id.startswith(f"{mac}_"):
+                registry.async_remove(entity.entity_id)
+
+    async def async_start_mqtt(self):
+        """Запуск общего MQTT подключения."""
+        if self.mqtt:
+            await self.outbox.async_start()
+            if self.discovery:
+                await self.discovery.async_start()
+            await self.mqtt.async_start()
+
+    async def async_start(self):
+        """Фоновый запуск: MQTT и первый опрос устройств.
+
+        Выполняется после регистрации сущностей. Каждое устройство
+        обновляется сразу после ответа, не дожидаясь остальных.
+        """
+        self.loop_monitor.start()
+        await self.async_start_mqtt()
+        self._unsub_history_flush = async_track_time_interval(
+            self.hass, self._async_flush_history, timedelta(seconds=DEFAULT_HISTORY_FLUSH_INTERVAL)
+        )
+        await self._async_initial_updates(list(self.petkit_devices))
+
+    async def _async_initial_updates(self, macs):
+        """Первый опрос группы устройств."""
+        await asyncio.gather(*(self._async_initial_update(mac) for mac in macs))
+
+    async def _async_initial_update(self, mac):
+        """Загрузка истории и первый опрос одного устройства."""
+        data = await self.hass.async_add_executor_job(TelemetryHistory.read, self._history_path(mac))
+        if mac in self.history:
+            self.history[mac].load(data)
+        
+        status = await self._async_update_device(mac)
+        if mac in self.petkit_devices:
+            # Успешный опрос уже опубликован в MQTT
+            self._handle_device_status(mac, status, publish=False)
+            await self._async_sync_schedule(mac)
+
+    @callback
+    def async_update_listeners(self):
+        """Уведомление только тех сущностей, чьи поля изменились.
+
+        Контекст слушателя - (mac, StatusField): сущность обновляется, если
+        в статусе ее устройства изменилось хотя бы одно из этих полей.
+        StatusField.HEALTH отмечает смену состояния breaker устройства.
+        Слушатели без такого контекста и смена доступности координатора
+        обновляют всех, как в DataUpdateCoordinator.
+        """
+        data = self.data or {}
+        previous = self._notified_data
+        notify_all = self.last_update_success != self._notified_success
+        self._notified_data = data
+        self._notified_success = self.last_update_success
+        previous_health = self._notified_health
+        self._notified_health = {
+            mac: (health.state, health.next_retry_at) for mac, health in self.device_health.items()
+        }
+        
+        masks = {}
+        for update_callback, context in list(self._listeners.values()):
+            if notify_all or not isinstance(context, tuple):
+                update_callback()
+                continue
             
-            try:
-                # Попытка подключения
-                if not device.is_connected:
-                    await device.connect()
-                
-                # Получение данных
-                if device.is_connected:
-                    device_data = await device.get_status()
-                    # Публикация в MQTT
-                    device.publish_mqtt(device_data)
-                else:
-                    device_data = {"status": "offline"}
-                
-                data[mac] = device_data
-                
-            except Exception as e:
-                _LOGGER.error(f"Ошибка обработки устройства {mac}: {e}")
-                data[mac] = {"status": "error", "error": str(e)}
+            mac, fields = context
+            if mac not in masks:
+                status = data.get(mac)
+                masks[mac] = status.changes(previous.get(mac)) if status is not None else StatusField(0)
+                if self._notified_health.get(mac) != previous_health.get(mac):
+                    masks[mac] |= StatusField.HEALTH
+            if masks[mac] & fields:
+                update_callback()
+
+    @callback
+    def _connection_candidates(self, mac):
+        """Адаптеры, способные подключиться к устройству: (source, rssi, BLEDevice)."""
+        return [
+            (scanner_device.scanner.source, scanner_device.advertisement.rssi, scanner_device.ble_device)
+            for scanner_device in bluetooth.async_scanner_devices_by_address(self.hass, mac, connectable=True)
+        ]
+
+    @callback
+    def async_start_advertisement_listener(self):
+        """Пассивный прием рекламных пакетов устройств W5."""
+        self._unsub_advertisements = bluetooth.async_register_callback(
+            self.hass,
+            self._async_handle_advertisement,
+            bluetooth.BluetoothCallbackMatcher(service_uuid=PetkitW5Device.DEVICE_SERVICE_UUID),
+            bluetooth.BluetoothScanningMode.PASSIVE,
+        )
+
+    @callback
+    def _async_handle_advertisement(self, service_info, change):
+        """Обновление статуса по рекламному пакету, без GATT подключения."""
+        mac = service_info.address.upper()
+        device = self.petkit_devices.get(mac)
+        if device is None:
+            return
+        
+        previous = device.last_data
+        status = device.handle_advertisement(
+            service_info.service_data, service_info.manufacturer_data, service_info.rssi
+        )
+        if status is None:
+            return
+        
+        recovered = self.device_health[mac].record_success()
+        if recovered:
+            _LOGGER.info(f"Устройство {mac} снова доступно")
+        
+        # Реклама повторяется часто - обновление только при изменении данных
+        # или восстановлении устройства (меняется состояние breaker)
+        current = self.data.get(mac)
+        if (
+            not recovered and current is not None and current.is_online
+            and not (status.changes(previous) & StatusField.READING)
+        ):
+            return
+        self._handle_device_status(mac, status)
+
+    async def _async_update_data(self):
+        """Обновление данных от устройств.
+
+        Опрашиваются только устройства, у которых истек собственный
+        интервал опроса, - параллельно, не более max_concurrency
+        одновременно. Цикл длится не дольше, чем нужно волнам опросов по
+        max_concurrency устройств с таймаутом device_timeout каждая;
+        опрос, не уложившийся в цикл, отменяется. Для остальных устройств
+        остаются последние известные данные.
+        """
+        now = time.monotonic()
+        schedules = [
+            (device_config["mac"], self.poll_schedules.get(device_config["mac"]))
+            for device_config in self.devices
+        ]
+        tasks = {
+            self.hass.async_create_task(self._async_update_device(mac)): mac
+            for mac, schedule in schedules
+            # Устройство без состояния еще добавляется или уже удаляется
+            if schedule is not None and schedule.due(now)
+        }
+        if tasks:
+            # Опросы сверх max_concurrency ждут семафор вне своего таймаута
+            waves = math.ceil(len(tasks) / self.max_concurrency)
+            done, pending = await asyncio.wait(
+                tasks, timeout=max(self.update_interval.total_seconds(), waves * self.device_timeout)
+            )
+            for task in pending:
+                task.cancel()
+
+        previous = self.data or {}
+        data = {mac: status for mac, status in previous.items() if mac in self.petkit_devices}
+        for task, mac in tasks.items():
+            if mac not in self.petkit_devices:
+                continue
+            if task in done:
+                data[mac] = task.result()
+                self._record_history(mac, data[mac])
+                if data[mac].is_online and mac in self.schedule_pending:
+                    self.schedule_pending.discard(mac)
+                    self.hass.async_create_task(self._async_sync_schedule(mac))
+            else:
+                _LOGGER.warning(f"Опрос устройства {mac} не уложился в цикл обновления")
+                data[mac] = previous.get(mac) or PetkitW5Status(DeviceStatus.TIMEOUT)
+            schedule = self.poll_schedules.get(mac)
+            if schedule is not None:
+                schedule.record(data[mac], previous.get(mac))
         
         return data
 
-    async def feed_device(self, mac_address, amount=10):
+    async def _async_update_device(self, mac):
+        """Опрос одного устройства (лимит параллельности, таймаут, breaker)."""
+        device = self.petkit_devices.get(mac)
+        if device is None:
+            # Устройство удалено во время цикла опроса
+            return PetkitW5Status.offline()
+        return await self.poller.async_poll(device, self.device_health[mac])
+
+    @callback
+    def _handle_device_status(self, mac, status, publish=True):
+        """Обновление данных одного устройства вне цикла опроса."""
+        data = dict(self.data or {})
+        previous = data.get(mac)
+        data[mac] = status
+        # Не async_set_updated_data: тот перезапускает таймер общего опроса,
+        # и частые уведомления одного устройства откладывали бы опрос остальных
+        self.data = data
+        self.async_update_listeners()
+        self._record_history(mac, status)
+        
+        # Свежие данные из уведомлений и рекламы откладывают опрос
+        schedule = self.poll_schedules.get(mac)
+        if schedule is not None:
+            schedule.record(status, previous)
+        
+        device = self.petkit_devices.get(mac)
+        if publish and device and device.publisher:
+            self.hass.async_create_task(device.publish_mqtt(status))
+
+    def _history_path(self, mac):
+        """Файл истории устройства."""
+        return self.hass.config.path(STORAGE_DIR, f"{DOMAIN}_history", f"{mac.replace(':', '').lower()}.bin")
+
+    @callback
+    def _record_history(self, mac, status):
+        """Запись показаний в историю (неизменные - не чаще интервала выборки)."""
+        history = self.history.get(mac)
+        if history is None or not status.is_online:
+            return
+        
+        last = history.last_reading()
+        if last is not None:
+            timestamp, battery, food_level = last
+            unchanged = (battery, food_level) == history.normalize(status.battery, status.food_level)
+            if unchanged and time.time() - timestamp < DEFAULT_HISTORY_SAMPLE_INTERVAL:
+                return
+        history.record_reading(status.battery, status.food_level)
+
+    async def _async_flush_history(self, now=None):
+        """Периодическое сохранение истории всех устройств."""
+        for mac, history in list(self.history.items()):
+            await self._async_flush_device_history(mac, history)
+
+    async def _async_flush_device_history(self, mac, history):
+        """Дописывание новых записей истории в файл устройства."""
+        records, rewrite = history.prepare_flush()
+        if not records and not rewrite:
+            return
+        try:
+            await self.hass.async_add_executor_job(
+                TelemetryHistory.write, self._history_path(mac), records, rewrite
+            )
+        except OSError as e:
+            # Записи не потеряны: они будут сохранены при следующей попытке
+            history.restore_flush(records, rewrite)
+            _LOGGER.error(f"Ошибка сохранения истории {mac}: {e}")
+
+    async def feed_device(self, mac_address, amount=DEFAULT_FEED_AMOUNT):
         """Отправка команды кормления устройству."""
         if mac_address not in self.petkit_devices:
             _LOGGER.error(f"Устройство {mac_address} не найдено")
@@ -79,28 +462,97 @@ class PetkitW5Coordinator(DataUpdateCoordinator):
         device = self.petkit_devices[mac_address]
         
         try:
-            # Попытка подключения, если нужно
-            if not device.is_connected:
-                connected = await device.connect()
-                if not connected:
-                    return False
-            
-            # Отправка команды кормления
-            await device.feed_now(amount)
-            
-            # Обновление данных после кормления
-            await self.async_request_refresh()
-            
-            return True
-            
+            # Команда выполняется через очередь устройства и завершается,
+            # когда устройство сообщит о выдаче корма
+            await device.commands.async_feed(amount)
+        except asyncio.TimeoutError:
+            _LOGGER.error(f"Устройство {mac_address} не подтвердило выдачу корма")
+            return False
         except Exception as e:
             _LOGGER.error(f"Ошибка кормления устройства {mac_address}: {e}")
             return False
+        
+        # История и учащение опроса - в _handle_feed
+        return True
+
+    @callback
+    def _handle_feed(self, mac, done):
+        """Выдача корма по команде из сервиса, переключателя или MQTT."""
+        if mac in self.history:
+            self.history[mac].record_feed(done.grams)
+        # Уровень корма сейчас меняется - опрос учащается. Новый статус
+        # прочитан в том же окне подключения и пришел через _handle_device_status
+        if mac in self.poll_schedules:
+            self.poll_schedules[mac].boost()
+
+    @staticmethod
+    def _schedule_config(device_config):
+        return device_config.get(CONF_SCHEDULE), device_config.get(CONF_SETTINGS)
+
+    def _device_config(self, mac):
+        return next((device_config for device_config in self.devices if device_config["mac"] == mac), None)
+
+    async def _async_sync_schedule(self, mac):
+        """Запись расписания и настроек из конфигурации устройства.
+
+        При ошибке синхронизация повторяется после следующего успешного опроса.
+        """
+        device = self.petkit_devices.get(mac)
+        device_config = self._device_config(mac)
+        if device is None or device_config is None:
+            return
+        try:
+            await async_sync_from_config(device, device_config)
+            self.schedule_pending.discard(mac)
+        except Exception as e:
+            _LOGGER.warning(f"Не удалось записать расписание в {mac}: {e}")
+            self.schedule_pending.add(mac)
+
+    async def async_set_schedule(self, mac, meals, settings=None):
+        """Запись нового расписания в устройство и сохранение его в записи.
+
+        meals=None - меняются только настройки. Частичные настройки
+        дополняются сохраненными, а не заданные нигде - текущими
+        значениями устройства. Ошибки записи передаются вызывающему.
+        Возвращает число чтений и записей.
+        """
+        device = self.petkit_devices[mac]
+        device_config = dict(self._device_config(mac))
+        if meals is not None:
+            device_config[CONF_SCHEDULE] = [meal_config(meal) for meal in parse_meals(meals)]
+        if settings:
+            device_config[CONF_SETTINGS] = {**device_config.get(CONF_SETTINGS, {}), **settings}
+
+        result = await async_sync_from_config(device, device_config)
+        self.schedule_pending.discard(mac)
+        # Список обновляется до записи в конфигурацию, поэтому слушатель
+        # изменений не запускает синхронизацию повторно
+        self.devices = [device_config if config["mac"] == mac else config for config in self.devices]
+        self.hass.config_entries.async_update_entry(self.entry, data={**self.entry.data, CONF_DEVICES: self.devices})
+        return result
 
     async def async_shutdown(self):
         """Завершение работы координатора."""
-        # Отключение всех устройств
+        if self._unsub_advertisements:
+            self._unsub_advertisements()
+            self._unsub_advertisements = None
+        self.loop_monitor.stop()
+        
+        # Остановка очередей команд и отключение всех устройств
         for device in self.petkit_devices.values():
-            await device.disconnect()
+            await device.async_close()
+        
+        if self._unsub_history_flush:
+            self._unsub_history_flush()
+            self._unsub_history_flush = None
+        await self._async_flush_history()
+        
+        if self.mqtt:
+            if self.discovery:
+                await self.discovery.async_stop()
+            await self.outbox.async_stop()
+            await self.mqtt.async_stop()
+        if self.trace:
+            await self.trace.async_flush()
         
         await super().async_shutdown()
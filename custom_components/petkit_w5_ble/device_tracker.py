@@ -1,26 +1,38 @@
 from homeassistant.components.device_tracker import SourceType
 from homeassistant.components.device_tracker.config_entry import ScannerEntity
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
-from .const import DOMAIN
+from homeassistant.util import dt as dt_util
+from .const import DOMAIN, SIGNAL_DEVICES_ADDED
+from .entities import TRACKER
+from .models import StatusField
 
 async def async_setup_entry(hass, entry, async_add_entities):
     """Настройка device tracker."""
     coordinator = hass.data[DOMAIN][entry.entry_id]
     
-    trackers = []
-    for device in coordinator.devices:
-        trackers.append(PetkitW5DeviceTracker(coordinator, device))
+    @callback
+    def async_add_devices(devices):
+        async_add_entities([PetkitW5DeviceTracker(coordinator, device) for device in devices])
     
-    async_add_entities(trackers)
+    async_add_devices(coordinator.devices)
+    
+    # Устройства, добавленные без перезагрузки записи
+    entry.async_on_unload(async_dispatcher_connect(
+        hass, f"{SIGNAL_DEVICES_ADDED}_{entry.entry_id}", async_add_devices
+    ))
 
 class PetkitW5DeviceTracker(CoordinatorEntity, ScannerEntity):
     """Device tracker для Petkit W5."""
 
     def __init__(self, coordinator, device):
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=(device["mac"], StatusField.READING | StatusField.HEALTH))
         self._device = device
-        self._attr_name = f"{device['name']} Status"
-        self._attr_unique_id = f"{device['mac']}_tracker"
+        self._attr_name = TRACKER.entity_name(device)
+        self._attr_unique_id = TRACKER.unique_id(device["mac"])
+        self._attributes = None
+        self._attributes_key = None
 
     @property
     def source_type(self) -> SourceType:
@@ -30,18 +42,50 @@ class PetkitW5DeviceTracker(CoordinatorEntity, ScannerEntity):
     @property
     def is_connected(self):
         """Возвращает статус подключения."""
-        device_data = self.coordinator.data.get(self._device["mac"], {})
-        return device_data.get("status") == "online"
+        status = self.coordinator.data.get(self._device["mac"])
+        return status is not None and status.is_online
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Запись состояния только при изменении входных данных."""
+        if self._attribute_inputs() == self._attributes_key:
+            return
+        super()._handle_coordinator_update()
+
+    def _attribute_inputs(self):
+        """Данные, от которых зависят состояние и атрибуты."""
+        mac = self._device["mac"]
+        status = self.coordinator.data.get(mac)
+        health = self.coordinator.device_health.get(mac)
+        return (
+            status.is_online if status else False,
+            status.battery if status else None,
+            status.food_level if status else None,
+            status.last_update if status else None,
+            health.state.value if health else None,
+            health.next_retry_at if health else None,
+            self.coordinator.slot_scheduler.holder(mac),
+        )
 
     @property
     def extra_state_attributes(self):
-        """Дополнительные атрибуты."""
-        device_data = self.coordinator.data.get(self._device["mac"], {})
-        return {
-            "battery_level": device_data.get("battery", 0),
-            "food_level": device_data.get("food_level", 0),
-            "last_updated": device_data.get("last_update")
-        }
+        """Дополнительные атрибуты (пересобираются только при изменении)."""
+        key = self._attribute_inputs()
+        if key != self._attributes_key:
+            _, battery, food_level, last_update, breaker_state, next_retry_at, adapter = key
+            next_retry = None
+            if next_retry_at:
+                next_retry = dt_util.utc_from_timestamp(next_retry_at).isoformat()
+            self._attributes = {
+                "battery_level": battery,
+                "food_level": food_level,
+                "last_updated": last_update,
+                "breaker_state": breaker_state,
+                "next_retry": next_retry,
+                "adapter": adapter
+            }
+            self._attributes_key = key
+        return self._attributes
 
     @property
     def mac_address(self):
@@ -0,0 +1,45 @@
+from homeassistant.components.diagnostics import async_redact_data
+from .const import DOMAIN, CONF_WIFI_SSID, CONF_WIFI_PASSWORD, CONF_MQTT_USER, CONF_MQTT_PASSWORD
+
+TO_REDACT = {CONF_WIFI_SSID, CONF_WIFI_PASSWORD, CONF_MQTT_USER, CONF_MQTT_PASSWORD}
+
+async def async_get_config_entry_diagnostics(hass, entry):
+    """Диагностика записи: таймеры этапов, счетчики и состояние очередей."""
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    
+    devices = {}
+    for mac, device in coordinator.petkit_devices.items():
+        status = coordinator.data.get(mac)
+        health = coordinator.device_health.get(mac)
+        devices[mac] = {
+            "status": status.as_dict() if status is not None else None,
+            "connected": device.is_connected,
+            "adapter": coordinator.slot_scheduler.holder(mac),
+            "rssi": device.rssi,
+            "notifications_active": device.notifications_active,
+            "poll_interval": coordinator.poll_schedules[mac].interval,
+            "breaker": {
+                "state": health.state.value,
+                "failures": health.failures,
+                "last_error": health.last_error,
+                "next_retry_at": health.next_retry_at,
+            } if health is not None else None,
+            "frames": device.frame_errors(),
+            "transactions": device.planner.stats(),
+            **device.metrics.as_dict(),
+        }
+    
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "event_loop": coordinator.loop_monitor.as_dict(),
+        "scheduler": coordinator.slot_scheduler.stats(),
+        "mqtt": {
+            "connected": coordinator.mqtt.is_connected,
+            "outbox": coordinator.outbox.stats(),
+        } if coordinator.mqtt else None,
+        "trace": coordinator.trace.stats() if coordinator.trace else None,
+        "devices": devices,
+    }
@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from .const import DEFAULT_DISCOVERY_PREFIX, DEFAULT_NAME
+from .entities import ALL_ENTITIES
+
+_LOGGER = logging.getLogger(__name__)
+
+# Статус в <topic>/status, при котором сущности доступны
+AVAILABILITY_TEMPLATE = "{{ 'online' if value == 'online' else 'offline' }}"
+TRACKER_TEMPLATE = "{{ 'home' if value == 'online' else 'not_home' }}"
+
+class DiscoveryPublisher:
+    """Retained MQTT discovery конфигурации сущностей устройств.
+
+    Конфигурации строятся из тех же описаний (entities.py), что и
+    сущности интеграции. Для каждого топика конфигурации хранится хэш
+    опубликованного payload - в памяти и в файле cache_path, - поэтому
+    после переподключения к брокеру и перезапуска публикуются только
+    изменившиеся конфигурации. Публикация идет напрямую через клиент:
+    хэш запоминается только после подтверждения брокера.
+    """
+
+    def __init__(self, mqtt_client, prefix=DEFAULT_DISCOVERY_PREFIX, cache_path=None):
+        self.mqtt_client = mqtt_client
+        self.prefix = prefix
+        self.cache_path = cache_path
+        # mac -> (device_config, topic)
+        self._devices = {}
+        # Удаленные устройства, конфигурации которых еще не очищены
+        self._removed = set()
+        # топик конфигурации -> хэш payload
+        self._hashes = {}
+        self._unsub_connect = None
+        self._task = None
+        self._rerun = False
+
+    @staticmethod
+    def _node_id(mac):
+        return f"petkit_w5_{mac.replace(':', '').lower()}"
+
+    def build(self, device_config, topic):
+        """Конфигурации сущностей устройства: {топик конфигурации: payload}."""
+        mac = device_config["mac"]
+        node_id = self._node_id(mac)
+        device = {
+            "identifiers": [node_id],
+            "connections": [["bluetooth", mac]],
+            "name": device_config.get("name") or f"{DEFAULT_NAME} {mac}",
+            "manufacturer": "Petkit",
+            "model": "W5",
+        }
+        configs = {}
+        for definition in ALL_ENTITIES:
+            # Вычисляемые в Home Assistant сущности в MQTT не публикуются
+            if definition.field is None and definition.command is None:
+                continue
+
+            payload = {
+                "name": definition.name,
+                "unique_id": f"{node_id}_{definition.key}",
+                "device": device,
+            }
+            if definition.command is not None:
+                component = "button"
+                payload["command_topic"] = f"{topic}/cmd"
+                payload["payload_press"] = json.dumps(definition.command)
+            else:
+                component = definition.platform
+                payload["state_topic"] = f"{topic}/{definition.field}"
+            if component == "device_tracker":
+                payload["value_template"] = TRACKER_TEMPLATE
+                payload["source_type"] = "bluetooth_le"
+            else:
+                payload["availability_topic"] = f"{topic}/status"
+                payload["availability_template"] = AVAILABILITY_TEMPLATE
+            if definition.device_class:
+                payload["device_class"] = definition.device_class
+            if definition.unit:
+                payload["unit_of_measurement"] = definition.unit
+            if definition.entity_category:
+                payload["entity_category"] = definition.entity_category
+
+            config_topic = f"{self.prefix}/{component}/{node_id}/{definition.key}/config"
+            configs[config_topic] = json.dumps(payload, sort_keys=True)
+        return configs
+
+    async def async_start(self):
+        """Загрузка кэша хэшей и публикация при каждом подключении."""
+        if self.cache_path:
+            self._hashes = await asyncio.get_running_loop().run_in_executor(None, self._read_cache, self.cache_path)
+        self._unsub_connect = self.mqtt_client.add_connect_listener(self._schedule_publish)
+        self._schedule_publish()
+
+    async def async_stop(self):
+        if self._unsub_connect:
+            self._unsub_connect()
+            self._unsub_connect = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def add_device(self, device_config, topic):
+        """Устройство добавлено или изменился его топик."""
+        self._devices[device_config["mac"]] = (device_config, topic)
+        self._removed.discard(device_config["mac"])
+        if self._unsub_connect:
+            self._schedule_publish()
+
+    def remove_device(self, mac):
+        """Устройство удалено - его конфигурации очищаются у брокера."""
+        self._devices.pop(mac, None)
+        self._removed.add(mac)
+        if self._unsub_connect:
+            self._schedule_publish()
+
+    def _schedule_publish(self):
+        if not self.mqtt_client.is_connected:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._async_publish())
+        else:
+            # Изменения во время публикации обрабатываются следующим проходом
+            self._rerun = True
+
+    async def _async_publish(self):
+        """Публикация изменившихся конфигураций, пока есть изменения."""
+        saved = dict(self._hashes)
+        self._rerun = True
+        while self._rerun and self.mqtt_client.is_connected:
+            self._rerun = False
+            await self._async_publish_changed()
+        await self._async_save(saved)
+
+    async def _async_publish_changed(self):
+        configs = {}
+        for device_config, topic in list(self._devices.values()):
+            configs.update(self.build(device_config, topic))
+
+        # Удаленные устройства и сущности, которых больше нет в описании
+        for mac in list(self._removed):
+            if await self._async_clear_device(mac, configs):
+                self._removed.discard(mac)
+        for mac in list(self._devices):
+            await self._async_clear_device(mac, configs)
+
+        changed = {
+            config_topic: payload for config_topic, payload in configs.items()
+            if self._hashes.get(config_topic) != self._hash(payload)
+        }
+        if not changed:
+            return
+        results = await asyncio.gather(*(
+            self.mqtt_client.async_publish(config_topic, payload, qos=1, retain=True)
+            for config_topic, payload in changed.items()
+        ))
+        for (config_topic, payload), published in zip(changed.items(), results):
+            if published:
+                self._hashes[config_topic] = self._hash(payload)
+        _LOGGER.info(f"Опубликовано {sum(results)} из {len(changed)} изменившихся конфигураций MQTT discovery")
+
+    async def _async_clear_device(self, mac, configs):
+        """Очистка опубликованных конфигураций устройства, которых нет в configs.
+
+        Пустое retained-сообщение удаляет сущность. Возвращает True,
+        если очищено все.
+        """
+        marker = f"/{self._node_id(mac)}/"
+        cleared = True
+        for topic in [topic for topic in self._hashes if marker in topic and topic not in configs]:
+            if await self.mqtt_client.async_publish(topic, "", qos=1, retain=True):
+                self._hashes.pop(topic, None)
+            else:
+                cleared = False
+        return cleared
+
+    async def _async_save(self, saved):
+        """Запись кэша, если он изменился с момента saved."""
+        if self.cache_path and self._hashes != saved:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._write_cache, self.cache_path, dict(self._hashes)
+            )
+
+    @staticmethod
+    def _hash(payload):
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    # Работа с файлом кэша выполняется в executor
+
+    @staticmethod
+    def _read_cache(path):
+        try:
+            with open(path, encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            _LOGGER.warning("Кэш MQTT discovery поврежден, конфигурации будут опубликованы заново")
+            return {}
+
+    @staticmethod
+    def _write_cache(path, hashes):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(hashes, file)
+        os.replace(temp_path, path)
@@ -0,0 +1,43 @@
+from dataclasses import dataclass
+
+@dataclass(frozen=True, slots=True)
+class EntityDefinition:
+    """Описание сущности устройства.
+
+    Общее для платформ Home Assistant и MQTT discovery. field - поле
+    статуса, которое публикуется в <topic>/<field>; сущности без field
+    вычисляются в Home Assistant и в discovery не попадают. command -
+    команда в <topic>/cmd для MQTT сущностей-действий.
+    """
+
+    key: str
+    name: str
+    platform: str
+    field: str | None = None
+    device_class: str | None = None
+    unit: str | None = None
+    entity_category: str | None = None
+    command: dict | None = None
+
+    def unique_id(self, mac):
+        return f"{mac}_{self.key}"
+
+    def entity_name(self, device):
+        return f"{device['name']} {self.name}"
+
+BATTERY = EntityDefinition("battery", "Battery", "sensor", field="battery", device_class="battery", unit="%")
+FOOD_LEVEL = EntityDefinition("food_level", "Food Level", "sensor", field="food_level", unit="%")
+FOOD_CONSUMPTION = EntityDefinition("food_consumption", "Food Consumption", "sensor", unit="%/h")
+FOOD_RUNOUT = EntityDefinition("food_runout", "Food Runout", "sensor", device_class="duration", unit="h")
+
+CONNECT_TIME = EntityDefinition("connect_time", "Connect Time", "sensor", unit="ms", entity_category="diagnostic")
+RECONNECTS = EntityDefinition("reconnects", "Reconnects", "sensor", entity_category="diagnostic")
+CHECKSUM_ERRORS = EntityDefinition("checksum_errors", "Checksum Errors", "sensor", entity_category="diagnostic")
+
+# Пустое значение feed - количество корма по умолчанию
+FEED = EntityDefinition("feed_switch", "Feed Now", "switch", command={"feed": None})
+TRACKER = EntityDefinition("tracker", "Status", "device_tracker", field="status")
+
+SENSORS = (BATTERY, FOOD_LEVEL, FOOD_CONSUMPTION, FOOD_RUNOUT)
+DIAGNOSTIC_SENSORS = (CONNECT_TIME, RECONNECTS, CHECKSUM_ERRORS)
+ALL_ENTITIES = SENSORS + DIAGNOSTIC_SENSORS + (FEED, TRACKER)
@@ -0,0 +1,83 @@
+import random
+import time
+from enum import Enum
+from .const import DEFAULT_FAILURE_THRESHOLD, DEFAULT_BACKOFF_BASE, DEFAULT_BACKOFF_MAX
+
+class BreakerState(str, Enum):
+    """Состояние circuit breaker устройства."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+class DeviceHealth:
+    """Состояние доступности одного устройства.
+
+    После failure_threshold ошибок подряд breaker размыкается, и устройство
+    не опрашивается до next_retry. Задержка растет экспоненциально
+    (base_delay * 2^n, не более max_delay) со случайным разбросом, чтобы
+    пробы разных устройств не совпадали по времени. По истечении задержки
+    разрешается одна пробная попытка (half-open): успех замыкает breaker,
+    ошибка снова размыкает его с удвоенной задержкой.
+    """
+
+    def __init__(
+        self,
+        failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+        base_delay=DEFAULT_BACKOFF_BASE,
+        max_delay=DEFAULT_BACKOFF_MAX,
+    ):
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self.last_error = None
+        self.next_retry = None
+        self.next_retry_at = None
+
+    @property
+    def is_probing(self):
+        """Выполняется ли пробная попытка."""
+        return self.state == BreakerState.HALF_OPEN
+
+    def allow_request(self, now=None):
+        """Можно ли сейчас обращаться к устройству."""
+        if self.state == BreakerState.CLOSED:
+            return True
+        if self.state == BreakerState.HALF_OPEN:
+            # Пробная попытка уже выполняется
+            return False
+
+        now = time.monotonic() if now is None else now
+        if now < self.next_retry:
+            return False
+        self.state = BreakerState.HALF_OPEN
+        return True
+
+    def record_success(self):
+        """Успешный обмен. Возвращает True, если устройство восстановилось."""
+        recovered = self.state != BreakerState.CLOSED
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self.last_error = None
+        self.next_retry = None
+        self.next_retry_at = None
+        return recovered
+
+    def record_failure(self, error=None):
+        """Неудачный обмен. Возвращает True, если breaker только что разомкнулся."""
+        self.failures += 1
+        self.last_error = error
+        if self.state == BreakerState.CLOSED and self.failures < self.failure_threshold:
+            return False
+
+        opened = self.state == BreakerState.CLOSED
+        exponent = min(max(self.failures - self.failure_threshold, 0), 16)
+        delay = min(self.max_delay, self.base_delay * 2 ** exponent)
+        delay *= random.uniform(0.5, 1.0)
+
+        self.state = BreakerState.OPEN
+        self.next_retry = time.monotonic() + delay
+        self.next_retry_at = time.time() + delay
+        return opened
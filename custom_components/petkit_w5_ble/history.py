@@ -0,0 +1,221 @@
+import os
+import struct
+import time
+from array import array
+from collections import namedtuple
+from .const import DEFAULT_HISTORY_SIZE, DEFAULT_FEED_HISTORY_SIZE
+
+# Запись файла истории: тип, время (unix), два значения
+RECORD = struct.Struct("<Bdhh")
+RECORD_READING = 0
+RECORD_FEED = 1
+
+# Значение поля, которое устройство не сообщило
+MISSING = -1
+
+# Во сколько раз файл может превысить емкость буферов до перезаписи
+COMPACT_RATIO = 4
+
+WindowStats = namedtuple("WindowStats", "min max avg count")
+
+class RingBuffer:
+    """Кольцевой буфер фиксированного размера на массивах array.
+
+    Каждая колонка хранится в отдельном array нужного типа, поэтому
+    запись не создает объектов, а память не растет со временем.
+    Первая колонка - время, записи добавляются по его возрастанию.
+    """
+
+    def __init__(self, capacity, typecodes):
+        self.capacity = capacity
+        self._columns = [array(typecode, [0]) * capacity for typecode in typecodes]
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, *values):
+        for column, value in zip(self._columns, values):
+            column[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def rows(self, since=None):
+        """Записи от старых к новым (начиная со времени since)."""
+        start = (self._next - self._size) % self.capacity
+        for offset in range(self._size):
+            index = (start + offset) % self.capacity
+            if since is not None and self._columns[0][index] < since:
+                continue
+            yield tuple(column[index] for column in self._columns)
+
+    def last(self):
+        """Последняя запись или None."""
+        if not self._size:
+            return None
+        index = (self._next - 1) % self.capacity
+        return tuple(column[index] for column in self._columns)
+
+class TelemetryHistory:
+    """История показаний и кормлений одного устройства.
+
+    Показания и события хранятся в кольцевых буферах и периодически
+    дописываются в двоичный файл (только добавление записей). Запросы
+    за окно времени считаются по буферам, без базы данных.
+    """
+
+    def __init__(self, size=DEFAULT_HISTORY_SIZE, feed_size=DEFAULT_FEED_HISTORY_SIZE):
+        self.readings = RingBuffer(size, "dhh")
+        self.feeds = RingBuffer(feed_size, "dH")
+        self._pending = []
+        self._file_records = 0
+        self._rewrite = False
+
+    @staticmethod
+    def normalize(battery, food_level):
+        """Значения показаний в виде, в котором они хранятся в буфере."""
+        return (MISSING if battery is None else battery, MISSING if food_level is None else food_level)
+
+    def record_reading(self, battery, food_level, timestamp=None):
+        """Добавление показаний (None - значение неизвестно)."""
+        timestamp = time.time() if timestamp is None else timestamp
+        battery, food_level = self.normalize(battery, food_level)
+        self.readings.append(timestamp, battery, food_level)
+        self._pending.append((RECORD_READING, timestamp, battery, food_level))
+
+    def record_feed(self, grams, timestamp=None):
+        """Добавление события кормления."""
+        timestamp = time.time() if timestamp is None else timestamp
+        self.feeds.append(timestamp, grams)
+        self._pending.append((RECORD_FEED, timestamp, grams, 0))
+
+    def last_reading(self):
+        """Последние показания (время, батарея, корм) или None."""
+        return self.readings.last()
+
+    def stats(self, field, window, now=None):
+        """Минимум, максимум и среднее поля ("battery" или "food_level") за window секунд."""
+        column = 1 if field == "battery" else 2
+        since = (time.time() if now is None else now) - window
+        values = [row[column] for row in self.readings.rows(since) if row[column] != MISSING]
+        if not values:
+            return None
+        return WindowStats(min(values), max(values), sum(values) / len(values), len(values))
+
+    def fed_grams(self, window, now=None):
+        """Сколько корма выдано за window секунд."""
+        since = (time.time() if now is None else now) - window
+        return sum(grams for _, grams in self.feeds.rows(since))
+
+    def consumption_rate(self, window, now=None):
+        """Расход корма, % в час за window секунд (досыпание не учитывается)."""
+        since = (time.time() if now is None else now) - window
+        consumed = 0
+        first = previous = None
+        for timestamp, _, food_level in self.readings.rows(since):
+            if food_level == MISSING:
+                continue
+            if previous is not None and food_level < previous:
+                consumed += previous - food_level
+            if first is None:
+                first = timestamp
+            previous = food_level
+            last = timestamp
+
+        if first is None or last <= first:
+            return None
+        return consumed / ((last - first) / 3600)
+
+    def hours_until_empty(self, window, now=None):
+        """Прогноз времени до окончания корма, часы (None - нет данных)."""
+        last = self.readings.last()
+        rate = self.consumption_rate(window, now)
+        if last is None or last[2] == MISSING or not rate:
+            return None
+        return last[2] / rate
+
+    def prepare_flush(self):
+        """Снимок записей для сохранения (вызывается в event loop).
+
+        Возвращает (records, rewrite): новые записи для дописывания или,
+        если файл разросся, все содержимое буферов для перезаписи.
+        """
+        pending, self._pending = self._pending, []
+        limit = COMPACT_RATIO * (self.readings.capacity + self.feeds.capacity)
+        if not self._rewrite and self._file_records + len(pending) <= limit:
+            self._file_records += len(pending)
+            return pending, False
+
+        records = [(RECORD_READING, *row) for row in self.readings.rows()]
+        records += [(RECORD_FEED, timestamp, grams, 0) for timestamp, grams in self.feeds.rows()]
+        records.sort(key=lambda record: record[1])
+        self._file_records = len(records)
+        self._rewrite = False
+        return records, True
+
+    def restore_flush(self, records, rewrite):
+        """Возврат снимка prepare_flush, который не удалось записать.
+
+        Дописываемые записи возвращаются в начало очереди и попадут в файл
+        при следующем сохранении. После неудачной перезаписи файл остался
+        прежним, а новые записи есть только в буферах, поэтому следующее
+        сохранение снова перезаписывает файл целиком.
+        """
+        if rewrite:
+            self._rewrite = True
+            return
+        self._pending = records + self._pending
+        self._file_records -= len(records)
+
+    @staticmethod
+    def write(path, records, rewrite=False):
+        """Запись снимка в файл. Выполнять вне event loop."""
+        if not records and not rewrite:
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = b"".join(RECORD.pack(*record) for record in records)
+        if not rewrite:
+            with open(path, "ab") as file:
+                file.write(payload)
+            return
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(payload)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def read(path):
+        """Чтение файла истории. Выполнять вне event loop."""
+        try:
+            with open(path, "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return b""
+
+    def load(self, data):
+        """Заполнение буферов содержимым файла истории.
+
+        Записи файла старше показаний, полученных до загрузки (например,
+        из рекламы), поэтому те добавляются после них.
+        """
+        readings = list(self.readings.rows())
+        feeds = list(self.feeds.rows())
+        self.readings = RingBuffer(self.readings.capacity, "dhh")
+        self.feeds = RingBuffer(self.feeds.capacity, "dH")
+        
+        # Обрезанная последняя запись (сбой при записи) отбрасывается
+        usable = len(data) - len(data) % RECORD.size
+        for kind, timestamp, first, second in RECORD.iter_unpack(memoryview(data)[:usable]):
+            if kind == RECORD_READING:
+                self.readings.append(timestamp, first, second)
+            elif kind == RECORD_FEED:
+                self.feeds.append(timestamp, first)
+        self._file_records = usable // RECORD.size
+        
+        for row in readings:
+            self.readings.append(*row)
+        for row in feeds:
+            self.feeds.append(*row)
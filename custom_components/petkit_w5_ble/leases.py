@@ -0,0 +1,98 @@
+import time
+from .const import DEFAULT_LEASE_TTL, DEFAULT_LEASE_HYSTERESIS
+
+class LeaseTable:
+    """Распределение устройств между узлами моста.
+
+    Каждый узел периодически публикует retained-сообщение с RSSI видимых
+    им устройств, а владелец устройства - retained-аренду на него.
+    Все узлы получают одни и те же сообщения и по одним и тем же правилам
+    вычисляют владельца каждого MAC:
+
+    - владелец живой аренды сохраняет устройство, пока другой узел не
+      видит его лучше на hysteresis дБ (чтобы устройство не переезжало
+      туда-обратно из-за колебаний RSSI);
+    - если узел-владелец замолчал дольше ttl (или ушел, и его сообщение
+      очищено last will), устройство получает узел с лучшим RSSI;
+    - при равном RSSI выигрывает узел с меньшим идентификатором.
+
+    Время отсчитывается по моменту получения сообщения на этом узле,
+    поэтому часы узлов синхронизировать не нужно.
+    """
+
+    def __init__(self, node_id, ttl=DEFAULT_LEASE_TTL, hysteresis=DEFAULT_LEASE_HYSTERESIS):
+        self.node_id = node_id
+        self.ttl = ttl
+        self.hysteresis = hysteresis
+        # node -> (время получения, {mac: rssi})
+        self._nodes = {}
+        # mac -> (node, время получения)
+        self._leases = {}
+
+    def update_node(self, node, rssi, now=None):
+        """Получено сообщение узла с RSSI видимых устройств."""
+        self._nodes[node] = (time.monotonic() if now is None else now, dict(rssi))
+
+    def remove_node(self, node):
+        """Узел ушел (очищено его retained-сообщение)."""
+        self._nodes.pop(node, None)
+
+    def update_lease(self, mac, node, now=None):
+        """Получена (или продлена) аренда устройства."""
+        self._leases[mac] = (node, time.monotonic() if now is None else now)
+
+    def clear_lease(self, mac, node=None):
+        """Аренда снята. Если задан node, снимается только его аренда."""
+        lease = self._leases.get(mac)
+        if lease is not None and (node is None or lease[0] == node):
+            del self._leases[mac]
+
+    def alive(self, node, now=None):
+        """Присылал ли узел сообщения в пределах ttl."""
+        entry = self._nodes.get(node)
+        now = time.monotonic() if now is None else now
+        return entry is not None and now - entry[0] < self.ttl
+
+    def holder(self, mac, now=None):
+        """Узел с действующей арендой устройства или None."""
+        lease = self._leases.get(mac)
+        if lease is None:
+            return None
+        now = time.monotonic() if now is None else now
+        node, received = lease
+        if now - received >= self.ttl or not self.alive(node, now):
+            return None
+        return node
+
+    def owner(self, mac, now=None):
+        """Узел, который должен обслуживать устройство."""
+        now = time.monotonic() if now is None else now
+        candidates = {
+            node: rssi[mac]
+            for node, (received, rssi) in self._nodes.items()
+            if now - received < self.ttl and rssi.get(mac) is not None
+        }
+        holder = self.holder(mac, now)
+        if not candidates:
+            return holder
+
+        best = max(candidates, key=lambda node: (candidates[node], _reverse(node)))
+        if holder is None or holder not in candidates:
+            return best
+        if best != holder and candidates[best] >= candidates[holder] + self.hysteresis:
+            return best
+        return holder
+
+    def plan(self, macs, owned, now=None):
+        """Какие устройства этому узлу взять и какие отдать.
+
+        Возвращает (acquire, release) - множества MAC.
+        """
+        now = time.monotonic() if now is None else now
+        desired = {mac for mac in macs if self.owner(mac, now) == self.node_id}
+        return desired - set(owned), set(owned) - desired
+
+def _reverse(node):
+    """Ключ сортировки: меньший идентификатор узла считается лучшим."""
+    # Завершающий элемент делает префикс ("a") лучше продолжения ("ab")
+    return tuple(-ord(char) for char in node) + (1,)
@@ -0,0 +1,139 @@
+import asyncio
+import contextlib
+import time
+from bisect import bisect_left
+from collections import Counter
+
+# Верхние границы корзин гистограммы, мс (последняя - все, что больше)
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+# Этапы обмена с устройством
+STAGE_CONNECT = "connect"
+STAGE_SERVICES = "services"
+STAGE_READ = "gatt_read"
+STAGE_WRITE = "gatt_write"
+STAGE_DECODE = "decode"
+STAGE_PUBLISH = "mqtt_publish"
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными корзинами.
+
+    Запись - один bisect и несколько сложений, поэтому таймеры можно
+    держать включенными постоянно. Перцентили оцениваются по границам
+    корзин.
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        ms = seconds * 1000
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, fraction):
+        """Верхняя граница корзины, в которую попадает перцентиль, мс."""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return BUCKETS_MS[index] if index < len(BUCKETS_MS) else round(self.max, 1)
+        return round(self.max, 1)
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count, 2) if self.count else None,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": round(self.max, 1),
+        }
+
+class DeviceMetrics:
+    """Таймеры этапов и счетчики событий одного устройства."""
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = Counter()
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        """Замер длительности этапа (записывается и при исключении)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def record(self, stage, seconds):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.record(seconds)
+
+    def count(self, counter, value=1):
+        self.counters[counter] += value
+
+    def stage(self, stage):
+        """Гистограмма этапа или None, если замеров не было."""
+        return self.stages.get(stage)
+
+    def as_dict(self):
+        return {
+            "stages": {stage: histogram.as_dict() for stage, histogram in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+class LoopLagMonitor:
+    """Задержка event loop: насколько позже срабатывает таймер.
+
+    Таймер перезапускается через call_later, отдельная задача не нужна.
+    Вместе с задержкой сохраняется длина очереди готовых callback-ов.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.lag = Histogram()
+        self.ready_queue = 0
+        self.ready_queue_max = 0
+        self._loop = None
+        self._handle = None
+        self._expected = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._schedule()
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self):
+        self._expected = self._loop.time() + self.interval
+        self._handle = self._loop.call_later(self.interval, self._tick)
+
+    def _tick(self):
+        self.lag.record(max(0.0, self._loop.time() - self._expected))
+        # Очередь готовых callback-ов - внутренний атрибут asyncio
+        self.ready_queue = len(getattr(self._loop, "_ready", ()))
+        self.ready_queue_max = max(self.ready_queue_max, self.ready_queue)
+        self._schedule()
+
+    def as_dict(self):
+        return {
+            "lag": self.lag.as_dict(),
+            "ready_queue": self.ready_queue,
+            "ready_queue_max": self.ready_queue_max,
+        }
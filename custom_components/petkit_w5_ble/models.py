@@ -0,0 +1,87 @@
+from dataclasses import dataclass, replace
+from enum import Enum, IntFlag
+
+class DeviceStatus(str, Enum):
+    """Состояние связи с устройством."""
+
+    ONLINE = "online"
+    OFFLINE = "offline"
+    TIMEOUT = "timeout"
+    ERROR = "error"
+
+class StatusField(IntFlag):
+    """Поля статуса для масок изменений."""
+
+    STATUS = 1
+    STATE = 2
+    BATTERY = 4
+    FOOD_LEVEL = 8
+    LAST_UPDATE = 16
+    ERROR = 32
+
+    # Не поле статуса: координатор отмечает смену состояния breaker
+    HEALTH = 64
+
+    # Все поля, кроме времени обновления
+    READING = STATUS | STATE | BATTERY | FOOD_LEVEL | ERROR
+
+_FIELDS = (
+    ("status", StatusField.STATUS),
+    ("state", StatusField.STATE),
+    ("battery", StatusField.BATTERY),
+    ("food_level", StatusField.FOOD_LEVEL),
+    ("last_update", StatusField.LAST_UPDATE),
+    ("error", StatusField.ERROR),
+)
+_ALL_FIELDS = StatusField.READING | StatusField.LAST_UPDATE
+
+@dataclass(frozen=True, slots=True)
+class PetkitW5Status:
+    """Неизменяемый статус устройства.
+
+    Координатор хранит по одной записи на MAC. Поля, которые устройство
+    не сообщило, равны None.
+    """
+
+    status: DeviceStatus
+    state: int | None = None
+    battery: int | None = None
+    food_level: int | None = None
+    last_update: float | None = None
+    error: str | None = None
+
+    @classmethod
+    def offline(cls):
+        return cls(DeviceStatus.OFFLINE)
+
+    @classmethod
+    def failed(cls, status, error):
+        """Статус неудачного опроса (TIMEOUT или ERROR)."""
+        return cls(status, error=str(error))
+
+    @property
+    def is_online(self):
+        return self.status is DeviceStatus.ONLINE
+
+    def changes(self, other):
+        """Маска полей, которыми статус отличается от other (None - все поля)."""
+        if other is None:
+            return _ALL_FIELDS
+        mask = StatusField(0)
+        for name, flag in _FIELDS:
+            if getattr(self, name) != getattr(other, name):
+                mask |= flag
+        return mask
+
+    def replace(self, **changes):
+        """Копия статуса с измененными полями."""
+        return replace(self, **changes)
+
+    def as_dict(self):
+        """Словарь заданных полей (для MQTT и диагностики)."""
+        data = {}
+        for name, _ in _FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value.value if isinstance(value, Enum) else value
+        return data
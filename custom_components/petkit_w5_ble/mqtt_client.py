@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import threading
+import paho.mqtt.client as mqtt
+
+_LOGGER = logging.getLogger(__name__)
+
+class PetkitMqttClient:
+    """Общее MQTT подключение для всех устройств конфигурационной записи.
+
+    Сетевой цикл paho работает в собственном потоке (loop_start), поэтому
+    event loop Home Assistant не блокируется. Переподключение выполняет
+    сам paho, подписки восстанавливаются в on_connect.
+    """
+
+    RECONNECT_MIN_DELAY = 1
+    RECONNECT_MAX_DELAY = 120
+    KEEPALIVE = 60
+
+    def __init__(self, mqtt_config):
+        self.mqtt_config = mqtt_config
+        self.is_connected = False
+        self._client = None
+        self._loop = None
+        self._lock = threading.RLock()
+        self._pending = {}
+        # Подтверждения, полученные внутри client.publish (до регистрации future)
+        self._early_acks = set()
+        self._publishing = False
+        self._subscriptions = {}
+        self._connect_listeners = []
+        # TraceRecorder, если включена запись трафика
+        self.trace = None
+
+    async def async_start(self):
+        """Запуск подключения к брокеру без блокировки event loop."""
+        if self._client is not None:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        if hasattr(mqtt, "CallbackAPIVersion"):
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        else:
+            client = mqtt.Client()
+
+        if self.mqtt_config.get("user") and self.mqtt_config.get("password"):
+            client.username_pw_set(self.mqtt_config["user"], self.mqtt_config["password"])
+
+        # Last will: брокер опубликует его, если клиент пропадет без отключения
+        will = self.mqtt_config.get("will")
+        if will:
+            topic, payload = will
+            client.will_set(topic, payload, qos=1, retain=True)
+
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+        client.on_publish = self._on_publish
+        client.reconnect_delay_set(self.RECONNECT_MIN_DELAY, self.RECONNECT_MAX_DELAY)
+
+        # connect_async только сохраняет параметры, само подключение
+        # и переподключения выполняет сетевой поток
+        client.connect_async(self.mqtt_config["broker"], self.mqtt_config["port"], self.KEEPALIVE)
+        client.loop_start()
+        self._client = client
+        _LOGGER.info(f"MQTT клиент запущен: {self.mqtt_config['broker']}:{self.mqtt_config['port']}")
+
+    async def async_stop(self):
+        """Остановка клиента и отмена ожидающих публикаций."""
+        client, self._client = self._client, None
+        if client is None:
+            return
+
+        client.disconnect()
+        # loop_stop ждет завершения потока, поэтому выполняется в executor
+        await self._loop.run_in_executor(None, client.loop_stop)
+        self.is_connected = False
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._early_acks.clear()
+        for future in pending.values():
+            if not future.done():
+                future.cancel()
+
+    async def async_publish(self, topic, payload, qos=0, retain=False, timeout=10):
+        """Публикация сообщения с ожиданием подтверждения брокера.
+
+        Для QoS 0 подтверждением считается отправка пакета в сокет,
+        для QoS 1/2 - PUBACK/PUBCOMP. Возвращает True при успехе.
+        """
+        if self._client is None:
+            return False
+        if self.trace is not None:
+            self.trace.publish(topic, payload)
+
+        future = self._loop.create_future()
+        with self._lock:
+            self._publishing = True
+            try:
+                info = self._client.publish(topic, payload, qos=qos, retain=retain)
+            finally:
+                self._publishing = False
+            if info.rc != mqtt.MQTT_ERR_SUCCESS and qos == 0:
+                return False
+            if info.mid in self._early_acks:
+                self._early_acks.discard(info.mid)
+                return True
+            self._pending[info.mid] = future
+
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            _LOGGER.warning(f"Нет подтверждения публикации в {topic} за {timeout} с")
+            return False
+        finally:
+            with self._lock:
+                self._pending.pop(info.mid, None)
+
+    def async_subscribe(self, topic, callback, qos=0):
+        """Подписка на топик (допускаются wildcard-подписки).
+
+        callback(topic, payload) вызывается в event loop. Возвращает
+        функцию отмены подписки.
+        """
+        callbacks = self._subscriptions.setdefault(topic, [])
+        callbacks.append((callback, qos))
+        if len(callbacks) == 1 and self._client is not None and self.is_connected:
+            self._client.subscribe(topic, qos)
+
+        def unsubscribe():
+            callbacks.remove((callback, qos))
+            if not callbacks:
+                self._subscriptions.pop(topic, None)
+                if self._client is not None and self.is_connected:
+                    self._client.unsubscribe(topic)
+
+        return unsubscribe
+
+    def add_connect_listener(self, callback):
+        """callback() вызывается в event loop после каждого подключения к брокеру.
+
+        Возвращает функцию отмены.
+        """
+        self._connect_listeners.append(callback)
+        return lambda: self._connect_listeners.remove(callback)
+
+    # Callback-и paho вызываются в сетевом потоке. Сигнатуры различаются
+    # между API v1 и v2, поэтому лишние аргументы принимаются через *args.
+
+    def _on_connect(self, client, userdata, flags, rc, *args):
+        if rc != 0:
+            _LOGGER.error(f"MQTT брокер отклонил подключение: {rc}")
+            return
+
+        self.is_connected = True
+        _LOGGER.info("MQTT подключение установлено")
+        for topic, callbacks in list(self._subscriptions.items()):
+            client.subscribe(topic, max(qos for _, qos in callbacks))
+        for callback in list(self._connect_listeners):
+            self._loop.call_soon_threadsafe(callback)
+
+    def _on_disconnect(self, client, userdata, *args):
+        self.is_connected = False
+        _LOGGER.warning("MQTT подключение потеряно, ожидается переподключение")
+
+    def _on_publish(self, client, userdata, mid, *args):
+        with self._lock:
+            future = self._pending.pop(mid, None)
+            if future is None:
+                # paho может вызвать on_publish прямо из client.publish (QoS 0),
+                # пока future еще не зарегистрирован. Сетевой поток в это время
+                # ждет блокировку, поэтому остальные подтверждения без future -
+                # запоздавшие после таймаута, и их id paho позже выдаст снова.
+                if self._publishing:
+                    self._early_acks.add(mid)
+                return
+        self._loop.call_soon_threadsafe(self._resolve, future)
+
+    def _on_message(self, client, userdata, msg):
+        self._loop.call_soon_threadsafe(self._dispatch, msg.topic, msg.payload)
+
+    @staticmethod
+    def _resolve(future):
+        if not future.done():
+            future.set_result(True)
+
+    def _dispatch(self, topic, payload):
+        """Передача входящего сообщения подписчикам (в event loop)."""
+        for subscription, callbacks in list(self._subscriptions.items()):
+            if not mqtt.topic_matches_sub(subscription, topic):
+                continue
+            for callback, _ in list(callbacks):
+                try:
+                    callback(topic, payload)
+                except Exception as e:
+                    _LOGGER.error(f"Ошибка обработки MQTT сообщения {topic}: {e}")
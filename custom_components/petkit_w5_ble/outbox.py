@@ -0,0 +1,252 @@
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict, deque
+from .const import DEFAULT_OUTBOX_MAX_EVENTS, DEFAULT_OUTBOX_BATCH_SIZE, DEFAULT_OUTBOX_RATE
+
+_LOGGER = logging.getLogger(__name__)
+
+class MqttOutbox:
+    """Очередь MQTT сообщений на время недоступности брокера.
+
+    Статусы (retained) хранятся по одному на топик - новое значение
+    заменяет неотправленное старое. События не отбрасываются и
+    отправляются по порядку: не более max_events в памяти, остальные
+    дописываются в журнал path на диске. После переподключения очередь
+    отправляется пачками по batch_size с ограничением rate сообщений в
+    секунду. Неотправленные при остановке события, в том числе из
+    прерванной пачки, сохраняются в журнал.
+    """
+
+    def __init__(
+        self,
+        mqtt_client,
+        path,
+        max_events=DEFAULT_OUTBOX_MAX_EVENTS,
+        batch_size=DEFAULT_OUTBOX_BATCH_SIZE,
+        rate=DEFAULT_OUTBOX_RATE,
+    ):
+        self.mqtt_client = mqtt_client
+        self.path = path
+        self.max_events = max_events
+        self.batch_size = batch_size
+        self.rate = rate
+        self._status = OrderedDict()
+        self._events = deque()
+        self._spilled = 0
+        # Пачка, которая сейчас отправляется, - (event, message)
+        self._in_flight = []
+        self._log_lock = asyncio.Lock()
+        self._flush_task = None
+        self._unsub_connect = None
+
+    @property
+    def pending(self):
+        """Число неотправленных сообщений."""
+        return len(self._status) + len(self._events) + self._spilled + len(self._in_flight)
+
+    async def async_start(self):
+        """Загрузка журнала и отправка очереди при каждом подключении."""
+        self._spilled = await asyncio.get_running_loop().run_in_executor(None, self._count_log, self.path)
+        if self._spilled:
+            _LOGGER.info(f"В журнале MQTT {self._spilled} неотправленных событий")
+        self._unsub_connect = self.mqtt_client.add_connect_listener(self._schedule_flush)
+        if self.mqtt_client.is_connected:
+            self._schedule_flush()
+
+    async def async_stop(self):
+        """Остановка отправки и сохранение событий из памяти в журнал."""
+        if self._unsub_connect:
+            self._unsub_connect()
+            self._unsub_connect = None
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+
+        if self._events:
+            events, self._events = list(self._events), deque()
+            async with self._log_lock:
+                await asyncio.get_running_loop().run_in_executor(None, self._prepend_log, self.path, events)
+            self._spilled += len(events)
+
+    async def async_publish(self, topic, payload, qos=0, retain=False, event=False):
+        """Публикация сообщения или постановка его в очередь.
+
+        Возвращает True, если сообщение отправлено или принято в очередь.
+        """
+        message = (topic, self._text(payload), qos, retain)
+        if event:
+            # Событие не должно обогнать очередь, включая отправляемую пачку
+            queued = self._events or self._spilled or any(item[0] for item in self._in_flight)
+        else:
+            # Новое значение статуса, отправленное напрямую, пока старое в
+            # пачке, было бы затерто старым при его повторе из _requeue
+            queued = topic in self._status or any(
+                not item[0] and item[1][0] == topic for item in self._in_flight
+            )
+        if self.mqtt_client.is_connected and not queued:
+            if await self.mqtt_client.async_publish(topic, payload, qos=qos, retain=retain):
+                return True
+
+        if event:
+            await self._async_enqueue_event(message)
+        else:
+            self._status[topic] = message
+            self._status.move_to_end(topic)
+        if self.mqtt_client.is_connected:
+            self._schedule_flush()
+        return True
+
+    def stats(self):
+        """Состояние очереди для диагностики."""
+        return {
+            "status": len(self._status),
+            "events": len(self._events),
+            "spilled": self._spilled,
+            "in_flight": len(self._in_flight),
+        }
+
+    async def _async_enqueue_event(self, message):
+        """Событие в память или, если память заполнена, в журнал."""
+        if not self._spilled and len(self._events) < self.max_events:
+            self._events.append(message)
+            return
+
+        # Пока в журнале есть события, новые пишутся туда же, чтобы не нарушить порядок
+        async with self._log_lock:
+            await asyncio.get_running_loop().run_in_executor(None, self._append_log, self.path, [message])
+        self._spilled += 1
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._async_flush())
+
+    async def _async_flush(self):
+        """Отправка очереди пачками, пока есть подключение."""
+        sent = 0
+        while self.mqtt_client.is_connected:
+            if not self._events and self._spilled:
+                await self._async_load_log()
+            batch = self._next_batch()
+            if not batch:
+                break
+
+            self._in_flight = batch
+            try:
+                results = await asyncio.gather(*(
+                    self.mqtt_client.async_publish(topic, payload, qos=qos, retain=retain)
+                    for _, (topic, payload, qos, retain) in batch
+                ))
+            except asyncio.CancelledError:
+                # Остановка: пачка возвращается в очередь (возможен повтор, но не потеря)
+                self._requeue(batch)
+                raise
+            finally:
+                self._in_flight = []
+            failed = [item for item, published in zip(batch, results) if not published]
+            sent += len(batch) - len(failed)
+            if failed:
+                self._requeue(failed)
+                _LOGGER.warning(f"Не удалось отправить {len(failed)} сообщений из очереди MQTT")
+                break
+
+            await asyncio.sleep(len(batch) / self.rate)
+
+        if sent:
+            _LOGGER.info(f"Отправлено {sent} сообщений из очереди MQTT, осталось: {self.pending}")
+
+    def _next_batch(self):
+        """Следующая пачка: сначала события по порядку, затем статусы."""
+        batch = []
+        while self._events and len(batch) < self.batch_size:
+            batch.append((True, self._events.popleft()))
+        while self._status and len(batch) < self.batch_size:
+            batch.append((False, self._status.popitem(last=False)[1]))
+        return batch
+
+    def _requeue(self, failed):
+        """Возврат неотправленных сообщений в начало очереди."""
+        for event, message in reversed(failed):
+            if event:
+                self._events.appendleft(message)
+            elif message[0] not in self._status:
+                # Более новое значение статуса, если оно есть, не заменяется
+                self._status[message[0]] = message
+                self._status.move_to_end(message[0], last=False)
+
+    async def _async_load_log(self):
+        """Перенос очередной порции событий из журнала в память."""
+        async with self._log_lock:
+            events, remaining = await asyncio.get_running_loop().run_in_executor(
+                None, self._take_log, self.path, self.max_events
+            )
+        self._events.extend(events)
+        self._spilled = remaining
+
+    @staticmethod
+    def _text(payload):
+        if isinstance(payload, (bytes, bytearray)):
+            return payload.decode()
+        return payload
+
+    # Работа с журналом выполняется в executor
+
+    @staticmethod
+    def _count_log(path):
+        try:
+            with open(path, "rb") as file:
+                return sum(1 for line in file if line.strip())
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _append_log(path, messages):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as file:
+            for message in messages:
+                file.write(json.dumps(message) + "\n")
+
+    @classmethod
+    def _prepend_log(cls, path, messages):
+        try:
+            with open(path, encoding="utf-8") as file:
+                existing = file.read()
+        except FileNotFoundError:
+            existing = ""
+        cls._write_log(path, [json.dumps(message) + "\n" for message in messages], existing)
+
+    @classmethod
+    def _take_log(cls, path, count):
+        """Чтение первых count событий журнала; остальные остаются в файле."""
+        try:
+            with open(path, encoding="utf-8") as file:
+                lines = [line for line in file if line.strip()]
+        except FileNotFoundError:
+            return [], 0
+
+        events = []
+        for line in lines[:count]:
+            try:
+                events.append(tuple(json.loads(line)))
+            except ValueError:
+                _LOGGER.warning("Пропущена поврежденная запись журнала MQTT")
+        remaining = lines[count:]
+        if remaining:
+            cls._write_log(path, remaining)
+        else:
+            os.remove(path)
+        return events, len(remaining)
+
+    @staticmethod
+    def _write_log(path, lines, tail=""):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.writelines(lines)
+            file.write(tail)
+        os.replace(temp_path, path)
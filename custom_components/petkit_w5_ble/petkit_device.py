@@ -1,8 +1,20 @@
-import struct
 import asyncio
+import json
 import logging
-from bleak import BleakClient
-import paho.mqtt.client as mqtt
+import time
+from . import protocol
+from .connection import PetkitW5Connection
+from .commands import PetkitW5CommandQueue
+from .const import (
+    DEFAULT_IDLE_TIMEOUT, DEFAULT_MQTT_HEARTBEAT, DEFAULT_ACK_TIMEOUT, DEFAULT_FEED_AMOUNT,
+    DEFAULT_DISPENSE_TIMEOUT
+)
+from .metrics import DeviceMetrics, STAGE_DECODE, STAGE_PUBLISH, STAGE_READ, STAGE_WRITE
+from .models import DeviceStatus, PetkitW5Status
+from .publisher import DeltaPublisher
+from .schedule import ScheduleSync, parse_meals
+from .scheduler import PRIORITY_POLL
+from .transactions import ConnectionPlanner
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -16,128 +28,517 @@ class PetkitW5Device:
     BLE_CHAR_UUID = "0000fff3-0000-1000-8000-00805f9b34fb"
     SETTING_CHAR_UUID = "0000fff4-0000-1000-8000-00805f9b34fb"
 
-    def __init__(self, mac_address, mqtt_config=None):
+    # Через сколько секунд без уведомлений и рекламы статус читается явно
+    STATUS_STALE_AFTER = 300
+    # Если реклама не передает уровень корма, он читается по GATT не реже
+    FOOD_LEVEL_STALE_AFTER = 1800
+
+    def __init__(
+        self, mac_address, idle_timeout=DEFAULT_IDLE_TIMEOUT, slot_scheduler=None, candidates=None, client_factory=None
+    ):
         self.mac_address = mac_address
-        self.client = None
-        self.is_connected = False
+        # Таймеры этапов и счетчики для диагностики
+        self.metrics = DeviceMetrics()
+        self.connection = PetkitW5Connection(
+            mac_address,
+            self.DEVICE_SERVICE_UUID,
+            idle_timeout=idle_timeout,
+            on_disconnect=self._handle_disconnect,
+            slot_scheduler=slot_scheduler,
+            candidates=candidates,
+            metrics=self.metrics,
+            client_factory=client_factory,
+        )
         self.mqtt_client = None
-        self.mqtt_config = mqtt_config
-        self.last_data = {}
+        self.mqtt_topic = None
+        self.publisher = None
+        self.outbox = None
+        self.last_data = None
+        self.last_notification = None
+        self.last_advertisement = None
+        self.last_read = None
+        self.rssi = None
+        self._advert_has_food_level = False
+        self.notifications_active = False
+        self._status_callback = None
+        self._schedule_handler = None
+        self._assembler = protocol.FrameAssembler()
+        self._ack_waiters = {}
+        self._feed_waiters = []
+        self._mqtt_unsubscribe = None
+        self.planner = ConnectionPlanner(self)
+        self.commands = PetkitW5CommandQueue(self)
+        self.schedule_sync = ScheduleSync(self)
+        # TraceRecorder, если включена запись трафика
+        self.trace = None
+
+    @property
+    def client(self):
+        """BleakClient текущего подключения."""
+        return self.connection.client
+
+    @property
+    def is_connected(self):
+        """Состояние подключения по данным disconnected_callback."""
+        return self.connection.is_connected
 
-    async def connect(self):
+    async def connect(self, priority=PRIORITY_POLL):
         """Подключение к устройству через BLE."""
         try:
-            self.client = BleakClient(self.mac_address)
-            await self.client.connect()
-            self.is_connected = await self.client.is_connected()
-            _LOGGER.info(f"Подключение к {self.mac_address}: {'Успешно' if self.is_connected else 'Не удалось'}")
-            return self.is_connected
+            connected = await self.connection.connect(priority)
+            if connected and not self.notifications_active:
+                _LOGGER.info(f"Подключение к {self.mac_address}: Успешно")
+                if self.trace is not None:
+                    self.trace.connect(self.mac_address)
+                await self.start_notifications()
+            elif not connected:
+                _LOGGER.info(f"Подключение к {self.mac_address}: Не удалось")
+            return connected
         except Exception as e:
             _LOGGER.error(f"Ошибка подключения к {self.mac_address}: {e}")
-            self.is_connected = False
             return False
 
     async def disconnect(self):
         """Отключение от устройства."""
-        if self.client and self.is_connected:
-            try:
-                await self.client.disconnect()
-                self.is_connected = False
-                _LOGGER.info(f"Отключение от {self.mac_address}")
-            except Exception as e:
-                _LOGGER.error(f"Ошибка отключения от {self.mac_address}: {e}")
+        try:
+            await self.connection.disconnect()
+            self._handle_disconnect()
+            _LOGGER.info(f"Отключение от {self.mac_address}")
+        except Exception as e:
+            _LOGGER.error(f"Ошибка отключения от {self.mac_address}: {e}")
+
+    def _handle_disconnect(self):
+        """Сброс состояния сессии после отключения."""
+        # Разрыв может быть обработан дважды (callback bleak и disconnect)
+        if self.trace is not None and self.notifications_active:
+            self.trace.disconnect(self.mac_address)
+        self.notifications_active = False
+        self._assembler.reset()
 
     def checksum(self, data):
         """Вычисление контрольной суммы."""
-        return sum(data) & 0xFF
+        return protocol.checksum(data)
 
-    async def send_command(self, char_uuid, cmd):
-        """Отправка команды устройству."""
+    async def send_command(self, char_uuid, cmd, response=None):
+        """Отправка команды устройству. response=False - запись без ответа ATT."""
         if not self.is_connected or not self.client:
             raise Exception("Устройство не подключено")
 
         try:
-            await self.client.write_gatt_char(char_uuid, cmd)
+            with self.metrics.timer(STAGE_WRITE):
+                await self.client.write_gatt_char(self.connection.characteristic(char_uuid), cmd, response=response)
+            self.connection.touch()
+            if self.trace is not None:
+                self.trace.write(self.mac_address, char_uuid, cmd)
             _LOGGER.debug(f"Команда отправлена: {cmd.hex()}")
         except Exception as e:
             _LOGGER.error(f"Ошибка отправки команды: {e}")
             raise
 
-    async def feed_now(self, amount=10):
-        """Команда кормления."""
-        cmd = bytearray([0x01, 0x02, amount, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
-        cmd[12] = self.checksum(cmd)
-        await self.send_command(self.FEED_CHAR_UUID, cmd)
-        _LOGGER.info(f"Команда кормления отправлена: {amount} грамм")
+    async def execute_command(self, char_uuid, cmd, ack_timeout=DEFAULT_ACK_TIMEOUT):
+        """Отправка команды и ожидание ее подтверждения устройством.
+
+        Возвращает AckFrame. Вызывается только из окна подключения, чтобы
+        записи в характеристики не пересекались.
+        """
+        code = cmd[1]
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._ack_waiters.setdefault(code, [])
+        waiters.append(future)
+        try:
+            with self.connection.active():
+                await self.send_command(char_uuid, cmd)
+                ack = await asyncio.wait_for(future, ack_timeout)
+        except asyncio.TimeoutError:
+            self.metrics.count("ack_timeouts")
+            raise
+        finally:
+            waiters.remove(future)
+        return self._check_ack(code, ack)
+
+    async def execute_pipelined(self, commands, ack_timeout=DEFAULT_ACK_TIMEOUT):
+        """Отправка нескольких команд подряд с общим ожиданием подтверждений.
+
+        commands - список (характеристика, команда). Каждую команду
+        устройство подтверждает уведомлением ACK, поэтому записи идут без
+        ответа ATT и не ждут друг друга. Возвращает AckFrame или
+        исключение для каждой команды. Вызывается только из окна
+        подключения.
+        """
+        loop = asyncio.get_running_loop()
+        pending = []
+        try:
+            with self.connection.active():
+                for char_uuid, cmd in commands:
+                    future = loop.create_future()
+                    self._ack_waiters.setdefault(cmd[1], []).append(future)
+                    pending.append((cmd[1], future))
+                    await self.send_command(char_uuid, cmd, response=False)
+                acks = await asyncio.gather(
+                    *(asyncio.wait_for(future, ack_timeout) for _, future in pending), return_exceptions=True
+                )
+        finally:
+            for code, future in pending:
+                self._ack_waiters[code].remove(future)
+
+        results = []
+        for (code, _), ack in zip(pending, acks):
+            if isinstance(ack, asyncio.TimeoutError):
+                self.metrics.count("ack_timeouts")
+            elif not isinstance(ack, Exception):
+                try:
+                    ack = self._check_ack(code, ack)
+                except protocol.ProtocolError as e:
+                    ack = e
+            results.append(ack)
+        return results
+
+    @staticmethod
+    def _check_ack(code, ack):
+        if ack.result != protocol.ACK_OK:
+            raise protocol.ProtocolError(f"Устройство отклонило команду 0x{code:02x}: код {ack.result}")
+        return ack
+
+    async def feed_now(self, amount=DEFAULT_FEED_AMOUNT, dispense_timeout=DEFAULT_DISPENSE_TIMEOUT):
+        """Команда кормления с ожиданием завершения выдачи корма.
+
+        Подтверждение (ACK) означает только, что команда принята; затем
+        устройство присылает FeedDoneFrame с фактически выданными граммами.
+        Возвращает FeedDoneFrame.
+        """
+        cmd = protocol.encode_feed(amount)
+        # Ожидание регистрируется до отправки: выдача может завершиться быстро
+        future = asyncio.get_running_loop().create_future()
+        self._feed_waiters.append(future)
+        try:
+            await self.execute_command(self.FEED_CHAR_UUID, cmd)
+            _LOGGER.info(f"Команда кормления отправлена: {amount} грамм")
+            with self.connection.active():
+                done = await asyncio.wait_for(future, dispense_timeout)
+        except asyncio.TimeoutError:
+            self.metrics.count("dispense_timeouts")
+            raise
+        finally:
+            self._feed_waiters.remove(future)
+
+        if done.result != protocol.ACK_OK:
+            raise protocol.ProtocolError(f"Корм не выдан: код {done.result}, выдано {done.grams} грамм")
+        _LOGGER.info(f"Выдано {done.grams} грамм корма")
+        # Событие для подписчиков MQTT (из любого источника команды)
+        asyncio.get_running_loop().create_task(
+            self.publish_event("feed", amount=amount, dispensed=done.grams)
+        )
+        return done
+
+    def time_sync_write(self, timestamp=None, tz_offset=0):
+        """Запись синхронизации часов: (характеристика, команда)."""
+        if timestamp is None:
+            timestamp = time.time()
+        return self.SETTING_CHAR_UUID, protocol.encode_time_sync(timestamp, tz_offset)
+
+    def settings_write(self, light, sound, child_lock):
+        """Запись настроек: (характеристика, команда)."""
+        return self.SETTING_CHAR_UUID, protocol.encode_settings(light, sound, child_lock)
+
+    async def sync_time(self, timestamp=None, tz_offset=0):
+        """Синхронизация часов устройства."""
+        return await self.execute_command(*self.time_sync_write(timestamp, tz_offset))
+
+    async def write_settings(self, light, sound, child_lock):
+        """Запись настроек устройства."""
+        return await self.execute_command(*self.settings_write(light, sound, child_lock))
+
+    async def _query(self, target, frame_type):
+        """Запрос данных из SETTING_CHAR: запись запроса и чтение ответа."""
+        if not self.is_connected or not self.client:
+            raise Exception("Устройство не подключено")
+
+        with self.connection.active():
+            await self.send_command(self.SETTING_CHAR_UUID, protocol.encode_query(target))
+            with self.metrics.timer(STAGE_READ):
+                raw = await self.client.read_gatt_char(self.connection.characteristic(self.SETTING_CHAR_UUID))
+        if self.trace is not None:
+            self.trace.read(self.mac_address, self.SETTING_CHAR_UUID, raw)
+        try:
+            frame = protocol.decode_frame(raw)
+        except protocol.ChecksumError:
+            self.metrics.count("checksum_errors")
+            raise
+        if not isinstance(frame, frame_type):
+            raise protocol.ProtocolError(f"Неожиданный ответ на запрос 0x{target:02x}: {bytes(raw).hex()}")
+        return frame
+
+    async def read_schedule_info(self):
+        """Число слотов расписания и CRC таблицы."""
+        return await self._query(protocol.QUERY_SCHEDULE_INFO, protocol.ScheduleInfoFrame)
+
+    async def read_schedule_slot(self, index):
+        """Чтение одного слота расписания."""
+        return await self._query(index, protocol.ScheduleSlotFrame)
+
+    async def write_schedule_slot(self, slot):
+        """Запись одного слота расписания."""
+        return await self.execute_command(self.SETTING_CHAR_UUID, protocol.encode_schedule_slot(*slot))
+
+    async def read_settings(self):
+        """Чтение настроек устройства (SettingsFrame)."""
+        return await self._query(protocol.QUERY_SETTINGS, protocol.SettingsFrame)
+
+    async def sync_schedule(self, meals, settings=None):
+        """Синхронизация расписания кормлений и настроек с устройством.
+
+        После синхронизации устройство кормит по расписанию само, без
+        BLE обмена. Возвращает число чтений и записей.
+        """
+        result = await self.schedule_sync.async_sync(meals, settings)
+        self.metrics.count("schedule_writes", result["writes"])
+        if result["writes"]:
+            _LOGGER.info(f"Расписание {self.mac_address} обновлено, записей: {result['writes']}")
+            asyncio.get_running_loop().create_task(self.publish_event("schedule", **result))
+        return result
+
+    def set_status_callback(self, callback):
+        """Установка обработчика статуса, полученного вне опроса (уведомления, чтение после команды)."""
+        self._status_callback = callback
+
+    def set_schedule_handler(self, handler):
+        """Установка обработчика расписания из MQTT: корутина handler(mac, schedule, settings).
+
+        Координатор сохраняет расписание в конфигурационной записи, чтобы
+        следующая синхронизация из конфигурации его не откатила.
+        """
+        self._schedule_handler = handler
+
+    def report_status(self, status):
+        """Передача статуса, полученного вне опроса, обработчику."""
+        if self._status_callback:
+            self._status_callback(self.mac_address, status)
+
+    async def start_notifications(self):
+        """Подписка на уведомления характеристик статуса."""
+        active = False
+        for char_uuid in (self.DEVICE_CHAR_UUID, self.BLE_CHAR_UUID):
+            try:
+                await self.client.start_notify(self.connection.characteristic(char_uuid), self._handle_notification)
+                active = True
+            except Exception as e:
+                _LOGGER.warning(f"Не удалось подписаться на {char_uuid} у {self.mac_address}: {e}")
+        self.notifications_active = active
+        return active
+
+    def has_fresh_status(self):
+        """Есть ли актуальный статус из уведомлений или рекламы."""
+        loop_time = asyncio.get_event_loop().time()
+        if self.notifications_active and self.last_notification is not None:
+            if loop_time - self.last_notification < self.STATUS_STALE_AFTER:
+                return True
+        if self.last_advertisement is None or loop_time - self.last_advertisement >= self.STATUS_STALE_AFTER:
+            return False
+        if self._advert_has_food_level:
+            return True
+        return self.last_read is not None and loop_time - self.last_read < self.FOOD_LEVEL_STALE_AFTER
+
+    def handle_advertisement(self, service_data, manufacturer_data, rssi=None):
+        """Разбор рекламного пакета без подключения.
+
+        Возвращает новый статус или None, если в пакете нет данных W5.
+        Поля, которых нет в рекламе, берутся из последнего статуса.
+        """
+        self.rssi = rssi
+        data = service_data.get(self.DEVICE_SERVICE_UUID)
+        frame = protocol.decode_advertisement(data)
+        if frame is None:
+            for data in manufacturer_data.values():
+                frame = protocol.decode_advertisement(data)
+                if frame is not None:
+                    break
+        if frame is None:
+            return None
+        if self.trace is not None:
+            self.trace.advertisement(self.mac_address, rssi, data)
+
+        status = self._status_from_frame(frame)
+        if frame.food_level is None and self.last_data is not None:
+            # Уровень корма в рекламе не передается - остается последний прочитанный
+            status = status.replace(food_level=self.last_data.food_level)
+
+        self.last_advertisement = status.last_update
+        self._advert_has_food_level = frame.food_level is not None
+        self.last_data = status
+        return status
+
+    def _handle_notification(self, sender, data):
+        """Обработка уведомления от устройства."""
+        self.connection.touch()
+        self.metrics.count("notifications")
+        if self.trace is not None:
+            self.trace.notify(self.mac_address, getattr(sender, "uuid", sender), data)
+        with self.metrics.timer(STAGE_DECODE):
+            frames = self._assembler.feed(data)
+        for frame in frames:
+            if isinstance(frame, protocol.AckFrame):
+                self._resolve_ack(frame)
+                continue
+            if isinstance(frame, protocol.FeedDoneFrame):
+                self._resolve_feed_done(frame)
+                continue
+            if not isinstance(frame, protocol.StatusFrame):
+                _LOGGER.debug(f"Необработанный кадр от {self.mac_address}: {frame}")
+                continue
+
+            status = self._status_from_frame(frame)
+            self.last_notification = self.last_read = status.last_update
+            self.last_data = status
+            self.report_status(status)
+
+    def frame_errors(self):
+        """Ошибки разбора кадров (уведомления и прямые чтения)."""
+        return {
+            "checksum_errors": self._assembler.checksum_errors + self.metrics.counters["checksum_errors"],
+            "dropped_bytes": self._assembler.dropped_bytes,
+        }
+
+    def _resolve_ack(self, ack):
+        """Передача подтверждения ожидающей команде."""
+        for future in self._ack_waiters.get(ack.command, ()):
+            if not future.done():
+                future.set_result(ack)
+                return
+        _LOGGER.debug(f"Подтверждение без ожидающей команды от {self.mac_address}: {ack}")
+
+    def _resolve_feed_done(self, done):
+        """Передача результата выдачи корма ожидающей команде."""
+        for future in self._feed_waiters:
+            if not future.done():
+                future.set_result(done)
+                return
+        _LOGGER.debug(f"Завершение выдачи корма без ожидающей команды от {self.mac_address}: {done}")
+
+    def _status_from_frame(self, frame):
+        """Преобразование кадра статуса в данные координатора."""
+        return PetkitW5Status(
+            DeviceStatus.ONLINE,
+            state=frame.state,
+            battery=frame.battery,
+            food_level=frame.food_level,
+            last_update=asyncio.get_event_loop().time(),
+        )
 
     async def get_status(self):
         """Получение статуса устройства."""
         if not self.is_connected:
-            return {"status": "offline"}
+            return PetkitW5Status.offline()
 
+        raw = None
         try:
-            # Здесь должна быть реализация получения реальных данных
-            # Пока используем заглушку с реалистичными данными
-            data = {
-                "status": "online",
-                "battery": 95,
-                "food_level": 80,
-                "last_update": asyncio.get_event_loop().time()
-            }
+            with self.connection.active(), self.metrics.timer(STAGE_READ):
+                raw = await self.client.read_gatt_char(self.connection.characteristic(self.DEVICE_CHAR_UUID))
+            if self.trace is not None:
+                self.trace.read(self.mac_address, self.DEVICE_CHAR_UUID, raw)
+            with self.metrics.timer(STAGE_DECODE):
+                frame = protocol.decode_frame(raw)
+            if not isinstance(frame, protocol.StatusFrame):
+                raise protocol.ProtocolError(f"Ожидался кадр статуса: {bytes(raw).hex()}")
+            data = self._status_from_frame(frame)
+            self.last_read = data.last_update
             self.last_data = data
             return data
         except Exception as e:
+            if isinstance(e, protocol.ChecksumError):
+                self.metrics.count("checksum_errors")
+            if self.trace is not None and raw is None:
+                self.trace.read_error(self.mac_address, self.DEVICE_CHAR_UUID, e)
             _LOGGER.error(f"Ошибка получения статуса: {e}")
-            return {"status": "error", "error": str(e)}
+            return PetkitW5Status.failed(DeviceStatus.ERROR, e)
 
-    def setup_mqtt(self, topic):
-        """Настройка MQTT клиента."""
-        if not self.mqtt_config:
-            return
+    def setup_mqtt(self, mqtt_client, topic, heartbeat_interval=DEFAULT_MQTT_HEARTBEAT, outbox=None):
+        """Привязка устройства к общему MQTT клиенту.
+
+        Если задан outbox, публикации идут через него и не теряются,
+        пока брокер недоступен.
+        """
+        if self._mqtt_unsubscribe:
+            self._mqtt_unsubscribe()
+        self.mqtt_client = mqtt_client
+        self.mqtt_topic = topic
+        self.outbox = outbox
+        self.publisher = DeltaPublisher(outbox or mqtt_client, topic, heartbeat_interval)
+        self._mqtt_unsubscribe = mqtt_client.async_subscribe(f"{topic}/cmd", self.on_mqtt_message)
+        _LOGGER.info(f"MQTT настроен для топика: {topic}")
+
+    async def publish_mqtt(self, status, qos=1):
+        """Публикация изменившихся полей статуса в MQTT."""
+        if not self.publisher:
+            return False
 
         try:
-            self.mqtt_client = mqtt.Client()
-            if self.mqtt_config.get("user") and self.mqtt_config.get("password"):
-                self.mqtt_client.username_pw_set(
-                    self.mqtt_config["user"], 
-                    self.mqtt_config["password"]
-                )
-            
-            self.mqtt_client.connect(
-                self.mqtt_config["broker"],
-                self.mqtt_config["port"],
-                60
-            )
-            self.mqtt_topic = topic
-            _LOGGER.info(f"MQTT клиент настроен для топика: {topic}")
+            with self.metrics.timer(STAGE_PUBLISH):
+                published = await self.publisher.async_publish(status.as_dict(), qos=qos)
         except Exception as e:
-            _LOGGER.error(f"Ошибка настройки MQTT: {e}")
+            _LOGGER.error(f"Ошибка публикации в MQTT: {e}")
+            published = False
+        if not published:
+            self.metrics.count("publish_failures")
+        return published
 
-    def publish_mqtt(self, data):
-        """Публикация данных в MQTT."""
-        if not self.mqtt_client or not hasattr(self, 'mqtt_topic'):
-            return
+    async def publish_event(self, event, **data):
+        """Публикация события устройства в <topic>/event (не retained)."""
+        if not self.mqtt_topic:
+            return False
 
+        payload = json.dumps({"event": event, "timestamp": time.time(), **data})
         try:
-            import json
-            payload = json.dumps(data)
-            self.mqtt_client.publish(f"{self.mqtt_topic}/status", payload)
-            _LOGGER.debug(f"Данные опубликованы в MQTT: {payload}")
+            if self.outbox:
+                return await self.outbox.async_publish(f"{self.mqtt_topic}/event", payload, qos=1, event=True)
+            return await self.mqtt_client.async_publish(f"{self.mqtt_topic}/event", payload, qos=1)
         except Exception as e:
-            _LOGGER.error(f"Ошибка публикации в MQTT: {e}")
+            _LOGGER.error(f"Ошибка публикации события в MQTT: {e}")
+            return False
+
+    async def async_close(self):
+        """Остановка окна подключения, отписка от MQTT и отключение."""
+        if self._mqtt_unsubscribe:
+            self._mqtt_unsubscribe()
+            self._mqtt_unsubscribe = None
+        await self.planner.async_stop()
+        await self.disconnect()
 
-    def on_mqtt_message(self, client, userdata, msg):
-        """Обработка входящих MQTT сообщений."""
+    def on_mqtt_message(self, topic, payload):
+        """Обработка входящих MQTT команд (<topic>/cmd)."""
         try:
-            import json
-            payload = json.loads(msg.payload.decode())
+            payload = json.loads(payload)
             _LOGGER.debug(f"Получено MQTT сообщение: {payload}")
             
             # Обработка команд из MQTT
             if "feed" in payload:
-                amount = payload.get("feed", 10)
-                # Здесь должна быть асинхронная отправка команды
-                # asyncio.create_task(self.feed_now(amount))
+                amount = int(payload.get("feed") or DEFAULT_FEED_AMOUNT)
+                command = self.commands.async_feed(amount)
+            elif payload.get("sync_time"):
+                command = self.commands.async_sync_time()
+            elif "schedule" in payload or "settings" in payload:
+                # Частичные настройки дополняются текущими значениями устройства
+                schedule, settings = payload.get("schedule"), payload.get("settings")
+                if self._schedule_handler:
+                    command = self._schedule_handler(self.mac_address, schedule, settings)
+                else:
+                    # Без обработчика (мост) сохранить расписание негде: оно
+                    # пишется только в устройство (см. PetkitW5Bridge)
+                    command = self.commands.async_sync_schedule(
+                        None if schedule is None else parse_meals(schedule), settings
+                    )
+            else:
+                _LOGGER.warning(f"Неизвестная MQTT команда для {self.mac_address}: {payload}")
+                return
+
+            asyncio.get_running_loop().create_task(self._async_run_mqtt_command(command))
                 
         except Exception as e:
             _LOGGER.error(f"Ошибка обработки MQTT сообщения: {e}")
+
+    async def _async_run_mqtt_command(self, command):
+        """Выполнение команды из MQTT с журналированием результата."""
+        try:
+            ack = await command
+            _LOGGER.debug(f"MQTT команда для {self.mac_address} подтверждена: {ack}")
+        except Exception as e:
+            _LOGGER.error(f"MQTT команда для {self.mac_address} не выполнена: {e}")
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import time
+from .const import (
+    DEFAULT_MIN_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL, DEFAULT_UPDATE_INTERVAL,
+    DEFAULT_POLL_BOOST_DURATION, DEFAULT_LOW_BATTERY,
+    DEFAULT_MAX_CONCURRENCY, DEFAULT_DEVICE_TIMEOUT, DEFAULT_PROBE_TIMEOUT
+)
+from .models import DeviceStatus, PetkitW5Status
+
+_LOGGER = logging.getLogger(__name__)
+
+# Изменение уровня корма (в %), после которого опрос учащается
+LARGE_FOOD_CHANGE = 5
+# Во сколько раз растет интервал, пока показания не меняются
+BACKOFF_FACTOR = 1.5
+# Во сколько раз растет интервал при низком заряде батареи
+LOW_BATTERY_FACTOR = 2
+
+class AdaptivePollSchedule:
+    """Собственный интервал опроса одного устройства.
+
+    После кормления или заметного изменения уровня корма устройство
+    опрашивается с минимальным интервалом в течение boost_duration.
+    Пока показания не меняются, интервал растет в BACKOFF_FACTOR раз до
+    максимума; любое изменение возвращает базовый интервал. При низком
+    заряде интервал увеличивается, чтобы реже будить радио устройства.
+    Любые свежие данные (в том числе из рекламы и уведомлений) сдвигают
+    следующий опрос.
+    """
+
+    def __init__(
+        self,
+        min_interval=DEFAULT_MIN_POLL_INTERVAL,
+        max_interval=DEFAULT_MAX_POLL_INTERVAL,
+        base_interval=DEFAULT_UPDATE_INTERVAL,
+        boost_duration=DEFAULT_POLL_BOOST_DURATION,
+        low_battery=DEFAULT_LOW_BATTERY,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.base_interval = self._clamp(base_interval)
+        self.boost_duration = boost_duration
+        self.low_battery = low_battery
+        self.interval = self.base_interval
+        self.next_poll = 0.0
+        self.boost_until = 0.0
+
+    def _clamp(self, interval):
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def due(self, now=None):
+        """Пора ли опрашивать устройство."""
+        now = time.monotonic() if now is None else now
+        return now >= self.next_poll
+
+    def boost(self, now=None):
+        """Частый опрос в ближайшее время (после команды кормления)."""
+        now = time.monotonic() if now is None else now
+        self.boost_until = now + self.boost_duration
+        self.interval = self.min_interval
+        self.next_poll = now
+
+    def record(self, status, previous=None, now=None):
+        """Пересчет интервала по новому статусу. Возвращает интервал."""
+        now = time.monotonic() if now is None else now
+        if not status.is_online:
+            # Недоступностью занимается breaker, интервал не меняется
+            self.next_poll = now + self.interval
+            return self.interval
+
+        if (
+            previous is not None and previous.food_level is not None and status.food_level is not None
+            and abs(status.food_level - previous.food_level) >= LARGE_FOOD_CHANGE
+        ):
+            self.boost_until = max(self.boost_until, now + self.boost_duration)
+
+        if now < self.boost_until:
+            interval = self.min_interval
+        elif previous is not None and previous.is_online and (status.battery, status.food_level) == (
+            previous.battery, previous.food_level
+        ):
+            interval = max(self.interval, self.base_interval) * BACKOFF_FACTOR
+        else:
+            interval = self.base_interval
+
+        if status.battery is not None and status.battery <= self.low_battery and now >= self.boost_until:
+            interval = max(interval, self.base_interval * LOW_BATTERY_FACTOR)
+
+        self.interval = self._clamp(interval)
+        self.next_poll = now + self.interval
+        return self.interval
+
+class DevicePoller:
+    """Опрос устройств с ограничением параллельности, таймаутом и breaker.
+
+    Общий для координатора Home Assistant и автономного моста.
+    Устройства с разомкнутым breaker не опрашиваются и не занимают
+    слот семафора до следующей пробной попытки.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        device_timeout=DEFAULT_DEVICE_TIMEOUT,
+        probe_timeout=DEFAULT_PROBE_TIMEOUT,
+    ):
+        self.device_timeout = device_timeout
+        self.probe_timeout = probe_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def async_poll(self, device, health):
+        """Опрос одного устройства."""
+        mac = device.mac_address
+        if not health.allow_request():
+            return PetkitW5Status.offline()
+        
+        # Пробная попытка для недоступного устройства - с коротким таймаутом
+        timeout = min(self.probe_timeout, self.device_timeout) if health.is_probing else self.device_timeout
+        
+        try:
+            async with self._semaphore:
+                device_data = await asyncio.wait_for(self._async_read(device), timeout)
+        except asyncio.TimeoutError:
+            device.metrics.count("poll_timeouts")
+            device_data = PetkitW5Status.failed(DeviceStatus.TIMEOUT, f"Таймаут опроса ({timeout} с)")
+        except asyncio.CancelledError:
+            # Отмена в очереди семафора или до чтения (конец цикла опроса) -
+            # следствие нагрузки, а не ошибка устройства
+            if device.planner.reading:
+                self.record_failure(mac, health, "Опрос отменен")
+            raise
+        except Exception as e:
+            device_data = PetkitW5Status.failed(DeviceStatus.ERROR, e)
+        
+        if device_data.is_online:
+            if health.record_success():
+                _LOGGER.info(f"Устройство {mac} снова доступно")
+        else:
+            self.record_failure(mac, health, device_data.error or device_data.status.value)
+        
+        return device_data
+
+    @staticmethod
+    def record_failure(mac, health, error):
+        """Учет ошибки устройства. Повторные ошибки не засоряют журнал."""
+        first_failure = health.failures == 0
+        opened = health.record_failure(error)
+        
+        if first_failure:
+            _LOGGER.error(f"Ошибка обработки устройства {mac}: {error}")
+        else:
+            _LOGGER.debug(f"Ошибка обработки устройства {mac}: {error}")
+        if opened:
+            delay = health.next_retry - time.monotonic()
+            _LOGGER.warning(
+                f"Устройство {mac} недоступно после {health.failures} попыток, "
+                f"следующая проверка через {delay:.0f} с"
+            )
+
+    @staticmethod
+    async def _async_read(device):
+        """Подключение к устройству, получение статуса и публикация в MQTT."""
+        # Статус из уведомлений или рекламы свежий - подключаться не нужно
+        if device.has_fresh_status():
+            return device.last_data
+        
+        # Чтение в окне подключения вместе с накопленными командами
+        device_data = await device.planner.async_read_status()
+        await device.publish_mqtt(device_data)
+        return device_data
@@ -0,0 +1,244 @@
+"""Бинарный протокол Petkit W5 поверх GATT.
+
+Все кадры имеют фиксированную длину 13 байт:
+заголовок (0x01), код команды, 10 байт полезной нагрузки и контрольная
+сумма (младший байт суммы предыдущих 12 байт). Модуль не зависит от
+Home Assistant и bleak.
+"""
+import binascii
+import struct
+from collections import namedtuple
+
+FRAME_HEADER = 0x01
+FRAME_SIZE = 13
+
+CMD_FEED = 0x02
+CMD_STATUS = 0x03
+CMD_SETTINGS = 0x04
+CMD_TIME_SYNC = 0x05
+CMD_ACK = 0x06
+# Уведомление устройства о завершении выдачи корма
+CMD_FEED_DONE = 0x07
+# Слот расписания кормления: запись (подтверждается ACK) и ответ на запрос
+CMD_SCHEDULE_SLOT = 0x08
+# Сводка таблицы расписания: число слотов и CRC-32 таблицы
+CMD_SCHEDULE_INFO = 0x09
+# Запрос данных в SETTING_CHAR: слот, сводка или настройки. Ответ
+# читается из той же характеристики
+CMD_QUERY = 0x0A
+
+QUERY_SCHEDULE_INFO = 0xFF
+QUERY_SETTINGS = 0xFE
+# Дни недели слота: бит 0 - понедельник, ..., бит 6 - воскресенье
+EVERY_DAY = 0x7F
+
+ACK_OK = 0x00
+
+# Рекламный пакет: версия формата, состояние, батарея, уровень корма
+ADVERT_VERSION = 0x01
+FOOD_LEVEL_UNKNOWN = 0xFF
+
+# Раскладки кадров целиком, включая заголовок, команду и контрольную сумму
+HEADER = struct.Struct("<BB")
+FEED_FRAME = struct.Struct("<BBB9xB")
+STATUS_FRAME = struct.Struct("<BBBBB7xB")
+SETTINGS_FRAME = struct.Struct("<BBBBB7xB")
+TIME_SYNC_FRAME = struct.Struct("<BBIh4xB")
+ACK_FRAME = struct.Struct("<BBBB8xB")
+FEED_DONE_FRAME = struct.Struct("<BBBH7xB")
+SCHEDULE_SLOT_FRAME = struct.Struct("<BBBBBBHB3xB")
+SCHEDULE_INFO_FRAME = struct.Struct("<BBBI5xB")
+QUERY_FRAME = struct.Struct("<BBB9xB")
+# Слот в составе таблицы для CRC: index enabled hour minute amount days
+SCHEDULE_SLOT = struct.Struct("<BBBBHB")
+ADVERT = struct.Struct("<BBBB")
+
+FeedFrame = namedtuple("FeedFrame", "amount")
+StatusFrame = namedtuple("StatusFrame", "state battery food_level")
+SettingsFrame = namedtuple("SettingsFrame", "light sound child_lock")
+TimeSyncFrame = namedtuple("TimeSyncFrame", "timestamp tz_offset")
+AckFrame = namedtuple("AckFrame", "command result")
+FeedDoneFrame = namedtuple("FeedDoneFrame", "result grams")
+ScheduleSlotFrame = namedtuple("ScheduleSlotFrame", "index enabled hour minute amount days")
+ScheduleInfoFrame = namedtuple("ScheduleInfoFrame", "slots crc")
+QueryFrame = namedtuple("QueryFrame", "target")
+AdvertFrame = namedtuple("AdvertFrame", "state battery food_level")
+
+_DECODERS = {
+    CMD_FEED: (FEED_FRAME, FeedFrame),
+    CMD_STATUS: (STATUS_FRAME, StatusFrame),
+    CMD_SETTINGS: (SETTINGS_FRAME, SettingsFrame),
+    CMD_TIME_SYNC: (TIME_SYNC_FRAME, TimeSyncFrame),
+    CMD_ACK: (ACK_FRAME, AckFrame),
+    CMD_FEED_DONE: (FEED_DONE_FRAME, FeedDoneFrame),
+    CMD_SCHEDULE_SLOT: (SCHEDULE_SLOT_FRAME, ScheduleSlotFrame),
+    CMD_SCHEDULE_INFO: (SCHEDULE_INFO_FRAME, ScheduleInfoFrame),
+    CMD_QUERY: (QUERY_FRAME, QueryFrame),
+}
+
+class ProtocolError(Exception):
+    """Кадр не соответствует протоколу."""
+
+class ChecksumError(ProtocolError):
+    """Контрольная сумма кадра не совпала."""
+
+def checksum(data):
+    """Вычисление контрольной суммы."""
+    return sum(data) & 0xFF
+
+def decode_frame(buffer, offset=0):
+    """Разбор одного кадра из buffer начиная с offset.
+
+    buffer может быть bytes, bytearray или memoryview - данные
+    распаковываются на месте, без промежуточных копий.
+    """
+    view = memoryview(buffer)
+    if len(view) - offset < FRAME_SIZE:
+        raise ProtocolError(f"Неполный кадр: {len(view) - offset} байт")
+
+    header, cmd = HEADER.unpack_from(view, offset)
+    if header != FRAME_HEADER:
+        raise ProtocolError(f"Неверный заголовок кадра: 0x{header:02x}")
+
+    end = offset + FRAME_SIZE - 1
+    if checksum(view[offset:end]) != view[end]:
+        raise ChecksumError(f"Неверная контрольная сумма кадра 0x{cmd:02x}")
+
+    decoder = _DECODERS.get(cmd)
+    if decoder is None:
+        raise ProtocolError(f"Неизвестная команда: 0x{cmd:02x}")
+
+    layout, frame_type = decoder
+    return frame_type._make(layout.unpack_from(view, offset)[2:-1])
+
+def decode_advertisement(data):
+    """Разбор данных рекламного пакета (service или manufacturer data).
+
+    Возвращает AdvertFrame или None, если формат не распознан.
+    food_level равен None, если устройство не передает его в рекламе.
+    """
+    if data is None or len(data) < ADVERT.size:
+        return None
+
+    version, state, battery, food_level = ADVERT.unpack_from(data)
+    if version != ADVERT_VERSION or battery > 100:
+        return None
+    return AdvertFrame(state, battery, None if food_level == FOOD_LEVEL_UNKNOWN else food_level)
+
+def encode_advertisement(state, battery, food_level=None):
+    """Данные рекламного пакета (для эмуляторов)."""
+    return ADVERT.pack(
+        ADVERT_VERSION, state, battery,
+        FOOD_LEVEL_UNKNOWN if food_level is None else food_level,
+    )
+
+def _encode(layout, *fields):
+    """Упаковка кадра с заполнением контрольной суммы."""
+    frame = bytearray(FRAME_SIZE)
+    layout.pack_into(frame, 0, FRAME_HEADER, *fields, 0)
+    frame[-1] = checksum(memoryview(frame)[:-1])
+    return frame
+
+def encode_feed(amount):
+    """Команда кормления (amount - граммы)."""
+    return _encode(FEED_FRAME, CMD_FEED, amount)
+
+def encode_status(state, battery, food_level):
+    """Кадр статуса (используется в тестовых стендах и эмуляторах)."""
+    return _encode(STATUS_FRAME, CMD_STATUS, state, battery, food_level)
+
+def encode_settings(light, sound, child_lock):
+    """Команда записи настроек устройства."""
+    return _encode(SETTINGS_FRAME, CMD_SETTINGS, int(light), int(sound), int(child_lock))
+
+def encode_time_sync(timestamp, tz_offset=0):
+    """Команда синхронизации времени (tz_offset - минуты от UTC)."""
+    return _encode(TIME_SYNC_FRAME, CMD_TIME_SYNC, int(timestamp), int(tz_offset))
+
+def encode_ack(command, result=ACK_OK):
+    """Подтверждение команды (отправляется устройством)."""
+    return _encode(ACK_FRAME, CMD_ACK, command, result)
+
+def encode_feed_done(grams, result=ACK_OK):
+    """Завершение выдачи корма (отправляется устройством)."""
+    return _encode(FEED_DONE_FRAME, CMD_FEED_DONE, result, grams)
+
+def encode_schedule_slot(index, enabled, hour, minute, amount, days=EVERY_DAY):
+    """Запись одного слота расписания (amount - граммы)."""
+    return _encode(SCHEDULE_SLOT_FRAME, CMD_SCHEDULE_SLOT, index, int(enabled), hour, minute, amount, days)
+
+def encode_schedule_info(slots, crc):
+    """Сводка таблицы расписания (отправляется устройством)."""
+    return _encode(SCHEDULE_INFO_FRAME, CMD_SCHEDULE_INFO, slots, crc)
+
+def encode_query(target):
+    """Запрос слота target, сводки (QUERY_SCHEDULE_INFO) или настроек (QUERY_SETTINGS)."""
+    return _encode(QUERY_FRAME, CMD_QUERY, target)
+
+def schedule_crc(slots):
+    """CRC-32 таблицы расписания - так же, как ее считает устройство.
+
+    slots - ScheduleSlotFrame всех слотов по порядку индексов.
+    """
+    crc = 0
+    for slot in slots:
+        crc = binascii.crc32(SCHEDULE_SLOT.pack(*slot), crc)
+    return crc
+
+class FrameAssembler:
+    """Сборка кадров из фрагментированных уведомлений.
+
+    Уведомление может содержать часть кадра, ровно один кадр или
+    несколько кадров подряд. Если внутреннего остатка нет, кадры
+    разбираются прямо из буфера уведомления.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.checksum_errors = 0
+        self.dropped_bytes = 0
+
+    def reset(self):
+        """Сброс незавершенного кадра (например, после отключения)."""
+        self._buffer.clear()
+
+    def feed(self, data):
+        """Добавление уведомления. Возвращает список разобранных кадров."""
+        frames = []
+        if not self._buffer:
+            with memoryview(data) as view:
+                offset = self._scan(view, frames)
+                if offset < len(view):
+                    self._buffer += view[offset:]
+            return frames
+
+        self._buffer += data
+        with memoryview(self._buffer) as view:
+            offset = self._scan(view, frames)
+        del self._buffer[:offset]
+        return frames
+
+    def _scan(self, view, frames):
+        """Разбор всех полных кадров. Возвращает число обработанных байт."""
+        offset = 0
+        size = len(view)
+        while offset < size:
+            if view[offset] != FRAME_HEADER:
+                # Поиск начала следующего кадра
+                offset += 1
+                self.dropped_bytes += 1
+                continue
+            if size - offset < FRAME_SIZE:
+                break
+            try:
+                frames.append(decode_frame(view, offset))
+                offset += FRAME_SIZE
+            except ChecksumError:
+                self.checksum_errors += 1
+                self.dropped_bytes += 1
+                offset += 1
+            except ProtocolError:
+                # Корректный кадр неизвестного типа пропускается целиком
+                self.dropped_bytes += FRAME_SIZE
+                offset += FRAME_SIZE
+        return offset
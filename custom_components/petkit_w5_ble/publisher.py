@@ -0,0 +1,84 @@
+import asyncio
+import json
+import logging
+import time
+from .const import DEFAULT_MQTT_HEARTBEAT
+
+_LOGGER = logging.getLogger(__name__)
+
+class DeltaPublisher:
+    """Публикация в MQTT только изменившихся полей статуса устройства.
+
+    Каждое поле публикуется в свой retained-подтопик <topic>/<поле>.
+    Новое значение сравнивается с последним опубликованным, неизменные
+    поля не отправляются. Раз в heartbeat_interval все поля публикуются
+    заново, включая служебные (last_update).
+    """
+
+    # Поля, которые меняются при каждом чтении и не считаются изменением
+    VOLATILE_FIELDS = frozenset(("last_update",))
+    # Поля, которые очищаются, когда пропадают из статуса; остальные
+    # сохраняют последнее известное значение
+    CLEARABLE_FIELDS = frozenset(("error",))
+
+    def __init__(self, mqtt_client, topic, heartbeat_interval=DEFAULT_MQTT_HEARTBEAT):
+        self.mqtt_client = mqtt_client
+        self.topic = topic
+        self.heartbeat_interval = heartbeat_interval
+        self._published = {}
+        self._last_heartbeat = None
+
+    def reset(self):
+        """Забыть опубликованное состояние (следующая публикация будет полной)."""
+        self._published.clear()
+        self._last_heartbeat = None
+
+    async def async_publish(self, data, qos=1):
+        """Публикация изменений. Возвращает True, если все сообщения подтверждены."""
+        now = time.monotonic()
+        heartbeat = (
+            self._last_heartbeat is None
+            or now - self._last_heartbeat >= self.heartbeat_interval
+        )
+
+        changes = {
+            field: value
+            for field, value in data.items()
+            if heartbeat or (field not in self.VOLATILE_FIELDS and self._published.get(field) != value)
+        }
+        # Исчезнувшая ошибка очищается пустым retained-сообщением
+        for field in (self.CLEARABLE_FIELDS & self._published.keys()) - data.keys():
+            changes[field] = None
+
+        if not changes:
+            return True
+
+        results = await asyncio.gather(*(
+            self.mqtt_client.async_publish(
+                f"{self.topic}/{field}", self._encode(value), qos=qos, retain=True
+            )
+            for field, value in changes.items()
+        ))
+
+        for (field, value), published in zip(changes.items(), results):
+            if not published:
+                continue
+            if value is None:
+                self._published.pop(field, None)
+            else:
+                self._published[field] = value
+
+        success = all(results)
+        if heartbeat and success:
+            self._last_heartbeat = now
+        _LOGGER.debug(f"Опубликованы поля {self.topic}: {', '.join(changes)}")
+        return success
+
+    @staticmethod
+    def _encode(value):
+        """Сериализация значения поля в payload."""
+        if value is None:
+            return b""
+        if isinstance(value, str):
+            return value
+        return json.dumps(value)
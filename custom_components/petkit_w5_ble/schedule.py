@@ -0,0 +1,157 @@
+import logging
+from collections import namedtuple
+from . import protocol
+from .const import DEFAULT_FEED_AMOUNT, CONF_SCHEDULE, CONF_SETTINGS
+
+_LOGGER = logging.getLogger(__name__)
+
+Meal = namedtuple("Meal", "hour minute amount days")
+
+def parse_meals(items):
+    """Кормления из конфигурации: [{"time": "07:30", "amount": 10, "days": [0, 4]}].
+
+    days - номера дней недели (0 - понедельник), без days - каждый день.
+    Повторы объединяются, результат отсортирован по времени.
+    """
+    meals = set()
+    for item in items or ():
+        hour, minute = (int(part) for part in str(item["time"]).split(":"))
+        amount = int(item.get("amount", DEFAULT_FEED_AMOUNT))
+        days = item.get("days")
+        mask = protocol.EVERY_DAY if days is None else sum(1 << int(day) for day in set(days))
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            raise ValueError(f"Неверное время кормления: {item['time']}")
+        if not 1 <= amount <= 255:
+            raise ValueError(f"Неверное количество корма: {amount}")
+        if not 0 < mask <= protocol.EVERY_DAY:
+            raise ValueError(f"Неверные дни недели: {days}")
+        meals.add(Meal(hour, minute, amount, mask))
+    return sorted(meals)
+
+def meal_config(meal):
+    """Кормление в виде записи конфигурации (обратное parse_meals)."""
+    config = {"time": f"{meal.hour:02d}:{meal.minute:02d}", "amount": meal.amount}
+    if meal.days != protocol.EVERY_DAY:
+        config["days"] = [day for day in range(7) if meal.days & (1 << day)]
+    return config
+
+def _slot_meal(slot):
+    return Meal(slot.hour, slot.minute, slot.amount, slot.days) if slot.enabled else None
+
+def plan_schedule(current, meals):
+    """Минимальный набор записей слотов для перехода к meals.
+
+    current - таблица устройства (ScheduleSlotFrame по порядку индексов).
+    Слоты, где уже записано нужное кормление, не трогаются, даже если
+    порядок слотов не совпадает со временем. Новые кормления
+    записываются сначала поверх ненужных включенных слотов (одна запись
+    вместо двух), затем в свободные; оставшиеся ненужные слоты
+    выключаются. Возвращает (записи, таблица после записи).
+    """
+    if len(meals) > len(current):
+        raise ValueError(f"Устройство поддерживает не более {len(current)} кормлений")
+
+    wanted = set(meals)
+    stale, free = [], []
+    for slot in current:
+        meal = _slot_meal(slot)
+        if meal in wanted:
+            wanted.discard(meal)
+        elif meal is not None:
+            stale.append(slot.index)
+        else:
+            free.append(slot.index)
+
+    table = list(current)
+    writes = []
+    targets = stale + free
+    for meal in sorted(wanted):
+        index = targets.pop(0)
+        writes.append(protocol.ScheduleSlotFrame(index, 1, *meal))
+    for index in targets:
+        if index in stale:
+            writes.append(protocol.ScheduleSlotFrame(index, 0, 0, 0, 0, 0))
+    for slot in writes:
+        table[slot.index] = slot
+    return writes, table
+
+async def async_sync_from_config(device, device_config):
+    """Синхронизация расписания и настроек из конфигурации устройства.
+
+    Возвращает None, если в конфигурации нет ни расписания, ни настроек.
+    """
+    schedule = device_config.get(CONF_SCHEDULE)
+    settings = device_config.get(CONF_SETTINGS)
+    if schedule is None and settings is None:
+        return None
+    meals = None if schedule is None else parse_meals(schedule)
+    return await device.commands.async_sync_schedule(meals, settings)
+
+class ScheduleSync:
+    """Синхронизация расписания и настроек с устройством.
+
+    Таблица устройства кэшируется. Перед синхронизацией читается только
+    сводка (число слотов и CRC-32): если CRC совпадает с кэшем, слоты не
+    читаются. Записываются только изменившиеся слоты, после записи CRC
+    таблицы проверяется повторно. При несовпадении кэш сбрасывается,
+    и следующая синхронизация прочитает таблицу целиком.
+
+    Вызывается из окна подключения устройства.
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self.table = None
+
+    async def async_sync(self, meals, settings=None):
+        """Синхронизация. meals=None - расписание не меняется.
+
+        Возвращает число чтений и записей.
+        """
+        reads = writes = 0
+        if meals is not None:
+            reads, writes = await self._async_sync_table(meals)
+
+        if settings is not None:
+            # Не заданные ключи сохраняют текущие значения устройства
+            current = await self.device.read_settings()
+            reads += 1
+            desired = current._replace(**{
+                key: int(bool(value)) for key, value in settings.items()
+                if key in protocol.SettingsFrame._fields
+            })
+            if current != desired:
+                await self.device.write_settings(*desired)
+                writes += 1
+
+        _LOGGER.debug(f"Расписание {self.device.mac_address} синхронизировано: чтений {reads}, записей {writes}")
+        return {"reads": reads, "writes": writes}
+
+    async def _async_sync_table(self, meals):
+        reads = writes = 0
+        info = await self.device.read_schedule_info()
+        reads += 1
+        if (
+            self.table is None or len(self.table) != info.slots
+            or protocol.schedule_crc(self.table) != info.crc
+        ):
+            self.table = None
+            table = [await self.device.read_schedule_slot(index) for index in range(info.slots)]
+            reads += info.slots
+            if protocol.schedule_crc(table) != info.crc:
+                raise protocol.ProtocolError("Таблица расписания изменилась во время чтения")
+            self.table = table
+
+        changes, table = plan_schedule(self.table, meals)
+        if changes:
+            # До проверки состояние таблицы на устройстве неизвестно
+            self.table = None
+            for slot in changes:
+                await self.device.write_schedule_slot(slot)
+            writes += len(changes)
+            info = await self.device.read_schedule_info()
+            reads += 1
+            if info.crc != protocol.schedule_crc(table):
+                raise protocol.ProtocolError("CRC расписания после записи не совпал")
+            self.table = table
+        return reads, writes
@@ -0,0 +1,159 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from .const import DEFAULT_ADAPTER_SLOTS
+
+_LOGGER = logging.getLogger(__name__)
+
+# Приоритеты запросов подключения (меньше - важнее)
+PRIORITY_COMMAND = 0
+PRIORITY_POLL = 10
+
+# Адаптер по умолчанию, если о сканерах ничего не известно
+DEFAULT_SOURCE = "default"
+
+# Как часто ожидающий запрос повторяет просьбу освободить слот
+EVICT_RETRY_INTERVAL = 1
+
+class ConnectionSlotScheduler:
+    """Распределение слотов подключения BLE адаптеров между устройствами.
+
+    Каждый адаптер (USB донгл, ESPHome прокси) держит ограниченное число
+    одновременных подключений. Слот занимается на все время подключения и
+    освобождается при отключении. Устройство получает слот на адаптере с
+    лучшим RSSI, где есть свободное место; если мест нет, запрос ждет в
+    очереди по приоритету (команды пользователя раньше фоновых опросов),
+    а простаивающее подключение на подходящем адаптере закрывается.
+    """
+
+    def __init__(self, default_slots=DEFAULT_ADAPTER_SLOTS, adapter_slots=None):
+        self.default_slots = default_slots
+        self.adapter_slots = dict(adapter_slots or {})
+        self._holders = {}
+        self._waiters = []
+        self._sequence = itertools.count()
+        self.queued_total = 0
+        self.evictions = 0
+
+    def slots(self, source):
+        """Число слотов адаптера."""
+        return self.adapter_slots.get(source, self.default_slots)
+
+    def in_use(self, source):
+        """Число занятых слотов адаптера."""
+        return sum(1 for holder_source, _ in self._holders.values() if holder_source == source)
+
+    def holder(self, mac):
+        """Адаптер, через который подключено устройство (или None)."""
+        entry = self._holders.get(mac)
+        return entry[0] if entry else None
+
+    async def acquire(self, mac, candidates, priority=PRIORITY_POLL, evict=None):
+        """Получение слота для устройства.
+
+        candidates - список (source, rssi) адаптеров, которые видят
+        устройство. evict() вызывается, чтобы попросить простаивающее
+        подключение освободить слот; возвращает False, если оно занято.
+        Возвращает source выбранного адаптера.
+        """
+        if mac in self._holders:
+            return self._holders[mac][0]
+
+        ranked = self._rank(candidates)
+        source = self._free_adapter(ranked)
+        if source is not None:
+            self._holders[mac] = (source, evict)
+            return source
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._sequence), mac, ranked, evict, future)
+        heapq.heappush(self._waiters, entry)
+        self.queued_total += 1
+        _LOGGER.debug(f"Нет свободных слотов для {mac}, в очереди: {len(self._waiters)}")
+        self._evict_idle(ranked)
+
+        try:
+            while True:
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), EVICT_RETRY_INTERVAL)
+                except asyncio.TimeoutError:
+                    # Подключения, занятые при постановке в очередь, могли освободиться
+                    self._evict_idle(ranked)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, но запрос отменен - вернуть его
+                self.release(mac)
+            else:
+                future.cancel()
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def contended(self, mac):
+        """Ждет ли слот запрос, которому подходит адаптер устройства mac."""
+        source = self.holder(mac)
+        return source is not None and any(
+            source in ranked and not future.done() for _, _, _, ranked, _, future in self._waiters
+        )
+
+    def release(self, mac):
+        """Освобождение слота и выдача его следующему запросу из очереди."""
+        if self._holders.pop(mac, None) is None:
+            return
+        self._dispatch()
+
+    def stats(self):
+        """Загрузка адаптеров для диагностики."""
+        sources = {source for source, _ in self._holders.values()} | set(self.adapter_slots)
+        return {
+            "adapters": {
+                source: {"in_use": self.in_use(source), "slots": self.slots(source)}
+                for source in sorted(sources)
+            },
+            "queued": len(self._waiters),
+            "queued_total": self.queued_total,
+            "evictions": self.evictions,
+        }
+
+    @staticmethod
+    def _rank(candidates):
+        """Адаптеры по убыванию RSSI."""
+        if not candidates:
+            return [DEFAULT_SOURCE]
+        ranked = sorted(candidates, key=lambda item: item[1] if item[1] is not None else -999, reverse=True)
+        return [source for source, _ in ranked]
+
+    def _free_adapter(self, ranked):
+        for source in ranked:
+            if self.in_use(source) < self.slots(source):
+                return source
+        return None
+
+    def _evict_idle(self, ranked):
+        """Попросить одно простаивающее подключение освободить слот."""
+        for source in ranked:
+            for mac, (holder_source, evict) in list(self._holders.items()):
+                if holder_source == source and evict is not None and evict():
+                    self.evictions += 1
+                    _LOGGER.debug(f"Освобождение слота {source}: отключение {mac}")
+                    return True
+        return False
+
+    def _dispatch(self):
+        """Выдача освободившихся слотов ожидающим запросам по приоритету."""
+        pending = []
+        while self._waiters:
+            entry = heapq.heappop(self._waiters)
+            _, _, mac, ranked, evict, future = entry
+            if future.done():
+                continue
+            source = self._free_adapter(ranked)
+            if source is None:
+                pending.append(entry)
+                continue
+            self._holders[mac] = (source, evict)
+            future.set_result(source)
+
+        for entry in pending:
+            heapq.heappush(self._waiters, entry)
@@ -1,49 +1,167 @@
 from homeassistant.components.sensor import SensorEntity, SensorDeviceClass
+from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN, EntityCategory
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.restore_state import RestoreEntity
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
-from .const import DOMAIN
+from . import entities
+from .const import (
+    DOMAIN, SIGNAL_DEVICES_ADDED, DEFAULT_CONSUMPTION_WINDOW, CONF_DIAGNOSTIC_SENSORS, DEFAULT_DIAGNOSTIC_SENSORS
+)
+from .metrics import STAGE_CONNECT
+from .models import StatusField
 
 async def async_setup_entry(hass, entry, async_add_entities):
     """Настройка сенсоров."""
     coordinator = hass.data[DOMAIN][entry.entry_id]
+    diagnostic_sensors = entry.options.get(CONF_DIAGNOSTIC_SENSORS, DEFAULT_DIAGNOSTIC_SENSORS)
     
-    sensors = []
-    for device in coordinator.devices:
-        sensors.extend([
-            PetkitW5BatterySensor(coordinator, device),
-            PetkitW5FoodLevelSensor(coordinator, device),
-        ])
+    @callback
+    def async_add_devices(devices):
+        sensors = []
+        for device in devices:
+            sensors.extend([
+                PetkitW5BatterySensor(coordinator, device),
+                PetkitW5FoodLevelSensor(coordinator, device),
+                PetkitW5ConsumptionSensor(coordinator, device),
+                PetkitW5FoodRunoutSensor(coordinator, device),
+            ])
+            if diagnostic_sensors:
+                sensors.extend([
+                    PetkitW5ConnectTimeSensor(coordinator, device),
+                    PetkitW5ReconnectsSensor(coordinator, device),
+                    PetkitW5ChecksumErrorsSensor(coordinator, device),
+                ])
+        async_add_entities(sensors)
     
-    async_add_entities(sensors)
+    async_add_devices(coordinator.devices)
+    
+    # Устройства, добавленные без перезагрузки записи
+    entry.async_on_unload(async_dispatcher_connect(
+        hass, f"{SIGNAL_DEVICES_ADDED}_{entry.entry_id}", async_add_devices
+    ))
 
-class PetkitW5BatterySensor(CoordinatorEntity, SensorEntity):
-    """Сенсор уровня батареи."""
+class PetkitW5Sensor(CoordinatorEntity, SensorEntity, RestoreEntity):
+    """Базовый сенсор поля статуса устройства.
+
+    До первого ответа устройства показывает состояние, сохраненное
+    перед перезапуском Home Assistant. Состояние записывается только
+    при изменении своего поля.
+    """
+
+    _definition = None
+    _field_flag = StatusField(0)
 
     def __init__(self, coordinator, device):
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=(device["mac"], self._field_flag))
         self._device = device
-        self._attr_name = f"{device['name']} Battery"
-        self._attr_unique_id = f"{device['mac']}_battery"
-        self._attr_device_class = SensorDeviceClass.BATTERY
-        self._attr_unit_of_measurement = "%"
+        self._restored_state = None
+        definition = self._definition
+        self._attr_name = definition.entity_name(device)
+        self._attr_unique_id = definition.unique_id(device["mac"])
+        self._attr_unit_of_measurement = definition.unit
+        if definition.device_class:
+            self._attr_device_class = SensorDeviceClass(definition.device_class)
+        if definition.entity_category:
+            self._attr_entity_category = EntityCategory(definition.entity_category)
+
+    async def async_added_to_hass(self):
+        """Восстановление последнего состояния."""
+        await super().async_added_to_hass()
+        last_state = await self.async_get_last_state()
+        if last_state is not None and last_state.state not in (STATE_UNKNOWN, STATE_UNAVAILABLE):
+            self._restored_state = last_state.state
 
     @property
     def state(self):
         """Возвращает состояние сенсора."""
-        device_data = self.coordinator.data.get(self._device["mac"], {})
-        return device_data.get("battery", 0)
+        status = self.coordinator.data.get(self._device["mac"])
+        value = getattr(status, self._definition.field) if status is not None else None
+        return self._restored_state if value is None else value
 
-class PetkitW5FoodLevelSensor(CoordinatorEntity, SensorEntity):
+class PetkitW5BatterySensor(PetkitW5Sensor):
+    """Сенсор уровня батареи."""
+
+    _definition = entities.BATTERY
+    _field_flag = StatusField.BATTERY
+
+class PetkitW5FoodLevelSensor(PetkitW5Sensor):
     """Сенсор уровня корма."""
 
-    def __init__(self, coordinator, device):
-        super().__init__(coordinator)
-        self._device = device
-        self._attr_name = f"{device['name']} Food Level"
-        self._attr_unique_id = f"{device['mac']}_food_level"
-        self._attr_unit_of_measurement = "%"
+    _definition = entities.FOOD_LEVEL
+    _field_flag = StatusField.FOOD_LEVEL
+
+class PetkitW5HistorySensor(PetkitW5Sensor):
+    """Базовый сенсор, вычисляемый по истории показаний устройства."""
+
+    _field_flag = StatusField.FOOD_LEVEL
+
+    def _history_value(self, history):
+        raise NotImplementedError
+
+    @property
+    def state(self):
+        """Возвращает состояние сенсора."""
+        history = self.coordinator.history.get(self._device["mac"])
+        value = self._history_value(history) if history is not None else None
+        if value is None:
+            return self._restored_state
+        return round(value, 1)
+
+class PetkitW5ConsumptionSensor(PetkitW5HistorySensor):
+    """Сенсор расхода корма за последние сутки."""
+
+    _definition = entities.FOOD_CONSUMPTION
+
+    def _history_value(self, history):
+        return history.consumption_rate(DEFAULT_CONSUMPTION_WINDOW)
+
+class PetkitW5FoodRunoutSensor(PetkitW5HistorySensor):
+    """Сенсор прогноза времени до окончания корма."""
+
+    _definition = entities.FOOD_RUNOUT
+
+    def _history_value(self, history):
+        return history.hours_until_empty(DEFAULT_CONSUMPTION_WINDOW)
+
+class PetkitW5MetricSensor(PetkitW5Sensor):
+    """Базовый диагностический сенсор по метрикам устройства.
+
+    Значение пересчитывается при каждом обновлении статуса устройства.
+    """
+
+    _field_flag = StatusField.READING | StatusField.LAST_UPDATE
+
+    def _metric_value(self, device):
+        raise NotImplementedError
 
     @property
     def state(self):
         """Возвращает состояние сенсора."""
-        device_data = self.coordinator.data.get(self._device["mac"], {})
-        return device_data.get("food_level", 0)
+        device = self.coordinator.petkit_devices.get(self._device["mac"])
+        return self._metric_value(device) if device is not None else None
+
+class PetkitW5ConnectTimeSensor(PetkitW5MetricSensor):
+    """95-й перцентиль времени BLE подключения."""
+
+    _definition = entities.CONNECT_TIME
+
+    def _metric_value(self, device):
+        histogram = device.metrics.stage(STAGE_CONNECT)
+        return histogram.percentile(0.95) if histogram is not None else None
+
+class PetkitW5ReconnectsSensor(PetkitW5MetricSensor):
+    """Число переподключений с момента запуска."""
+
+    _definition = entities.RECONNECTS
+
+    def _metric_value(self, device):
+        return device.metrics.counters["reconnects"]
+
+class PetkitW5ChecksumErrorsSensor(PetkitW5MetricSensor):
+    """Число кадров с неверной контрольной суммой."""
+
+    _definition = entities.CHECKSUM_ERRORS
+
+    def _metric_value(self, device):
+        return device.frame_errors()["checksum_errors"]
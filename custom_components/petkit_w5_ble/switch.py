@@ -1,25 +1,35 @@
 from homeassistant.components.switch import SwitchEntity
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
-from .const import DOMAIN
+from .const import DOMAIN, SIGNAL_DEVICES_ADDED
+from .entities import FEED
+from .models import StatusField
 
 async def async_setup_entry(hass, entry, async_add_entities):
     """Настройка переключателей."""
     coordinator = hass.data[DOMAIN][entry.entry_id]
     
-    switches = []
-    for device in coordinator.devices:
-        switches.append(PetkitW5FeedSwitch(coordinator, device))
+    @callback
+    def async_add_devices(devices):
+        async_add_entities([PetkitW5FeedSwitch(coordinator, device) for device in devices])
     
-    async_add_entities(switches)
+    async_add_devices(coordinator.devices)
+    
+    # Устройства, добавленные без перезагрузки записи
+    entry.async_on_unload(async_dispatcher_connect(
+        hass, f"{SIGNAL_DEVICES_ADDED}_{entry.entry_id}", async_add_devices
+    ))
 
 class PetkitW5FeedSwitch(CoordinatorEntity, SwitchEntity):
     """Переключатель для кормления."""
 
     def __init__(self, coordinator, device):
-        super().__init__(coordinator)
+        # Состояние переключателя не зависит от данных опроса
+        super().__init__(coordinator, context=(device["mac"], StatusField(0)))
         self._device = device
-        self._attr_name = f"{device['name']} Feed Now"
-        self._attr_unique_id = f"{device['mac']}_feed_switch"
+        self._attr_name = FEED.entity_name(device)
+        self._attr_unique_id = FEED.unique_id(device["mac"])
         self._is_on = False
 
     @property
@@ -28,17 +38,18 @@ class PetkitW5FeedSwitch(CoordinatorEntity, SwitchEntity):
         return self._is_on
 
     async def async_turn_on(self, **kwargs):
-        """Включение переключателя - кормление."""
+        """Включение переключателя - кормление.
+
+        Переключатель включен, пока устройство выдает корм, и выключается
+        по уведомлению о завершении выдачи (или по ошибке и таймауту).
+        """
+        self._is_on = True
+        self.async_write_ha_state()
         try:
-            # Здесь будет вызов функции кормления
-            success = await self._feed_device()
-            if success:
-                self._is_on = True
-                self.async_write_ha_state()
-                # Автоматически выключить через некоторое время
-                await self._async_turn_off_later()
-        except Exception as e:
-            self.hass.logger.error(f"Ошибка кормления: {e}")
+            await self._feed_device()
+        finally:
+            self._is_on = False
+            self.async_write_ha_state()
 
     async def async_turn_off(self, **kwargs):
         """Выключение переключателя."""
@@ -47,14 +58,4 @@ class PetkitW5FeedSwitch(CoordinatorEntity, SwitchEntity):
 
     async def _feed_device(self):
         """Отправка команды кормления устройству."""
-        # Здесь будет реализация BLE/MQTT коммуникации
-        # coordinator = self.coordinator
-        # await coordinator.feed_device(self._device["mac"])
-        return True
-
-    async def _async_turn_off_later(self):
-        """Автоматическое выключение через 2 секунды."""
-        async def turn_off():
-            await self.async_turn_off()
-        
-        self.hass.loop.call_later(2, lambda: self.hass.async_create_task(turn_off()))
+        return await self.coordinator.feed_device(self._device["mac"])
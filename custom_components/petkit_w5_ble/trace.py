@@ -0,0 +1,455 @@
+"""Запись BLE/MQTT трафика в бинарный файл и его воспроизведение.
+
+Формат файла: заголовок FILE_HEADER, затем записи RECORD с полезной
+нагрузкой. Время записи - секунды монотонных часов от начала записи.
+Устройства нумеруются записью KIND_DEVICE (MAC и MQTT топик), чтобы не
+повторять MAC в каждой записи. Характеристики хранятся 16-битным
+коротким UUID.
+"""
+import asyncio
+import logging
+import os
+import struct
+import time
+from collections import Counter, deque, namedtuple
+from . import protocol
+from .const import DEFAULT_TRACE_MAX_BYTES, DEFAULT_TRACE_FLUSH_BYTES, DEFAULT_TRACE_FLUSH_INTERVAL
+from .metrics import STAGE_DECODE
+from .petkit_device import PetkitW5Device
+
+_LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"PW5T"
+VERSION = 1
+
+# magic, версия, время начала записи (Unix)
+FILE_HEADER = struct.Struct("<4sBxd")
+# время, тип, номер устройства (0 - без устройства), длина нагрузки
+RECORD = struct.Struct("<dBHH")
+CHAR = struct.Struct("<H")
+RSSI = struct.Struct("<b")
+TOPIC = struct.Struct("<H")
+
+KIND_DEVICE = 0
+KIND_CONNECT = 1
+KIND_DISCONNECT = 2
+KIND_WRITE = 3
+KIND_NOTIFY = 4
+KIND_READ = 5
+KIND_ADVERT = 6
+KIND_PUBLISH = 7
+KIND_READ_ERROR = 8
+
+KIND_NAMES = {
+    KIND_DEVICE: "device",
+    KIND_CONNECT: "connect",
+    KIND_DISCONNECT: "disconnect",
+    KIND_WRITE: "write",
+    KIND_NOTIFY: "notify",
+    KIND_READ: "read",
+    KIND_ADVERT: "advert",
+    KIND_PUBLISH: "publish",
+    KIND_READ_ERROR: "read_error",
+}
+
+# RSSI, которого нет в рекламе
+RSSI_UNKNOWN = -128
+
+TraceRecord = namedtuple("TraceRecord", "time kind mac uuid rssi topic data")
+
+def short_uuid(uuid):
+    """16-битный UUID характеристики Bluetooth SIG (0000xxxx-0000-1000-...)."""
+    try:
+        return int(str(uuid)[4:8], 16)
+    except ValueError:
+        return 0
+
+def full_uuid(short):
+    return f"0000{short:04x}-0000-1000-8000-00805f9b34fb"
+
+class TraceRecorder:
+    """Запись трафика всех устройств в один файл.
+
+    Записи копятся в памяти и дописываются в файл в executor, когда
+    буфер превышает flush_bytes или прошло flush_interval секунд. После
+    max_bytes запись останавливается. Методы записи вызываются из event
+    loop и не блокируют его.
+    """
+
+    def __init__(
+        self,
+        path,
+        max_bytes=DEFAULT_TRACE_MAX_BYTES,
+        flush_bytes=DEFAULT_TRACE_FLUSH_BYTES,
+        flush_interval=DEFAULT_TRACE_FLUSH_INTERVAL,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.records = 0
+        self.size = FILE_HEADER.size
+        self.dropped = 0
+        self._start = time.monotonic()
+        self._buffer = bytearray(FILE_HEADER.pack(MAGIC, VERSION, time.time()))
+        self._devices = {}
+        self._created = False
+        self._last_flush = self._start
+        self._flush_task = None
+        self._write_lock = asyncio.Lock()
+
+    def add_device(self, mac, topic=None):
+        """Номер устройства в файле (запись KIND_DEVICE при первом обращении)."""
+        device_id = self._devices.get(mac)
+        if device_id is None:
+            device_id = self._devices[mac] = len(self._devices) + 1
+            self._append(KIND_DEVICE, device_id, f"{mac}\t{topic or ''}".encode())
+        return device_id
+
+    def connect(self, mac):
+        self._append(KIND_CONNECT, self.add_device(mac))
+
+    def disconnect(self, mac):
+        self._append(KIND_DISCONNECT, self.add_device(mac))
+
+    def write(self, mac, uuid, data):
+        self._append(KIND_WRITE, self.add_device(mac), CHAR.pack(short_uuid(uuid)) + bytes(data))
+
+    def notify(self, mac, uuid, data):
+        self._append(KIND_NOTIFY, self.add_device(mac), CHAR.pack(short_uuid(uuid)) + bytes(data))
+
+    def read(self, mac, uuid, data):
+        self._append(KIND_READ, self.add_device(mac), CHAR.pack(short_uuid(uuid)) + bytes(data))
+
+    def read_error(self, mac, uuid, error):
+        self._append(KIND_READ_ERROR, self.add_device(mac), CHAR.pack(short_uuid(uuid)) + str(error).encode())
+
+    def advertisement(self, mac, rssi, data):
+        rssi = RSSI_UNKNOWN if rssi is None else max(RSSI_UNKNOWN, min(127, rssi))
+        self._append(KIND_ADVERT, self.add_device(mac), RSSI.pack(rssi) + bytes(data or b""))
+
+    def publish(self, topic, payload):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        topic = topic.encode()
+        self._append(KIND_PUBLISH, 0, TOPIC.pack(len(topic)) + topic + bytes(payload or b""))
+
+    def stats(self):
+        return {"path": self.path, "records": self.records, "bytes": self.size, "dropped": self.dropped}
+
+    def _append(self, kind, device_id, payload=b""):
+        size = RECORD.size + len(payload)
+        if self.size + size > self.max_bytes:
+            if not self.dropped:
+                _LOGGER.warning(f"Файл записи трафика {self.path} достиг {self.max_bytes} байт, запись остановлена")
+            self.dropped += 1
+            return
+        now = time.monotonic()
+        self._buffer += RECORD.pack(now - self._start, kind, device_id, len(payload))
+        self._buffer += payload
+        self.size += size
+        self.records += 1
+        if len(self._buffer) >= self.flush_bytes or now - self._last_flush >= self.flush_interval:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self.async_flush())
+
+    async def async_flush(self):
+        """Дозапись накопленных записей в файл."""
+        async with self._write_lock:
+            self._last_flush = time.monotonic()
+            if not self._buffer:
+                return
+            data, self._buffer = bytes(self._buffer), bytearray()
+            mode = "ab" if self._created else "wb"
+            self._created = True
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, self.path, data, mode)
+            except OSError as e:
+                _LOGGER.error(f"Ошибка записи трафика в {self.path}: {e}")
+
+    @staticmethod
+    def _write(path, data, mode):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, mode) as file:
+            file.write(data)
+
+def read_trace(path):
+    """Чтение файла записи. Возвращает (время начала, список TraceRecord)."""
+    with open(path, "rb") as file:
+        data = file.read()
+    magic, version, started = FILE_HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} не является файлом записи трафика Petkit W5")
+
+    devices = {}
+    records = []
+    offset = FILE_HEADER.size
+    while offset + RECORD.size <= len(data):
+        timestamp, kind, device_id, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        payload = data[offset:offset + length]
+        offset += length
+        if len(payload) < length:
+            _LOGGER.warning(f"Последняя запись {path} обрезана")
+            break
+
+        mac, uuid, rssi, topic = devices.get(device_id, (None, None))[0], None, None, None
+        if kind == KIND_DEVICE:
+            mac, topic = payload.decode().split("\t", 1)
+            devices[device_id] = (mac, topic or None)
+            payload = b""
+        elif kind in (KIND_WRITE, KIND_NOTIFY, KIND_READ, KIND_READ_ERROR):
+            uuid = full_uuid(CHAR.unpack_from(payload)[0])
+            payload = payload[CHAR.size:]
+        elif kind == KIND_ADVERT:
+            rssi = RSSI.unpack_from(payload)[0]
+            rssi = None if rssi == RSSI_UNKNOWN else rssi
+            payload = payload[RSSI.size:]
+        elif kind == KIND_PUBLISH:
+            length = TOPIC.unpack_from(payload)[0]
+            topic = payload[TOPIC.size:TOPIC.size + length].decode()
+            payload = payload[TOPIC.size + length:]
+        records.append(TraceRecord(timestamp, kind, mac, uuid, rssi, topic, payload))
+    return started, records
+
+class _ReplayCharacteristic:
+    def __init__(self, uuid):
+        self.uuid = uuid
+
+class _ReplayServices:
+    def __init__(self):
+        self.service = _ReplayCharacteristic(PetkitW5Device.DEVICE_SERVICE_UUID)
+        self.service.characteristics = [
+            _ReplayCharacteristic(uuid) for uuid in (
+                PetkitW5Device.DEVICE_CHAR_UUID, PetkitW5Device.FEED_CHAR_UUID,
+                PetkitW5Device.BLE_CHAR_UUID, PetkitW5Device.SETTING_CHAR_UUID,
+            )
+        ]
+
+    def get_service(self, uuid):
+        return self.service if uuid == self.service.uuid else None
+
+class ReplayClient:
+    """Замена BleakClient: отдает записанные чтения (и ошибки чтения) и уведомления."""
+
+    def __init__(self, address, disconnected_callback=None, **kwargs):
+        self.address = str(address)
+        self.is_connected = False
+        self.services = None
+        self.reads = {}
+        self.writes = 0
+        self._disconnected_callback = disconnected_callback
+        self._notify_callbacks = {}
+
+    async def connect(self, **kwargs):
+        self.is_connected = True
+        self.services = _ReplayServices()
+        return True
+
+    async def disconnect(self):
+        was_connected, self.is_connected = self.is_connected, False
+        if was_connected and self._disconnected_callback:
+            self._disconnected_callback(self)
+        return True
+
+    async def start_notify(self, char, callback, **kwargs):
+        self._notify_callbacks[getattr(char, "uuid", char)] = callback
+
+    async def read_gatt_char(self, char, **kwargs):
+        queue = self.reads.get(getattr(char, "uuid", char))
+        if not queue:
+            raise ConnectionError(f"В записи нет данных для чтения {char}")
+        response = queue.popleft()
+        if isinstance(response, Exception):
+            raise response
+        return bytearray(response)
+
+    async def write_gatt_char(self, char, data, response=None):
+        self.writes += 1
+
+    def notify(self, uuid, data):
+        """Уведомление; False, если подписки нет."""
+        callback = self._notify_callbacks.get(uuid)
+        if callback is None or not self.is_connected:
+            return False
+        callback(uuid, bytearray(data))
+        return True
+
+class ReplayMqttClient:
+    """MQTT клиент воспроизведения: сохраняет публикации вместо отправки."""
+
+    is_connected = True
+
+    def __init__(self):
+        self.published = []
+
+    async def async_publish(self, topic, payload, qos=0, retain=False, timeout=10):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self.published.append((topic, bytes(payload)))
+        return True
+
+    def async_subscribe(self, topic, callback, qos=0):
+        return lambda: None
+
+    def add_connect_listener(self, callback):
+        return lambda: None
+
+class TraceReplay:
+    """Воспроизведение записи через PetkitW5Device.
+
+    Записанные события подаются в устройства в исходном порядке:
+    подключения и разрывы - через ReplayClient, уведомления - в
+    обработчик уведомлений, чтения статуса - через get_status, реклама -
+    через handle_advertisement. Обработка статусов повторяет координатор:
+    статус публикуется через DeltaPublisher в ReplayMqttClient.
+    Опубликованное сравнивается с записанными публикациями (без полей,
+    зависящих от времени).
+
+    speed - множитель скорости: 1 - в реальном времени, 0 - без пауз.
+    """
+
+    # Топики с метками времени при сравнении публикаций не учитываются
+    VOLATILE_SUFFIXES = ("/last_update", "/event")
+
+    def __init__(self, records, speed=0):
+        self.records = records
+        self.speed = speed
+        self.mqtt = ReplayMqttClient()
+        self.devices = {}
+        self.clients = {}
+        self.counts = Counter()
+        self.skipped = Counter()
+        self._tasks = set()
+
+    @classmethod
+    def from_file(cls, path, speed=0):
+        return cls(read_trace(path)[1], speed)
+
+    async def async_run(self):
+        """Воспроизведение всей записи. Возвращает отчет."""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        recorded = []
+        for record in self.records:
+            if self.speed:
+                delay = started + record.time / self.speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self.counts[KIND_NAMES.get(record.kind, record.kind)] += 1
+            if record.kind == KIND_PUBLISH:
+                recorded.append((record.topic, bytes(record.data)))
+            else:
+                await self._async_apply(record)
+            # Задачи, созданные обработчиками (публикации), выполняются по ходу
+            await asyncio.sleep(0)
+
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        elapsed = loop.time() - started
+        for device in self.devices.values():
+            await device.async_close()
+        return self._report(elapsed, recorded)
+
+    def _device(self, record):
+        device = self.devices.get(record.mac)
+        if device is None and record.mac is not None:
+            device = PetkitW5Device(
+                record.mac, idle_timeout=0, client_factory=lambda address, **kwargs: self._client(address, **kwargs)
+            )
+            device.set_status_callback(self._handle_status)
+            self.devices[record.mac] = device
+        return device
+
+    def _client(self, address, **kwargs):
+        client = ReplayClient(address, **kwargs)
+        self.clients[client.address] = client
+        return client
+
+    async def _async_apply(self, record):
+        device = self._device(record)
+        if record.kind == KIND_DEVICE:
+            topic = record.topic or f"petkit/w5/{record.mac.replace(':', '')}"
+            device.setup_mqtt(self.mqtt, topic)
+        elif record.kind == KIND_CONNECT:
+            await device.connect()
+        elif record.kind == KIND_DISCONNECT:
+            if device.is_connected:
+                await device.client.disconnect()
+        elif record.kind == KIND_WRITE:
+            if device.is_connected:
+                await device.send_command(record.uuid, record.data)
+            else:
+                self.skipped["write"] += 1
+        elif record.kind == KIND_NOTIFY:
+            client = device.client
+            if client is None or not client.notify(record.uuid, record.data):
+                device._handle_notification(record.uuid, bytearray(record.data))
+        elif record.kind in (KIND_READ, KIND_READ_ERROR):
+            await self._async_read(device, record)
+        elif record.kind == KIND_ADVERT:
+            previous = device.last_data
+            status = device.handle_advertisement({device.DEVICE_SERVICE_UUID: record.data}, {}, record.rssi)
+            if status is not None and status.changes(previous):
+                self._handle_status(device.mac_address, status)
+
+    async def _async_read(self, device, record):
+        if record.uuid == device.DEVICE_CHAR_UUID and device.is_connected:
+            response = record.data
+            if record.kind == KIND_READ_ERROR:
+                response = Exception(record.data.decode(errors="replace"))
+            device.client.reads.setdefault(record.uuid, deque()).append(response)
+            await device.publish_mqtt(await device.get_status())
+            return
+        if record.kind == KIND_READ_ERROR:
+            return
+        # Ответы на запросы настроек и расписания только разбираются
+        try:
+            with device.metrics.timer(STAGE_DECODE):
+                protocol.decode_frame(record.data)
+        except protocol.ChecksumError:
+            device.metrics.count("checksum_errors")
+        except protocol.ProtocolError as e:
+            _LOGGER.debug(f"Ответ {device.mac_address} не разобран: {e}")
+
+    def _handle_status(self, mac, status):
+        device = self.devices.get(mac)
+        if device is not None and device.publisher:
+            task = asyncio.get_running_loop().create_task(device.publish_mqtt(status))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _report(self, elapsed, recorded):
+        # Сравниваются только топики устройств (без discovery и мостов)
+        prefixes = tuple(f"{device.mqtt_topic}/" for device in self.devices.values() if device.mqtt_topic)
+
+        def stable(messages):
+            return {
+                (topic, payload) for topic, payload in messages
+                if topic.startswith(prefixes) and not topic.endswith(self.VOLATILE_SUFFIXES)
+            }
+
+        expected, replayed = stable(recorded), stable(self.mqtt.published)
+        duration = self.records[-1].time - self.records[0].time if self.records else 0.0
+        return {
+            "records": len(self.records),
+            "events": dict(self.counts),
+            "skipped": dict(self.skipped),
+            "trace_duration_s": round(duration, 3),
+            "replay_duration_s": round(elapsed, 3),
+            "records_per_s": round(len(self.records) / elapsed, 1) if elapsed else None,
+            "publishes": {
+                "recorded": len(recorded),
+                "replayed": len(self.mqtt.published),
+                "missing": len(expected - replayed),
+                "unexpected": len(replayed - expected),
+            },
+            "devices": {
+                mac: {"metrics": device.metrics.as_dict(), "frames": device.frame_errors()}
+                for mac, device in self.devices.items()
+            },
+        }
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+from .const import DEFAULT_DEVICE_TIMEOUT
+from .models import DeviceStatus, PetkitW5Status
+from .scheduler import PRIORITY_COMMAND, PRIORITY_POLL
+
+_LOGGER = logging.getLogger(__name__)
+
+class ConnectionPlanner:
+    """План GATT операций устройства на одно подключение (окно).
+
+    Команды и чтения статуса не подключаются каждая сама по себе, а
+    ставятся в план. Первая заявка открывает окно: подключение, все
+    накопленные команды по порядку, затем чтение статуса. Заявки,
+    пришедшие, пока окно открыто, выполняются в нем же, поэтому опрос,
+    команда из MQTT и синхронизация расписания, совпавшие по времени,
+    обходятся одним подключением.
+
+    Идущие подряд команды с одной записью (часы, настройки)
+    отправляются конвейером: все записи без ответа ATT, затем ожидание
+    всех подтверждений. После команд, меняющих показания (кормление), в
+    окно добавляется чтение статуса; его результат передается
+    обработчику статуса устройства. В конце окна слот адаптера
+    освобождается сразу, если его ждут другие устройства.
+
+    Все операции устройства выполняются одной задачей окна и не
+    пересекаются на GATT. Если чтение статуса перестали ждать все
+    вызывающие (таймаут опроса), а команд в окне не было, окно
+    отменяется вместе с подключением: опрос не занимает слот адаптера
+    дольше своего таймаута.
+    """
+
+    def __init__(self, device, read_timeout=DEFAULT_DEVICE_TIMEOUT):
+        self.device = device
+        self.read_timeout = read_timeout
+        # (имя, handler, write, refresh, future)
+        self._commands = []
+        # [future, запрошено вызывающим, запрошено после команды] - одно чтение статуса на окно
+        self._status_read = None
+        # Чтение, которое сейчас выполняется
+        self._reading = None
+        # future -> число вызывающих, ожидающих статус
+        self._status_waiters = {}
+        # В текущем окне выполнялись команды - отменять его нельзя
+        self._window_commands = False
+        self._priority = PRIORITY_POLL
+        self._task = None
+
+    def submit(self, name, handler=None, write=None, refresh=False):
+        """Команда в план. Возвращает future с результатом.
+
+        handler - корутина-функция команды. write - функция, возвращающая
+        (характеристика, команда) для команд с одной записью и ACK; такие
+        команды можно отправлять конвейером. refresh - прочитать статус
+        после команды.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._commands.append((name, handler, write, refresh, future))
+        self._open(PRIORITY_COMMAND)
+        return future
+
+    async def async_read_status(self, priority=PRIORITY_POLL):
+        """Статус из ближайшего окна (offline, если подключиться не удалось)."""
+        future = self._request_status(external=True)
+        self._open(priority)
+        waiters = self._status_waiters
+        waiters[future] = waiters.get(future, 0) + 1
+        try:
+            return await asyncio.shield(future)
+        finally:
+            waiters[future] -= 1
+            if not waiters[future]:
+                del waiters[future]
+                if not future.done():
+                    self._abandon_status(future)
+
+    @property
+    def reading(self):
+        """Идет чтение статуса по GATT."""
+        return self._reading is not None
+
+    def stats(self):
+        """Число окон и операций для диагностики."""
+        counters = self.device.metrics.counters
+        windows = counters["windows"]
+        operations = counters["window_operations"]
+        connections = counters["connects"] + counters["reconnects"]
+        return {
+            "windows": windows,
+            "operations": operations,
+            "ops_per_window": round(operations / windows, 2) if windows else None,
+            "ops_per_connection": round(operations / connections, 2) if connections else None,
+        }
+
+    async def async_stop(self):
+        """Остановка окна и отмена невыполненных заявок."""
+        # Заявки снимаются до ожидания окна, чтобы оно не открылось заново
+        for *_, future in self._commands:
+            future.cancel()
+        self._commands = []
+        if self._status_read is not None:
+            self._status_read[0].cancel()
+            self._status_read = None
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _request_status(self, external):
+        if self._status_read is None or self._status_read[0].done():
+            self._status_read = [asyncio.get_running_loop().create_future(), external, not external]
+        else:
+            self._status_read[1] = self._status_read[1] or external
+            self._status_read[2] = self._status_read[2] or not external
+        return self._status_read[0]
+
+    def _abandon_status(self, future):
+        """Статус больше никто не ждет (таймаут или отмена опроса)."""
+        entry = next(
+            (entry for entry in (self._status_read, self._reading) if entry is not None and entry[0] is future),
+            None,
+        )
+        if entry is not None and entry[2]:
+            # Чтение нужно и команде - результат уйдет обработчику статуса
+            entry[1] = False
+            return
+
+        future.cancel()
+        if self._status_read is entry:
+            self._status_read = None
+        if self._task is None or self._task.done() or self._commands or self._window_commands:
+            return
+        _LOGGER.debug(f"Опрос {self.device.mac_address} прерван, окно подключения отменено")
+        self._task.cancel()
+        # Команда, пришедшая до завершения отмены, откроет новое окно
+        self._task.add_done_callback(self._reopen)
+
+    def _reopen(self, task):
+        if self._commands or self._status_read is not None:
+            self._open(self._priority)
+
+    def _open(self, priority):
+        self._priority = min(self._priority, priority)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._async_window())
+
+    async def _async_window(self):
+        """Одно окно: подключение и все заявки, пока они есть."""
+        device = self.device
+        operations = 0
+        self._window_commands = False
+        try:
+            with device.connection.active():
+                while self._commands or self._status_read is not None:
+                    priority, self._priority = self._priority, PRIORITY_POLL
+                    if not device.is_connected and not await device.connect(priority):
+                        self._fail(ConnectionError(f"Устройство {device.mac_address} недоступно"))
+                        break
+                    commands, self._commands = self._commands, []
+                    if commands:
+                        self._window_commands = True
+                    operations += await self._async_run_commands(commands)
+                    if self._status_read is not None:
+                        operations += await self._async_read_status()
+        finally:
+            self._window_commands = False
+            if operations:
+                device.metrics.count("windows")
+                device.metrics.count("window_operations", operations)
+                _LOGGER.debug(f"Окно подключения {device.mac_address}: операций {operations}")
+            # Без await после проверки очереди: новая заявка откроет новое окно
+            device.connection.release_if_contended()
+
+    def _fail(self, error):
+        """Завершение заявок, которые не выполнить без подключения."""
+        commands, self._commands = self._commands, []
+        for *_, future in commands:
+            if not future.done():
+                future.set_exception(error)
+        if self._status_read is not None:
+            future = self._status_read[0]
+            self._status_read = None
+            if not future.done():
+                future.set_result(PetkitW5Status.offline())
+
+    async def _async_run_commands(self, commands):
+        """Выполнение команд по порядку. Возвращает число выполненных."""
+        commands = [command for command in commands if not command[-1].done()]
+        try:
+            index = 0
+            while index < len(commands):
+                batch = commands[index:index + 1]
+                if batch[0][2] is not None:
+                    while index + len(batch) < len(commands) and commands[index + len(batch)][2] is not None:
+                        batch.append(commands[index + len(batch)])
+                index += len(batch)
+                if len(batch) > 1:
+                    await self._async_pipeline(batch)
+                else:
+                    await self._async_run(*batch[0])
+        except asyncio.CancelledError:
+            for *_, future in commands:
+                future.cancel()
+            raise
+        return len(commands)
+
+    async def _async_run(self, name, handler, write, refresh, future):
+        try:
+            result = await (handler() if handler is not None else self.device.execute_command(*write()))
+            if not future.done():
+                future.set_result(result)
+        except Exception as e:
+            _LOGGER.error(f"Ошибка выполнения команды {name} для {self.device.mac_address}: {e}")
+            if not future.done():
+                future.set_exception(e)
+        if refresh:
+            self._request_status(external=False)
+
+    async def _async_pipeline(self, batch):
+        """Конвейерная отправка команд с одной записью."""
+        try:
+            results = await self.device.execute_pipelined([write() for _, _, write, _, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (name, _, _, refresh, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                _LOGGER.error(f"Ошибка выполнения команды {name} для {self.device.mac_address}: {result}")
+                if not future.done():
+                    future.set_exception(result)
+            elif not future.done():
+                future.set_result(result)
+            if refresh:
+                self._request_status(external=False)
+
+    async def _async_read_status(self):
+        """Чтение статуса. Возвращает число операций (0 или 1)."""
+        entry, self._status_read = self._status_read, None
+        future = entry[0]
+        if future.done():
+            return 0
+        self._reading = entry
+        try:
+            status = await asyncio.wait_for(self.device.get_status(), self.read_timeout)
+        except asyncio.TimeoutError:
+            status = PetkitW5Status.failed(DeviceStatus.TIMEOUT, f"Таймаут чтения статуса ({self.read_timeout} с)")
+        finally:
+            self._reading = None
+        if not future.done():
+            future.set_result(status)
+        # Чтение после команды никто не ждет - статус как из уведомления
+        if not entry[1] and status.is_online:
+            self.device.report_status(status)
+        return 1
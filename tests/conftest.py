@@ -0,0 +1,18 @@
+"""Загрузка модулей интеграции без Home Assistant.
+
+Модули, не зависящие от Home Assistant и bleak (protocol, leases,
+schedule и др.), импортируются из пакета petkit_w5_ble, собранного
+по пути каталога интеграции - так же, как в benchmarks/bench_load.py.
+__init__.py интеграции при этом не выполняется.
+"""
+import pathlib
+import sys
+import types
+
+COMPONENT_DIR = pathlib.Path(__file__).resolve().parent.parent / "custom_components" / "petkit_w5_ble"
+PACKAGE = "petkit_w5_ble"
+
+if PACKAGE not in sys.modules:
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [str(COMPONENT_DIR)]
+    sys.modules[PACKAGE] = package
@@ -0,0 +1,50 @@
+"""Объединение повторных команд кормления."""
+import asyncio
+
+from petkit_w5_ble.commands import PetkitW5CommandQueue
+
+class FakePlanner:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, kind, action=None, write=None, refresh=False):
+        future = asyncio.get_running_loop().create_future()
+        self.submitted.append((kind, future))
+        return future
+
+class FakeDevice:
+    mac_address = "AA:BB:CC:DD:EE:01"
+
+    def __init__(self):
+        self.planner = FakePlanner()
+
+def test_duplicate_feed_joins_pending_feed():
+    async def scenario():
+        device = FakeDevice()
+        queue = PetkitW5CommandQueue(device, coalesce_window=5)
+        first = asyncio.ensure_future(queue.async_feed(10))
+        second = asyncio.ensure_future(queue.async_feed(10))
+        await asyncio.sleep(0)
+        assert len(device.planner.submitted) == 1
+        device.planner.submitted[0][1].set_result("done")
+        assert await first == await second == "done"
+
+    asyncio.run(scenario())
+
+def test_feed_after_finished_feed_is_not_coalesced():
+    async def scenario():
+        device = FakeDevice()
+        queue = PetkitW5CommandQueue(device, coalesce_window=5)
+        first = asyncio.ensure_future(queue.async_feed(10))
+        await asyncio.sleep(0)
+        device.planner.submitted[0][1].set_result("done")
+        await first
+
+        # Внутри окна, но предыдущее кормление уже завершено
+        second = asyncio.ensure_future(queue.async_feed(10))
+        await asyncio.sleep(0)
+        assert len(device.planner.submitted) == 2
+        device.planner.submitted[1][1].set_result("again")
+        assert await second == "again"
+
+    asyncio.run(scenario())
@@ -0,0 +1,44 @@
+"""Сохранение истории после неудачной записи файла."""
+from petkit_w5_ble.history import TelemetryHistory
+
+def flush(history, path, fail=False):
+    records, rewrite = history.prepare_flush()
+    try:
+        if fail:
+            raise OSError("disk full")
+        TelemetryHistory.write(str(path), records, rewrite)
+    except OSError:
+        history.restore_flush(records, rewrite)
+
+def loaded(path):
+    history = TelemetryHistory(size=8, feed_size=4)
+    history.load(TelemetryHistory.read(str(path)))
+    return [row[2] for row in history.readings.rows()]
+
+def test_failed_append_is_written_on_next_flush(tmp_path):
+    path = tmp_path / "history.bin"
+    history = TelemetryHistory(size=8, feed_size=4)
+    history.record_reading(90, 50, timestamp=1)
+    flush(history, path)
+    history.record_reading(90, 40, timestamp=2)
+    flush(history, path, fail=True)
+    history.record_reading(90, 30, timestamp=3)
+    flush(history, path)
+
+    assert loaded(path) == [50, 40, 30]
+    assert history.prepare_flush() == ([], False)
+
+def test_failed_rewrite_is_repeated(tmp_path, monkeypatch):
+    path = tmp_path / "history.bin"
+    monkeypatch.setattr("petkit_w5_ble.history.COMPACT_RATIO", 1)
+    history = TelemetryHistory(size=8, feed_size=4)
+    # 13-я запись превышает предел файла (12 записей) и вызывает перезапись
+    for level in range(13):
+        history.record_reading(90, level, timestamp=level)
+        flush(history, path, fail=level == 12)
+    # Перезапись не удалась: следующее сохранение снова пишет буферы целиком
+    records, rewrite = history.prepare_flush()
+    assert rewrite
+    TelemetryHistory.write(str(path), records, rewrite)
+
+    assert loaded(path) == list(range(5, 13))
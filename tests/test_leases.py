@@ -0,0 +1,85 @@
+"""Распределение устройств между узлами моста."""
+from petkit_w5_ble.leases import LeaseTable
+
+MAC = "AA:BB:CC:DD:EE:01"
+
+def make_table(node="a", ttl=45, hysteresis=8):
+    return LeaseTable(node, ttl=ttl, hysteresis=hysteresis)
+
+def test_best_rssi_wins_without_lease():
+    table = make_table()
+    table.update_node("a", {MAC: -80}, now=0)
+    table.update_node("b", {MAC: -60}, now=0)
+    assert table.owner(MAC, now=1) == "b"
+
+def test_equal_rssi_prefers_smaller_node_id():
+    table = make_table()
+    table.update_node("b", {MAC: -70}, now=0)
+    table.update_node("ab", {MAC: -70}, now=0)
+    table.update_node("a", {MAC: -70}, now=0)
+    assert table.owner(MAC, now=1) == "a"
+
+def test_holder_keeps_device_within_hysteresis():
+    table = make_table()
+    table.update_node("a", {MAC: -70}, now=0)
+    table.update_node("b", {MAC: -63}, now=0)
+    table.update_lease(MAC, "a", now=0)
+    assert table.owner(MAC, now=1) == "a"
+
+    # Другой узел видит устройство лучше на hysteresis дБ - устройство переезжает
+    table.update_node("b", {MAC: -62}, now=2)
+    assert table.owner(MAC, now=3) == "b"
+
+def test_failover_when_holder_goes_silent():
+    table = make_table()
+    table.update_node("a", {MAC: -50}, now=0)
+    table.update_node("b", {MAC: -80}, now=0)
+    table.update_lease(MAC, "a", now=0)
+    assert table.owner(MAC, now=10) == "a"
+
+    # Узел b продолжает присылать сообщения, a замолчал дольше ttl
+    table.update_node("b", {MAC: -80}, now=40)
+    table.update_lease(MAC, "a", now=40)
+    assert table.holder(MAC, now=50) is None
+    assert table.owner(MAC, now=50) == "b"
+
+def test_failover_when_holder_removed_by_last_will():
+    table = make_table()
+    table.update_node("a", {MAC: -50}, now=0)
+    table.update_node("b", {MAC: -80}, now=0)
+    table.update_lease(MAC, "a", now=0)
+    table.remove_node("a")
+    assert table.holder(MAC, now=1) is None
+    assert table.owner(MAC, now=1) == "b"
+
+def test_expired_lease_is_ignored():
+    table = make_table(ttl=10)
+    table.update_node("a", {MAC: -50}, now=0)
+    table.update_lease(MAC, "a", now=0)
+    table.update_node("a", {MAC: -50}, now=9)
+    assert table.holder(MAC, now=9) == "a"
+    assert table.holder(MAC, now=10) is None
+
+def test_clear_lease_only_for_its_node():
+    table = make_table()
+    table.update_node("a", {MAC: -50}, now=0)
+    table.update_lease(MAC, "a", now=0)
+    table.clear_lease(MAC, "b")
+    assert table.holder(MAC, now=1) == "a"
+    table.clear_lease(MAC, "a")
+    assert table.holder(MAC, now=1) is None
+
+def test_holder_kept_when_nobody_sees_device():
+    table = make_table()
+    table.update_node("a", {}, now=0)
+    table.update_lease(MAC, "a", now=0)
+    assert table.owner(MAC, now=1) == "a"
+
+def test_plan_acquire_and_release():
+    other = "AA:BB:CC:DD:EE:02"
+    table = make_table("a")
+    table.update_node("a", {MAC: -50, other: -90}, now=0)
+    table.update_node("b", {MAC: -90, other: -50}, now=0)
+    acquire, release = table.plan([MAC, other], [other], now=1)
+    assert acquire == {MAC}
+    assert release == {other}
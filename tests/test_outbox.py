@@ -0,0 +1,88 @@
+"""Очередь MQTT сообщений на время недоступности брокера."""
+import asyncio
+
+from petkit_w5_ble.outbox import MqttOutbox
+
+class FakeMqtt:
+    """Брокер: retained-значения по топикам и управляемые сбои."""
+
+    def __init__(self):
+        self.is_connected = False
+        self.retained = {}
+        self.events = []
+        self.block = None
+        self.fail = set()
+        self._listeners = []
+
+    def add_connect_listener(self, callback):
+        self._listeners.append(callback)
+        return lambda: self._listeners.remove(callback)
+
+    def connect(self):
+        self.is_connected = True
+        for callback in list(self._listeners):
+            callback()
+
+    async def async_publish(self, topic, payload, qos=0, retain=False):
+        if self.block is not None and payload in self.block:
+            await self.block[payload].wait()
+        if payload in self.fail:
+            return False
+        if retain:
+            self.retained[topic] = payload
+        else:
+            self.events.append(payload)
+        return True
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_events_spill_to_disk_and_keep_order(tmp_path):
+    async def run():
+        mqtt = FakeMqtt()
+        outbox = MqttOutbox(mqtt, str(tmp_path / "outbox.jsonl"), max_events=2, rate=10000)
+        await outbox.async_start()
+        for index in range(5):
+            await outbox.async_publish("petkit/w5/AA/event", f"e{index}", qos=1, event=True)
+        stats = outbox.stats()
+        mqtt.connect()
+        await asyncio.sleep(0.05)
+        await outbox.async_stop()
+        return stats, mqtt.events, outbox.pending
+
+    stats, events, pending = asyncio.run(run())
+    assert stats["events"] == 2 and stats["spilled"] == 3
+    assert events == [f"e{index}" for index in range(5)]
+    assert pending == 0
+
+def test_failed_in_flight_status_does_not_overwrite_newer_value(tmp_path):
+    async def run():
+        mqtt = FakeMqtt()
+        outbox = MqttOutbox(mqtt, str(tmp_path / "outbox.jsonl"), rate=10000)
+        await outbox.async_start()
+        await outbox.async_publish("petkit/w5/AA/battery", "80", retain=True)
+
+        # Старое значение уходит в пачке, отправка зависает и не удается
+        release = asyncio.Event()
+        mqtt.block = {"80": release}
+        mqtt.fail = {"80"}
+        mqtt.connect()
+        await settle()
+        assert outbox.stats()["in_flight"] == 1
+
+        # Новое значение, пока старое в пачке, не отправляется в обход нее
+        await outbox.async_publish("petkit/w5/AA/battery", "75", retain=True)
+        release.set()
+        await settle()
+
+        # После восстановления отправляется только новое значение
+        mqtt.fail = set()
+        mqtt.connect()
+        await asyncio.sleep(0.05)
+        await outbox.async_stop()
+        return mqtt.retained, outbox.pending
+
+    retained, pending = asyncio.run(run())
+    assert retained == {"petkit/w5/AA/battery": "75"}
+    assert pending == 0
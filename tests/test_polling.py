@@ -0,0 +1,128 @@
+"""Breaker устройства и опрос с ограничением параллельности."""
+import asyncio
+
+from petkit_w5_ble.health import BreakerState, DeviceHealth
+from petkit_w5_ble.models import DeviceStatus, PetkitW5Status
+from petkit_w5_ble.polling import AdaptivePollSchedule, DevicePoller
+
+def test_breaker_opens_after_threshold_and_probes():
+    health = DeviceHealth(failure_threshold=3, base_delay=10, max_delay=100)
+    assert not health.record_failure("e1")
+    assert not health.record_failure("e2")
+    assert health.record_failure("e3")
+    assert health.state == BreakerState.OPEN
+    assert not health.allow_request(now=health.next_retry - 1)
+
+    # По истечении задержки - одна пробная попытка
+    assert health.allow_request(now=health.next_retry)
+    assert health.is_probing
+    assert not health.allow_request(now=health.next_retry)
+
+    assert health.record_success()
+    assert health.state == BreakerState.CLOSED
+    assert health.failures == 0 and health.next_retry is None
+
+def test_failed_probe_reopens_with_longer_delay(monkeypatch):
+    monkeypatch.setattr("petkit_w5_ble.health.random.uniform", lambda low, high: 1.0)
+    monkeypatch.setattr("petkit_w5_ble.health.time.monotonic", lambda: 0.0)
+    health = DeviceHealth(failure_threshold=1, base_delay=10, max_delay=25)
+    health.record_failure()
+    assert health.next_retry == 10
+    health.allow_request(now=10)
+    assert not health.record_failure()
+    assert health.next_retry == 20
+    health.allow_request(now=20)
+    health.record_failure()
+    assert health.next_retry == 25
+
+class FakePlanner:
+    def __init__(self, delay):
+        self.delay = delay
+        self.reading = False
+
+    async def async_read_status(self):
+        # Как в ConnectionPlanner: чтение идет в задаче окна, и флаг
+        # снимается окном, а не отмененным вызывающим
+        self.reading = True
+        await asyncio.sleep(self.delay)
+        self.reading = False
+        return PetkitW5Status(DeviceStatus.ONLINE, state=0, battery=90, food_level=50)
+
+class FakeMetrics:
+    def count(self, name, value=1):
+        pass
+
+class FakeDevice:
+    def __init__(self, mac, delay=0.05):
+        self.mac_address = mac
+        self.planner = FakePlanner(delay)
+        self.metrics = FakeMetrics()
+
+    def has_fresh_status(self):
+        return False
+
+    async def publish_mqtt(self, status):
+        return True
+
+def test_cancelled_while_queued_is_not_a_failure():
+    async def run():
+        poller = DevicePoller(max_concurrency=1, device_timeout=5)
+        first, second = FakeDevice("AA:01"), FakeDevice("AA:02")
+        first_health, second_health = DeviceHealth(), DeviceHealth()
+        tasks = [
+            asyncio.ensure_future(poller.async_poll(first, first_health)),
+            asyncio.ensure_future(poller.async_poll(second, second_health)),
+        ]
+        await asyncio.sleep(0.01)
+        # Конец цикла: первый читается, второй ждет семафор
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return first_health, second_health
+
+    first_health, second_health = asyncio.run(run())
+    assert first_health.failures == 1
+    assert second_health.failures == 0
+    assert second_health.last_error is None
+
+def test_poll_timeout_counts_as_failure():
+    async def run():
+        poller = DevicePoller(max_concurrency=1, device_timeout=0.01)
+        health = DeviceHealth()
+        status = await poller.async_poll(FakeDevice("AA:01", delay=1), health)
+        return status, health
+
+    status, health = asyncio.run(run())
+    assert status.status == DeviceStatus.TIMEOUT
+    assert health.failures == 1
+
+def make_status(battery=90, food_level=50):
+    return PetkitW5Status(DeviceStatus.ONLINE, state=0, battery=battery, food_level=food_level)
+
+def make_schedule():
+    return AdaptivePollSchedule(min_interval=10, max_interval=300, base_interval=60, boost_duration=120, low_battery=20)
+
+def test_unchanged_readings_back_off_to_max():
+    schedule = make_schedule()
+    status = make_status()
+    schedule.record(status, now=0)
+    intervals = [schedule.record(status, status, now=now) for now in range(1, 8)]
+    assert intervals[:2] == [90, 135]
+    assert intervals[-1] == 300
+    assert schedule.record(make_status(food_level=49), status, now=10) == 60
+
+def test_boost_and_large_food_change_poll_at_min_interval():
+    schedule = make_schedule()
+    schedule.boost(now=0)
+    assert schedule.due(now=0)
+    assert schedule.record(make_status(), make_status(), now=1) == 10
+    assert schedule.record(make_status(), make_status(), now=200) == 90
+
+    # Заметное изменение уровня корма снова включает частый опрос
+    assert schedule.record(make_status(food_level=40), make_status(), now=300) == 10
+    assert not schedule.due(now=305)
+    assert schedule.due(now=310)
+
+def test_low_battery_slows_polling():
+    schedule = make_schedule()
+    assert schedule.record(make_status(battery=15), make_status(battery=16), now=0) == 120
@@ -0,0 +1,103 @@
+"""Кадры протокола Petkit W5 и сборка их из уведомлений."""
+import pytest
+
+from petkit_w5_ble import protocol
+
+def test_frames_are_13_bytes_with_checksum():
+    frame = protocol.encode_feed(25)
+    assert len(frame) == protocol.FRAME_SIZE
+    assert frame[0] == protocol.FRAME_HEADER
+    assert frame[1] == protocol.CMD_FEED
+    assert frame[-1] == sum(frame[:-1]) & 0xFF
+
+@pytest.mark.parametrize(
+    "frame, expected",
+    [
+        (protocol.encode_feed(25), protocol.FeedFrame(25)),
+        (protocol.encode_status(1, 87, 40), protocol.StatusFrame(1, 87, 40)),
+        (protocol.encode_settings(True, False, True), protocol.SettingsFrame(1, 0, 1)),
+        (protocol.encode_time_sync(1700000000, -180), protocol.TimeSyncFrame(1700000000, -180)),
+        (protocol.encode_ack(protocol.CMD_FEED), protocol.AckFrame(protocol.CMD_FEED, protocol.ACK_OK)),
+        (protocol.encode_feed_done(300), protocol.FeedDoneFrame(protocol.ACK_OK, 300)),
+        (
+            protocol.encode_schedule_slot(3, True, 7, 30, 15, 0x1F),
+            protocol.ScheduleSlotFrame(3, 1, 7, 30, 15, 0x1F),
+        ),
+        (protocol.encode_schedule_info(10, 0xDEADBEEF), protocol.ScheduleInfoFrame(10, 0xDEADBEEF)),
+        (protocol.encode_query(protocol.QUERY_SETTINGS), protocol.QueryFrame(protocol.QUERY_SETTINGS)),
+    ],
+)
+def test_encode_decode_roundtrip(frame, expected):
+    assert protocol.decode_frame(frame) == expected
+    assert protocol.decode_frame(bytes(frame)) == expected
+
+def test_decode_at_offset():
+    buffer = b"\x00\x00" + protocol.encode_status(2, 50, 10)
+    assert protocol.decode_frame(buffer, 2) == protocol.StatusFrame(2, 50, 10)
+
+def test_decode_rejects_bad_frames():
+    frame = protocol.encode_status(1, 87, 40)
+    with pytest.raises(protocol.ProtocolError):
+        protocol.decode_frame(frame[:12])
+
+    bad_header = bytearray(frame)
+    bad_header[0] = 0x02
+    with pytest.raises(protocol.ProtocolError):
+        protocol.decode_frame(bad_header)
+
+    bad_checksum = bytearray(frame)
+    bad_checksum[-1] ^= 0xFF
+    with pytest.raises(protocol.ChecksumError):
+        protocol.decode_frame(bad_checksum)
+
+    unknown = bytearray(frame)
+    unknown[1] = 0x7F
+    unknown[-1] = protocol.checksum(unknown[:-1])
+    with pytest.raises(protocol.ProtocolError):
+        protocol.decode_frame(unknown)
+
+def test_advertisement_roundtrip():
+    data = protocol.encode_advertisement(1, 80, 55)
+    assert protocol.decode_advertisement(data) == protocol.AdvertFrame(1, 80, 55)
+    assert protocol.decode_advertisement(protocol.encode_advertisement(0, 80)).food_level is None
+    assert protocol.decode_advertisement(b"\x02\x00\x50\x10") is None
+    assert protocol.decode_advertisement(b"\x01") is None
+
+def test_assembler_single_frame():
+    assembler = protocol.FrameAssembler()
+    assert assembler.feed(protocol.encode_status(1, 90, 30)) == [protocol.StatusFrame(1, 90, 30)]
+
+def test_assembler_joins_split_frame():
+    assembler = protocol.FrameAssembler()
+    frame = protocol.encode_status(0, 64, 20)
+    assert assembler.feed(frame[:5]) == []
+    assert assembler.feed(frame[5:9]) == []
+    assert assembler.feed(frame[9:]) == [protocol.StatusFrame(0, 64, 20)]
+
+def test_assembler_splits_merged_frames():
+    assembler = protocol.FrameAssembler()
+    first = protocol.encode_settings(True, True, False)
+    second = protocol.encode_status(0, 70, 20)
+    third = protocol.encode_status(0, 70, 19)
+    data = first + second + third[:4]
+    assert assembler.feed(data) == [
+        protocol.SettingsFrame(1, 1, 0),
+        protocol.StatusFrame(0, 70, 20),
+    ]
+    assert assembler.feed(third[4:]) == [protocol.StatusFrame(0, 70, 19)]
+
+def test_assembler_resyncs_after_garbage_and_bad_checksum():
+    assembler = protocol.FrameAssembler()
+    corrupted = bytearray(protocol.encode_status(2, 50, 40))
+    corrupted[-1] ^= 0xFF
+    frame = protocol.encode_status(1, 60, 50)
+    frames = assembler.feed(b"\xAA\xBB" + bytes(corrupted) + frame)
+    assert frames == [protocol.StatusFrame(1, 60, 50)]
+    assert assembler.checksum_errors == 1
+    assert assembler.dropped_bytes == 2 + protocol.FRAME_SIZE
+
+def test_assembler_reset_drops_partial_frame():
+    assembler = protocol.FrameAssembler()
+    assembler.feed(protocol.encode_status(1, 60, 50)[:6])
+    assembler.reset()
+    assert assembler.feed(protocol.encode_feed(10)) == [protocol.FeedFrame(10)]
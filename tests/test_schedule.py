@@ -0,0 +1,118 @@
+"""Расписание кормлений: минимальные записи слотов и синхронизация."""
+import asyncio
+
+import pytest
+
+from petkit_w5_ble import protocol
+from petkit_w5_ble.schedule import Meal, ScheduleSync, meal_config, parse_meals, plan_schedule
+
+EVERY_DAY = protocol.EVERY_DAY
+
+def empty_table(size=10):
+    return [protocol.ScheduleSlotFrame(index, 0, 0, 0, 0, 0) for index in range(size)]
+
+def table_with(*meals, size=10):
+    table = empty_table(size)
+    for index, meal in meals:
+        table[index] = protocol.ScheduleSlotFrame(index, 1, *meal)
+    return table
+
+def test_parse_meals_sorts_and_merges_duplicates():
+    meals = parse_meals([
+        {"time": "19:00", "amount": 15, "days": [5, 6]},
+        {"time": "07:30", "amount": 10},
+        {"time": "07:30", "amount": 10},
+    ])
+    assert meals == [Meal(7, 30, 10, EVERY_DAY), Meal(19, 0, 15, 0b1100000)]
+    assert parse_meals([meal_config(meal) for meal in meals]) == meals
+
+@pytest.mark.parametrize("item", [
+    {"time": "24:00"},
+    {"time": "07:30", "amount": 0},
+    {"time": "07:30", "days": [7]},
+])
+def test_parse_meals_rejects_invalid(item):
+    with pytest.raises(ValueError):
+        parse_meals([item])
+
+def test_unchanged_schedule_needs_no_writes():
+    meals = [Meal(7, 30, 10, EVERY_DAY), Meal(19, 0, 15, EVERY_DAY)]
+    # Порядок слотов не совпадает со временем - это не повод переписывать
+    current = table_with((4, meals[1]), (2, meals[0]))
+    writes, table = plan_schedule(current, meals)
+    assert writes == []
+    assert table == current
+
+def test_new_meal_goes_to_first_free_slot():
+    breakfast = Meal(7, 30, 10, EVERY_DAY)
+    current = table_with((0, breakfast))
+    writes, table = plan_schedule(current, [breakfast, Meal(12, 0, 5, EVERY_DAY)])
+    assert writes == [protocol.ScheduleSlotFrame(1, 1, 12, 0, 5, EVERY_DAY)]
+    assert table[0] == current[0]
+
+def test_changed_meal_overwrites_stale_slot():
+    current = table_with((0, Meal(7, 30, 10, EVERY_DAY)), (1, Meal(19, 0, 15, EVERY_DAY)))
+    writes, _ = plan_schedule(current, [Meal(7, 30, 10, EVERY_DAY), Meal(19, 0, 20, EVERY_DAY)])
+    # Одна запись поверх ненужного слота, а не выключение и запись в свободный
+    assert writes == [protocol.ScheduleSlotFrame(1, 1, 19, 0, 20, EVERY_DAY)]
+
+def test_removed_meals_are_disabled():
+    current = table_with((0, Meal(7, 30, 10, EVERY_DAY)), (3, Meal(19, 0, 15, EVERY_DAY)))
+    writes, table = plan_schedule(current, [Meal(7, 30, 10, EVERY_DAY)])
+    assert writes == [protocol.ScheduleSlotFrame(3, 0, 0, 0, 0, 0)]
+    assert [slot.enabled for slot in table] == [1] + [0] * 9
+
+def test_too_many_meals():
+    with pytest.raises(ValueError):
+        plan_schedule(empty_table(2), [Meal(hour, 0, 10, EVERY_DAY) for hour in range(3)])
+
+class FakeDevice:
+    """Таблица и настройки устройства в памяти со счетчиком операций."""
+
+    mac_address = "AA:BB:CC:DD:EE:01"
+
+    def __init__(self, table, settings=protocol.SettingsFrame(0, 0, 0)):
+        self.table = list(table)
+        self.settings = settings
+        self.operations = []
+
+    async def read_schedule_info(self):
+        self.operations.append("info")
+        return protocol.ScheduleInfoFrame(len(self.table), protocol.schedule_crc(self.table))
+
+    async def read_schedule_slot(self, index):
+        self.operations.append("slot")
+        return self.table[index]
+
+    async def write_schedule_slot(self, slot):
+        self.operations.append("write")
+        self.table[slot.index] = slot
+
+    async def read_settings(self):
+        self.operations.append("settings")
+        return self.settings
+
+    async def write_settings(self, light, sound, child_lock):
+        self.operations.append("write_settings")
+        self.settings = protocol.SettingsFrame(light, sound, child_lock)
+
+def test_sync_reads_table_once_then_only_crc():
+    device = FakeDevice(empty_table(4))
+    sync = ScheduleSync(device)
+    meals = [Meal(7, 30, 10, EVERY_DAY)]
+
+    assert asyncio.run(sync.async_sync(meals)) == {"reads": 6, "writes": 1}
+    device.operations.clear()
+    assert asyncio.run(sync.async_sync(meals)) == {"reads": 1, "writes": 0}
+    assert device.operations == ["info"]
+
+def test_sync_merges_partial_settings():
+    device = FakeDevice(empty_table(4), protocol.SettingsFrame(1, 1, 0))
+    sync = ScheduleSync(device)
+
+    asyncio.run(sync.async_sync(None, {"child_lock": True}))
+    assert device.settings == protocol.SettingsFrame(1, 1, 1)
+
+    device.operations.clear()
+    assert asyncio.run(sync.async_sync(None, {"light": True})) == {"reads": 1, "writes": 0}
+    assert device.operations == ["settings"]
@@ -0,0 +1,55 @@
+"""Распределение слотов подключения между адаптерами."""
+import asyncio
+
+from petkit_w5_ble.scheduler import PRIORITY_COMMAND, PRIORITY_POLL, ConnectionSlotScheduler
+
+def test_best_rssi_adapter_with_free_slot():
+    async def scenario():
+        scheduler = ConnectionSlotScheduler(default_slots=1)
+        candidates = [("proxy", -80), ("dongle", -50)]
+        assert await scheduler.acquire("A", candidates) == "dongle"
+        # Лучший адаптер занят - следующий по RSSI
+        assert await scheduler.acquire("B", candidates) == "proxy"
+        assert scheduler.stats()["adapters"]["dongle"] == {"in_use": 1, "slots": 1}
+
+    asyncio.run(scenario())
+
+def test_command_is_served_before_poll_and_idle_holder_is_evicted():
+    async def scenario():
+        scheduler = ConnectionSlotScheduler(default_slots=1)
+        evicted = []
+
+        def evict():
+            evicted.append("A")
+            return True
+
+        await scheduler.acquire("A", [("dongle", -50)], evict=evict)
+        poll = asyncio.ensure_future(scheduler.acquire("B", [("dongle", -60)], PRIORITY_POLL))
+        command = asyncio.ensure_future(scheduler.acquire("C", [("dongle", -70)], PRIORITY_COMMAND))
+        await asyncio.sleep(0)
+        assert evicted and scheduler.contended("A")
+
+        scheduler.release("A")
+        assert await command == "dongle"
+        assert not poll.done()
+        scheduler.release("C")
+        assert await poll == "dongle"
+        assert scheduler.stats()["queued_total"] == 2
+
+    asyncio.run(scenario())
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        scheduler = ConnectionSlotScheduler(default_slots=1)
+        await scheduler.acquire("A", [("dongle", -50)])
+        waiter = asyncio.ensure_future(scheduler.acquire("B", [("dongle", -60)]))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert scheduler.stats()["queued"] == 0
+
+        scheduler.release("A")
+        assert scheduler.holder("B") is None
+        assert scheduler.in_use("dongle") == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,169 @@
+"""Окна подключения ConnectionPlanner."""
+import asyncio
+import contextlib
+from collections import Counter
+
+from petkit_w5_ble.models import DeviceStatus, PetkitW5Status
+from petkit_w5_ble.transactions import ConnectionPlanner
+
+ONLINE = PetkitW5Status(DeviceStatus.ONLINE, state=0, battery=90, food_level=50)
+
+class FakeMetrics:
+    def __init__(self):
+        self.counters = Counter()
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+class FakeConnection:
+    def __init__(self):
+        self.active_count = 0
+
+    @contextlib.contextmanager
+    def active(self):
+        self.active_count += 1
+        try:
+            yield
+        finally:
+            self.active_count -= 1
+
+    def release_if_contended(self):
+        return False
+
+class FakeDevice:
+    """Устройство с журналом операций; connect_delay - зависание подключения."""
+
+    mac_address = "AA:BB:CC:DD:EE:01"
+
+    def __init__(self, connect_delays=()):
+        self.metrics = FakeMetrics()
+        self.connection = FakeConnection()
+        self.is_connected = False
+        self.connect_delays = list(connect_delays)
+        self.log = []
+        self.reported = []
+
+    async def connect(self, priority):
+        self.log.append("connect")
+        try:
+            await asyncio.sleep(self.connect_delays.pop(0) if self.connect_delays else 0)
+        except asyncio.CancelledError:
+            self.log.append("connect_cancelled")
+            raise
+        self.is_connected = True
+        return True
+
+    async def get_status(self):
+        self.log.append("read")
+        await asyncio.sleep(0)
+        return ONLINE
+
+    def report_status(self, status):
+        self.reported.append(status)
+
+    async def execute_command(self, char_uuid, command):
+        self.log.append(("command", command))
+        return f"ack {command}"
+
+    async def execute_pipelined(self, commands):
+        self.log.append(("pipelined", len(commands)))
+        return [f"ack {command}" for _, command in commands]
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+def test_requests_share_one_window_and_writes_are_pipelined():
+    async def run():
+        device = FakeDevice()
+        planner = ConnectionPlanner(device)
+        time_sync = planner.submit("sync_time", write=lambda: ("char", "time"))
+        settings = planner.submit("settings", write=lambda: ("char", "settings"))
+        status = await planner.async_read_status()
+        return device, await time_sync, await settings, status
+
+    device, time_ack, settings_ack, status = asyncio.run(run())
+    assert device.log == ["connect", ("pipelined", 2), "read"]
+    assert (time_ack, settings_ack) == ("ack time", "ack settings")
+    assert status is ONLINE
+    assert device.metrics.counters["windows"] == 1
+    assert device.metrics.counters["window_operations"] == 3
+
+def test_poll_timeout_cancels_poll_only_window():
+    async def run():
+        device = FakeDevice(connect_delays=[10])
+        planner = ConnectionPlanner(device)
+        try:
+            await asyncio.wait_for(planner.async_read_status(), 0.01)
+        except asyncio.TimeoutError:
+            pass
+        await settle()
+        return device, planner
+
+    device, planner = asyncio.run(run())
+    assert device.log == ["connect", "connect_cancelled"]
+    assert planner._task.done()
+    assert not planner.reading
+    assert device.connection.active_count == 0
+
+def test_command_during_cancellation_reopens_window():
+    async def run():
+        device = FakeDevice(connect_delays=[10])
+        planner = ConnectionPlanner(device)
+        try:
+            await asyncio.wait_for(planner.async_read_status(), 0.01)
+        except asyncio.TimeoutError:
+            pass
+        # Окно уже отменено, но отмена еще не доставлена
+        ack = await asyncio.wait_for(planner.submit("sync_time", write=lambda: ("char", "time")), 1)
+        return device, ack
+
+    device, ack = asyncio.run(run())
+    assert device.log == ["connect", "connect_cancelled", "connect", ("command", "time")]
+    assert ack == "ack time"
+
+def test_refresh_after_command_reaches_report_status():
+    async def run():
+        device = FakeDevice()
+        planner = ConnectionPlanner(device)
+
+        async def feed():
+            device.log.append("feed")
+            return "done"
+
+        result = await planner.submit("feed", feed, refresh=True)
+        await settle()
+        return device, result
+
+    device, result = asyncio.run(run())
+    assert result == "done"
+    assert device.log == ["connect", "feed", "read"]
+    assert device.reported == [ONLINE]
+
+def test_abandoned_poll_keeps_refresh_of_command_window():
+    async def run():
+        device = FakeDevice()
+        planner = ConnectionPlanner(device)
+        started = asyncio.Event()
+
+        async def feed():
+            started.set()
+            await asyncio.sleep(0.05)
+            return "done"
+
+        command = planner.submit("feed", feed, refresh=True)
+        await started.wait()
+        # Опрос объединяется с чтением после команды и бросает его по таймауту
+        try:
+            await asyncio.wait_for(planner.async_read_status(), 0.01)
+        except asyncio.TimeoutError:
+            pass
+        result = await command
+        await settle()
+        return device, result
+
+    device, result = asyncio.run(run())
+    assert result == "done"
+    assert device.log == ["connect", "read"]
+    # Окно с командой не отменено, а статус передан обработчику
+    assert device.reported == [ONLINE]